@@ -1,118 +1,100 @@
 # main.py
+# The simulator is only imported when planning happens here, so the daemon client starts quickly.
 import argparse
 import json
-from simulator import Map, Environment, UAV
-from simulator.maps import maps
-from simulator.utils.shared_imports import Pos,State
-from simulator.path_planner.path_planner import AStarPlanner, ObliviousPlanner
-from simulator.scenario.scenario import Scenario
-from simulator.tester.tester import run_tests
-import simulator.utils.config as cfg
+import socket
 
-def load_config(path):
-    """
-    Load the scenario configuration from the JSON file provided by arg 1.
-    """
+# default address of the planning daemon: host:port, or a Unix socket path
+DAEMON_ADDRESS = "127.0.0.1:8765"
+# daemon replies sent before the final reply of a request
+STREAMED = ("output", "plans")
 
-    if path.lower().endswith('.json'):
-        with open(path) as f:
-            return json.load(f)
-    else:
-        raise ValueError("Unsupported scenario format; use .json")
 
-def build_planners(planner_defs):
-    """
-    Build planners from the definitions provided in scenario config.
-    """
-    planners = {}
-    for name, config in planner_defs.items():
-        ptype = config.get('type', 'AStarPlanner')
-        if ptype == 'AStarPlanner':
-            planners[name] = AStarPlanner(
-                heuristics   = config.get('heuristics', cfg.DEFAULT_HEURISTICS),
-                beam_width   = config.get('beam_width', cfg.DEFAULT_BEAM_WIDTH),
-                ordering     = config.get('ordering', cfg.DEFAULT_ORDERING),
-                **{k: v for k, v in config.items()
-                if k not in ('heuristics','beam_width','ordering','type')}
-            )
-        elif ptype == 'Oblivious':
-            planners[name] = ObliviousPlanner()
-        else:
-            raise ValueError(f"Unsupported planner type: {config['type']}")
-    return planners
+def connect(address):
+    """Open a connection to the planning daemon (a Unix socket if address contains a "/")."""
+    if "/" in address:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+        return sock
+    host, _, port = address.rpartition(":")
+    return socket.create_connection((host or "127.0.0.1", int(port)))
 
-def build_uav(uav_def):
+def daemon_request(address, messages):
     """
-    Build a UAV from the definition provided in scenario config.
+    Send each message to the planning daemon in turn, yielding every reply.
+    The replies to a message end with the first one that is not streamed output.
     """
-    if 'name' not in uav_def:
-        raise ValueError("UAV definition must include 'name' key.")
-    if 'destinations' not in uav_def:
-        raise ValueError("UAV definition must include 'destinations' key.")
-    if len(uav_def['destinations']) < 2:
-        raise ValueError("UAV definition must include at least 2 destinations.")
-    dests = [Pos(*coords) for coords in uav_def['destinations']]
-    return UAV(
-        uav_type   = uav_def.get('uav_type', 0),
-        destinations=dests,
-        inaccuracy = uav_def.get('inaccuracy', [0,0]),
-        start_time = uav_def.get('start_time', 0),
-        max_speed  = uav_def.get('max_speed', 1),
-        name       = uav_def.get('name', '')
-    )
+    with connect(address) as sock, sock.makefile("rw") as stream:
+        for message in messages:
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+            while True:
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("Planning daemon closed the connection")
+                reply = json.loads(line)
+                yield reply
+                if reply.get("type") not in STREAMED:
+                    break
 
-def build_scenario(sdef, planners, output_mode):
+def run_on_daemon(path, output_mode, address):
     """
-    Build a scenario from the json definition."""
-    map_name = sdef['map']['name']
-    map_array = getattr(maps, map_name)
-    S_map = Map(
-        sdef['map'].get('name', map_name),
-        map_array,
-        scale       = sdef['map'].get('scale', 1),
-        repetitions = sdef['map'].get('repetitions', 0)
-    )
-
-    # build uav list
-    uavs = [build_uav(u) for u in sdef['uavs']]
-
-    # adds reservations to map
-    res_temp = sdef.get('reservations', [])
-    reservations = []
-    for res in res_temp:
-        reservations.append((res[0], res[1], res[2], res[3]))
-    
-    if output_mode == -1:
-        output_mode = sdef.get('output_mode', 0)
-    #creates scenario obj
-    scen = Scenario(
-        sdef.get('name', 'Unnamed'),
-        map=S_map,
-        uav_list=uavs,
-        output_mode=output_mode,
-        reservations=reservations
-    )
-    scen.assign_planners(planners)
-    return scen
+    Client mode. A .json scenario config is run by the daemon and its output printed as if run here;
+    a .jsonl file is sent one request per line (e.g. flight requests) and the replies printed as JSON lines.
+    """
+    if path.lower().endswith('.jsonl'):
+        with open(path) as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        for reply in daemon_request(address, messages):
+            print(json.dumps(reply))
+        return
+    # the same check as load_config, which would import the simulator
+    if not path.lower().endswith('.json'):
+        raise ValueError("Unsupported scenario format; use .json")
+    with open(path) as f:
+        config = json.load(f)
+    for reply in daemon_request(address, [{"op": "run", "config": config, "output_mode": output_mode}]):
+        if reply["type"] == "output":
+            print(reply["text"], end="")
+        elif reply["type"] == "error":
+            raise RuntimeError(reply["message"])
 
 def main():
     #parse command line arguments
     p = argparse.ArgumentParser()
-    p.add_argument('scenario', help="Path to JSON (or TXT) scenario+planner config")
+    p.add_argument('scenario', nargs='?', help="Path to JSON (or TXT) scenario+planner config, "
+                   "or with --daemon a JSONL file of daemon requests")
     p.add_argument('--output_mode', type=int, default=-1,
                 help= "0: Only results. " \
                 "1: Full tex no display.    2: Full text and display.   " \
                 "3: Display+Results -1: use scenario config (default)")
+    p.add_argument('--serve', action='store_true', help="Run the planning daemon instead of a scenario")
+    p.add_argument('--daemon', action='store_true', help="Have the planning daemon run the scenario")
+    p.add_argument('--address', default=DAEMON_ADDRESS,
+                   help=f"Daemon address, host:port or a Unix socket path (default {DAEMON_ADDRESS})")
     args = p.parse_args()
 
+    if args.serve:
+        import asyncio
+        from simulator.daemon.planning_daemon import serve
+        asyncio.run(serve(args.address))
+        return
+    if args.scenario is None:
+        p.error("a scenario is required unless --serve is given")
+    if args.daemon:
+        run_on_daemon(args.scenario, args.output_mode, args.address)
+        return
+
+    from simulator.scenario.builder import load_config, build_planners, build_scenario
     config = load_config(args.scenario)
 
     #build planners
     planners = build_planners(config['planners'])
     #print(planners.keys())
     #build + run scenarios
+    map_cache = {}
     for sdef in config['scenarios']:
-        scen = build_scenario(sdef, planners, args.output_mode)
+        scen = build_scenario(sdef, planners, args.output_mode, map_cache)
         print(f"\n=== Running {scen.name} ===")
         scen.run(planners=planners)
 
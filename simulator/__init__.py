@@ -3,4 +3,5 @@ from .environment.environment import Environment
 from .uav.uav import UAV
 from .path_planner.path_planner import AStarPlanner
 from .tester.tester import run_tests
-from .scenario.scenario import Scenario
\ No newline at end of file
+from .scenario.scenario import Scenario
+from .airspace.airspace_manager import AirspaceManager
\ No newline at end of file
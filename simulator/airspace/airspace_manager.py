@@ -0,0 +1,182 @@
+"""Online flight-request service: plans UAVs one at a time against a persistent reservation store."""
+import time
+from typing import Dict, List, Optional
+import simulator.utils.config as cfg
+from simulator.utils.shared_imports import np, State, Pos
+from simulator.uav.uav import UAV
+from simulator.environment.environment import Environment
+from simulator.path_planner.path_planner import AStarPlanner, remove_same_timestep_oscillations
+
+
+class AirspaceManager:
+    """
+    Accepts flight requests one at a time, as a UTM service does. Each UAV is planned with
+    the planner's a_star_search against everything already committed, and its path is booked
+    straight away; nobody else is ever replanned. Like plan_path, a UAV whose spawn is busy
+    or whose search fails is delayed until it fits, up to cfg.MAX_SIM_TIME after its request.
+    now is the current simulation time: requests never plan before it, and advance_to moves it
+    forward, evicting the reservations left behind when the planner's evict_reservations is on.
+    Every submit is timed, see latency_percentiles.
+    """
+
+    def __init__(self, environment: Environment, planner: Optional[AStarPlanner] = None, start: int = 0):
+        """
+        environment - Environment whose world_data and env reservations the flights share.
+            Submitted UAVs without an id get the next one after every id used so far, here
+            or by the environment's UAVs, so ids are never reused however many are submitted
+        planner - AStarPlanner whose search, heuristics and reservation backend are used
+        start - int, initial value of now"""
+        self.environment = environment
+        self.planner = planner if planner is not None else AStarPlanner()
+        self.now = start
+        self.grid = environment.world_data
+        self.reservations = self.planner.create_reservation_store(environment, cfg.MAX_SIM_TIME, start)
+        # env reservations act as a uav with an impossible id
+        for state in environment.reservations:
+            self.reservations.add(*state, -1)
+        self.obstacles = self.planner.create_obstacle_dict(environment)
+        # spawns and goals of every UAV submitted so far, for the heuristics that use them
+        self.starts: List[Pos] = []
+        self.goals: List[Pos] = []
+        self.uavs: Dict[int, UAV] = {}
+        self.next_id = max((uav.id for uav in environment.uav_list), default=-1) + 1
+        # committed paths by UAV id, in the format of a plan_path candidate
+        self.plans: Dict[int, List[State]] = {}
+        self.delays: Dict[int, int] = {}
+        # reason each rejected request was not planned, by id
+        self.rejected: Dict[int, str] = {}
+        # budget ("nodes" or "time") each committed flight ran out of, by id; its path stops short
+        self.budget_exhausted: Dict[int, str] = {}
+        self.searched: Dict[int, int] = {}
+        self.completed: set = set()
+        # wall time of every submit, in seconds
+        self.latencies: List[float] = []
+        self.stats = {"submitted": 0, "accepted": 0, "rejected": 0, "cancelled": 0,
+                      "reservations_evicted": 0}
+
+    def submit(self, uav: UAV) -> Optional[List[State]]:
+        """Plan and book a flight for uav, starting no earlier than max(uav.start_time, now).
+        A UAV submitted again, or another UAV given its id, has the previous flight cancelled first.
+        Returns its path, or None if the request is rejected (see rejected)."""
+        began = time.perf_counter()
+        if uav.id == -1:
+            uav.id = self.next_id
+            if uav.name is None:
+                uav.name = f"{uav.id}"
+        self.next_id = max(self.next_id, uav.id + 1)
+        if uav.id in self.plans:
+            self.cancel(uav.id)
+        if self.uavs.get(uav.id) is not uav:
+            self.uavs[uav.id] = uav
+            self.starts.append(uav.destinations[0])
+            self.goals.extend(uav.destinations[1:])
+            self.planner.track_footprint(self.reservations, uav)
+        self.rejected.pop(uav.id, None)
+        self.budget_exhausted.pop(uav.id, None)
+        self.stats["submitted"] += 1
+        path, reason = self._plan(uav)
+        if path is None:
+            self.rejected[uav.id] = reason
+            self.stats["rejected"] += 1
+        else:
+            self.planner.add_reservation(self.reservations, uav, path)
+            self.plans[uav.id] = path
+            self.delays[uav.id] = path[0].time - uav.start_time
+            self.stats["accepted"] += 1
+        self.latencies.append(time.perf_counter() - began)
+        return path
+
+    def _plan(self, uav: UAV):
+        """Search for the UAV's path as plan_path would, delaying its spawn until a search succeeds.
+        As there, the spawn is booked at its time and the next while the UAV searches, and stays
+        booked with the path, and a path cut short by a budget is recorded in budget_exhausted.
+        Returns (path, None) or (None, reason)."""
+        planner, reservations, grid = self.planner, self.reservations, self.grid
+        if not planner.route_is_reachable(grid, uav):
+            return None, "unreachable"
+        t = max(uav.start_time, self.now)
+        max_time = t + cfg.MAX_SIM_TIME
+        spawn = uav.destinations[0]
+        footprint = planner.footprint_cells(uav, spawn.x, spawn.y, spawn.z)
+        planner.search_deadline = None
+        if planner.time_budget_per_uav_ms is not None:
+            planner.search_deadline = time.perf_counter() + planner.time_budget_per_uav_ms / 1000
+        self.searched[uav.id] = 0
+        try:
+            while True:
+                t = planner.earliest_start(uav, footprint, t, reservations, grid, max_time)
+                if t is None:
+                    return None, "no slot"
+                planner.add_footprints_to_reservations(reservations, footprint, uav.id, t)
+                planner.add_footprints_to_reservations(reservations, footprint, uav.id, t + 1)
+                path = [State(spawn.x, spawn.y, spawn.z, t)]
+                for dest in uav.destinations[1:]:
+                    if planner.search_deadline is not None and time.perf_counter() >= planner.search_deadline:
+                        # out of search time: hold where the plan has got to
+                        self.budget_exhausted[uav.id] = "time"
+                        break
+                    if planner.goal_blocked(dest, path[-1].time, max_time, reservations, grid, uav):
+                        planner.release_spawn(reservations, footprint, uav.id, t)
+                        return None, "goal blocked"
+                    planner.budget_hit = None
+                    segment, segment_searched = planner.a_star_search(
+                        path[-1], dest, grid, max_time, uav, self.obstacles, reservations,
+                        self.goals, self.starts)
+                    self.searched[uav.id] += segment_searched
+                    if segment is None:
+                        path = None
+                        break
+                    path.extend(segment[1:])
+                    if planner.budget_hit is not None:
+                        self.budget_exhausted[uav.id] = planner.budget_hit
+                        break
+                if path is not None:
+                    return remove_same_timestep_oscillations(path), None
+                self.budget_exhausted.pop(uav.id, None)
+                planner.release_spawn(reservations, footprint, uav.id, t)
+                t += 1
+        finally:
+            planner.search_deadline = None
+
+    def cancel(self, uav_id: int) -> bool:
+        """Withdraw a committed flight, releasing its reservations from now on.
+        Returns False if the UAV has no committed flight."""
+        path = self.plans.pop(uav_id, None)
+        if path is None:
+            return False
+        uav = self.uavs[uav_id]
+        self.planner.remove_reservation(self.reservations, uav, path, since=self.now)
+        # the spawn booking may outlast the path's own footprint there
+        spawn = uav.destinations[0]
+        footprint = self.planner.footprint_cells(uav, spawn.x, spawn.y, spawn.z)
+        for t in (path[0].time, path[0].time + 1):
+            if t >= self.now:
+                self.reservations.remove_cells(footprint, t, uav_id)
+        self.delays.pop(uav_id, None)
+        self.budget_exhausted.pop(uav_id, None)
+        self.stats["cancelled"] += 1
+        return True
+
+    def advance_to(self, t: int) -> List[int]:
+        """Move now forward to t. Returns the ids of the flights that have ended by t."""
+        if t < self.now:
+            raise ValueError(f"Cannot advance from {self.now} back to {t}")
+        self.now = t
+        if self.planner.evict_reservations:
+            self.stats["reservations_evicted"] += self.reservations.evict_before(t, self.planner.archive)
+        ended = [uav_id for uav_id, path in self.plans.items()
+                 if uav_id not in self.completed and path[-1].time < t]
+        self.completed.update(ended)
+        return ended
+
+    def latency_percentiles(self, percentiles=cfg.AIRSPACE_LATENCY_PERCENTILES) -> Dict[str, float]:
+        """Submit latency percentiles in milliseconds ("p50", ...), with the mean and the
+        requests per second a single worker sustains at that mean."""
+        if not self.latencies:
+            return {}
+        latencies = np.array(self.latencies) * 1000
+        summary = {f"p{p:g}": float(np.percentile(latencies, p)) for p in percentiles}
+        summary["mean"] = float(latencies.mean())
+        summary["max"] = float(latencies.max())
+        summary["requests_per_s"] = 1000 / summary["mean"] if summary["mean"] > 0 else float("inf")
+        return summary
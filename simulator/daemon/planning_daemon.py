@@ -0,0 +1,206 @@
+"""Long-running planning daemon: keeps maps and their indexes warm between requests.
+
+Speaks JSON lines over a Unix socket or localhost TCP. Each request is one JSON object with
+an "op"; each reply is one JSON object with a "type". A "run" request streams "output" and
+"plans" replies and ends with "done"; every other request gets a single reply. A request that
+fails gets an "error" reply instead, and the connection stays usable.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import stat
+from typing import Dict, List
+import simulator.utils.config as cfg
+from simulator.environment.environment import Environment
+from simulator.airspace.airspace_manager import AirspaceManager
+from simulator.scenario.builder import load_config, build_planners, build_uav, build_map, build_scenario
+
+# the daemon has no display, so display and chart output modes fall back to text only
+NO_DISPLAY_MODES = {2: 1, 3: 0, 6: 0}
+
+
+def parse_address(address: str):
+    """("unix", path) for an address containing a "/", otherwise ("tcp", host, port) from host:port."""
+    if "/" in address:
+        return ("unix", address)
+    host, _, port = address.rpartition(":")
+    return ("tcp", host or "127.0.0.1", int(port))
+
+
+def encode_path(path) -> List[List[int]]:
+    return [[state.x, state.y, state.z, state.time] for state in path]
+
+
+class PlanningDaemon:
+    """
+    Serves planning requests from one process, so interpreter start-up, imports, map literals,
+    map scaling and each map's EnvironmentIndex are paid for once rather than per run.
+    Maps are cached by (name, scale, repetitions) as in main.py and keep their index, so every
+    scenario or session on a map shares it. Requests are planned one at a time.
+    Requests:
+      {"op": "run", "config": {...} or "path": "scenario.json", "output_mode": int} - run every
+          scenario of a scenario config like main.py, replying per scenario with its printed
+          results ("output") and candidate paths by planner and UAV id ("plans")
+      {"op": "open", "session": name, "map": {...}, "planner": {...}, "reservations": [...], "start": t}
+          - start an AirspaceManager for flight requests on a map
+      {"op": "submit", "session": name, "uav": {...}, "uav_id": id} - replies "plan" or "rejected";
+          with the uav_id of an earlier reply the request replaces that flight, otherwise it gets a new id
+      {"op": "cancel", "session": name, "uav_id": id}, {"op": "advance", "session": name, "t": t},
+      {"op": "latency", "session": name}, {"op": "close", "session": name}
+      {"op": "status"} - cached maps and open sessions
+      {"op": "shutdown"} - stop the daemon
+    """
+
+    def __init__(self):
+        self.map_cache = {}
+        self.sessions: Dict[str, AirspaceManager] = {}
+        self.server = None
+        # writers of the open connections, closed on shutdown
+        self.clients = set()
+        self.lock = asyncio.Lock()
+        self.ops = {"open": self.open_session, "submit": self.submit, "cancel": self.cancel,
+                    "advance": self.advance, "latency": self.latency, "close": self.close_session,
+                    "status": self.status}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection until the client closes it."""
+        async def send(reply: dict) -> None:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+
+        shutdown = False
+        self.clients.add(writer)
+        try:
+            while not shutdown and (line := await reader.readline()):
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                    op = message.get("op")
+                    if op == "run":
+                        await self.run(message, send)
+                    elif op == "shutdown":
+                        await send({"type": "done"})
+                        shutdown = True
+                    elif op in self.ops:
+                        async with self.lock:
+                            reply = await asyncio.to_thread(self.ops[op], message)
+                        await send(reply)
+                    else:
+                        raise ValueError(f"Unknown op: {op}")
+                except Exception as error:
+                    await send({"type": "error", "message": f"{type(error).__name__}: {error}"})
+        except (asyncio.CancelledError, ConnectionError):
+            # the daemon is shutting down, or the client went away mid-reply
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+        if shutdown:
+            self.server.close()
+            for client in list(self.clients):
+                client.close()
+
+    # --- scenario runs ---
+    async def run(self, message: dict, send) -> None:
+        config = message["config"] if "config" in message else load_config(message["path"])
+        output_mode = message.get("output_mode", -1)
+        async with self.lock:
+            planners = build_planners(config["planners"])
+            for sdef in config["scenarios"]:
+                name, text, plans = await asyncio.to_thread(self.run_scenario, sdef, planners, output_mode)
+                await send({"type": "output", "scenario": name, "text": text})
+                await send({"type": "plans", "scenario": name, "plans": plans})
+        await send({"type": "done"})
+
+    def run_scenario(self, sdef: dict, planners: dict, output_mode: int):
+        """Run one scenario as main.py does. Returns (name, printed output, candidate paths)."""
+        if output_mode == -1:
+            output_mode = sdef.get("output_mode", 0)
+        output_mode = NO_DISPLAY_MODES.get(output_mode, output_mode)
+        scen = build_scenario(sdef, planners, output_mode, self.map_cache)
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            print(f"\n=== Running {scen.name} ===")
+            scen.run(planners=planners)
+        plans = {planner: {uav_id: encode_path(path) for uav_id, path in paths.items()}
+                 for planner, paths in scen.all_candidate_paths.items()}
+        return scen.name, buffer.getvalue(), plans
+
+    # --- flight requests ---
+    def session(self, message: dict) -> AirspaceManager:
+        name = message.get("session")
+        if name not in self.sessions:
+            raise ValueError(f"Unknown session: {name}")
+        return self.sessions[name]
+
+    def open_session(self, message: dict) -> dict:
+        name = message["session"]
+        S_map = build_map(message["map"], self.map_cache)
+        environment = Environment(S_map.world_data, 0, map=S_map)
+        environment.set_reservations([tuple(res[:4]) for res in message.get("reservations", [])])
+        planner = build_planners({name: message.get("planner", {})})[name]
+        self.sessions[name] = AirspaceManager(environment, planner, start=message.get("start", 0))
+        return {"type": "opened", "session": name}
+
+    def submit(self, message: dict) -> dict:
+        manager = self.session(message)
+        uav = build_uav(message["uav"])
+        if message.get("uav_id") is not None:
+            uav.id = message["uav_id"]
+        path = manager.submit(uav)
+        latency = manager.latencies[-1] * 1000
+        if path is None:
+            return {"type": "rejected", "uav_id": uav.id, "reason": manager.rejected[uav.id],
+                    "latency_ms": latency}
+        return {"type": "plan", "uav_id": uav.id, "path": encode_path(path),
+                "delay": manager.delays[uav.id], "budget_exhausted": manager.budget_exhausted.get(uav.id),
+                "latency_ms": latency}
+
+    def cancel(self, message: dict) -> dict:
+        uav_id = message["uav_id"]
+        return {"type": "cancelled", "uav_id": uav_id, "ok": self.session(message).cancel(uav_id)}
+
+    def advance(self, message: dict) -> dict:
+        ended = self.session(message).advance_to(message["t"])
+        return {"type": "advanced", "t": message["t"], "ended": ended}
+
+    def latency(self, message: dict) -> dict:
+        manager = self.session(message)
+        return {"type": "latency", **manager.latency_percentiles(), **manager.stats}
+
+    def close_session(self, message: dict) -> dict:
+        self.session(message)
+        del self.sessions[message["session"]]
+        return {"type": "closed", "session": message["session"]}
+
+    def status(self, message: dict) -> dict:
+        return {"type": "status", "maps": [list(key) for key in self.map_cache],
+                "sessions": sorted(self.sessions)}
+
+
+async def serve(address: str, daemon: PlanningDaemon = None) -> None:
+    """Serve daemon (a new PlanningDaemon by default) on address until it is shut down.
+    A Unix socket left behind at the path is replaced and the socket is removed on shutdown;
+    any other file there is left alone and the daemon does not start."""
+    daemon = daemon if daemon is not None else PlanningDaemon()
+    kind = parse_address(address)
+    if kind[0] == "unix":
+        if os.path.lexists(kind[1]):
+            if not stat.S_ISSOCK(os.lstat(kind[1]).st_mode):
+                raise FileExistsError(f"{kind[1]} exists and is not a socket")
+            os.remove(kind[1])
+        server = await asyncio.start_unix_server(daemon.handle, path=kind[1], limit=cfg.DAEMON_MAX_LINE)
+    else:
+        server = await asyncio.start_server(daemon.handle, kind[1], kind[2], limit=cfg.DAEMON_MAX_LINE)
+    daemon.server = server
+    print(f"Planning daemon listening on {address}", flush=True)
+    try:
+        async with server:
+            with contextlib.suppress(asyncio.CancelledError):
+                await server.serve_forever()
+    finally:
+        if kind[0] == "unix" and os.path.lexists(kind[1]) and stat.S_ISSOCK(os.lstat(kind[1]).st_mode):
+            os.remove(kind[1])
@@ -1,13 +1,17 @@
 from typing import Any, List, Optional
-from simulator.utils.shared_imports import np, Math
+from simulator.utils.shared_imports import np
+from simulator.utils.footprint import uav_footprint
 from simulator.environment.display import DisplayManager
+from simulator.environment.environment_index import EnvironmentIndex
 from simulator.uav.uav import UAV
 from simulator.utils.shared_imports import Pos, State, TMState
 import simulator.utils.config as cfg
 
 class Environment:
-    def __init__(self, world_data: np.ndarray, output_mode: int = 0) -> None:
+    def __init__(self, world_data: np.ndarray, output_mode: int = 0, map=None) -> None:
         self.world_data: np.ndarray = world_data
+        # Map the world data came from, if any; planners cache map-wide structures on it
+        self.map = map
         self.render_world_data: np.ndarray = np.swapaxes(self.world_data, 1, 2)
         self.uav_list: List[UAV] = []        
         self.reservations = []
@@ -20,6 +24,24 @@ class Environment:
         self.schedule_index: int = 0
         self.output_mode = output_mode
         self.display_manager = None
+        # static data of world_data shared by planners, see static_index
+        self._index: Optional[EnvironmentIndex] = None
+
+    def static_index(self) -> EnvironmentIndex:
+        """
+        The EnvironmentIndex of world_data, built on first use and shared by every planner
+        run on this environment. Rebuilt if world_data has been replaced or edited since.
+        An environment on a Map keeps it on the map, so every environment built on that map shares it.
+        """
+        if self._index is None or not self._index.matches(self.world_data):
+            on_map = self.map is not None and self.map.world_data is self.world_data
+            index = self.map.index if on_map else None
+            if index is None or not index.matches(self.world_data):
+                index = EnvironmentIndex(self.world_data)
+                if on_map:
+                    self.map.index = index
+            self._index = index
+        return self._index
 
     def reset_environment(self) -> None:
         """
@@ -198,40 +220,8 @@ class Environment:
         Compute the footprint of a UAV at a given position.
         The footprint is the set of voxels that the UAV may occupy.
         """
-        footprint = []
-        radius = uav.inaccuracy[0]
-        shape = uav.inaccuracy[1]
-        if shape == 0:  # no corners
-            x_min = max(0, int(pos.x - radius))
-            x_max = min(self.world_data.shape[0], int(pos.x + radius) + 1)
-            y_min = max(0, int(pos.y - radius))
-            y_max = min(self.world_data.shape[1], int(pos.y + radius) + 1)
-            z_min = max(0, int(pos.z - radius))
-            z_max = min(self.world_data.shape[2], int(pos.z + radius) + 1)
-            for x in range(x_min, x_max):
-                for y in range(y_min, y_max):
-                    for z in range(z_min, z_max):
-                        distance = Math.sqrt(
-                            (x - pos.x) ** 2 +
-                            (y - pos.y) ** 2 +
-                            (z - pos.z) ** 2
-                        )
-                        if distance <= radius:
-                            footprint.append((x, y, z))
-        elif shape == 1:  # square
-            x_min = max(0, int(pos.x - radius))
-            x_max = min(self.world_data.shape[0], int(pos.x + radius) + 1)
-            y_min = max(0, int(pos.y - radius))
-            y_max = min(self.world_data.shape[1], int(pos.y + radius) + 1)
-            z_min = max(0, int(pos.z - radius))
-            z_max = min(self.world_data.shape[2], int(pos.z + radius) + 1)
-            for x in range(x_min, x_max):
-                for y in range(y_min, y_max):
-                    for z in range(z_min, z_max):
-                        footprint.append((x, y, z))
-        else:
-            raise ValueError("Invalid shape type")
-        return footprint
+        cells = uav_footprint(uav, pos.x, pos.y, pos.z, self.world_data.shape)
+        return [tuple(cell) for cell in cells.tolist()]
     
     def map_uavs(self) -> None:
         """
@@ -0,0 +1,56 @@
+"""Static data of an environment's world grid, built lazily and shared by every planner run on it."""
+import time
+import zlib
+from typing import Dict, Tuple
+from simulator.utils.shared_imports import np
+from simulator.utils.footprint import footprint_stencil
+from simulator.path_planner.distance_field import DistanceFieldCache
+
+
+def grid_digest(world_data: np.ndarray) -> int:
+    """Checksum of the grid's contents, so edits made in place are noticed."""
+    return zlib.crc32(np.ascontiguousarray(world_data).view(np.uint8))
+
+
+class EnvironmentIndex:
+    """
+    Precomputed structures of one world grid: the obstacle dict the heuristics look up,
+    inflated obstacle grids, free space, connected components and distance fields per
+    footprint class (held by a shared DistanceFieldCache), and footprint stencils.
+    Everything is built on first use. build_time is the total time spent building it,
+    which planners report separately from their planning time.
+    Get it through Environment.static_index(), which replaces it when world_data changes.
+    """
+
+    def __init__(self, world_data: np.ndarray):
+        self.grid = world_data
+        self.digest = grid_digest(world_data)
+        self.distance_fields = DistanceFieldCache()
+        self._obstacles = None
+        self._build_time = 0.0
+
+    def matches(self, world_data: np.ndarray) -> bool:
+        """True if the index was built for this grid and its contents have not changed since."""
+        return world_data is self.grid and grid_digest(world_data) == self.digest
+
+    @property
+    def build_time(self) -> float:
+        return self._build_time + self.distance_fields.build_time
+
+    @property
+    def obstacles(self) -> Dict[tuple, bool]:
+        """Maps every (x, y, z) obstacle voxel of the grid to True. Shared, so must not be modified."""
+        if self._obstacles is None:
+            began = time.perf_counter()
+            self._obstacles = {tuple(coord): True for coord in np.argwhere(self.grid == 1).tolist()}
+            self._build_time += time.perf_counter() - began
+        return self._obstacles
+
+    def inflated(self, footprint: Tuple[float, int]) -> np.ndarray:
+        """Voxels where a footprint of the (radius, shape) class would overlap an obstacle."""
+        return self.distance_fields.blocked(self.grid, footprint)
+
+    @staticmethod
+    def stencil(footprint: Tuple[float, int]) -> np.ndarray:
+        """Offsets covered by a footprint of the class (cached process-wide by footprint_stencil)."""
+        return footprint_stencil(*footprint)
@@ -10,6 +10,11 @@ class Map:
         :param repetitions: Number of times to replicate the first 2D array across the 3D dimension (int)
         """
         self.name = name
+        self.scale = scale
+        # structures planners derive from world_data (e.g. cluster abstractions), shared by every user of the map
+        self.abstractions = {}
+        # EnvironmentIndex of world_data, shared by every Environment built on the map (see Environment.static_index)
+        self.index = None
 
         #Scale world data
         if scale != 0:
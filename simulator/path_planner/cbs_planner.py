@@ -0,0 +1,299 @@
+"""Conflict-Based Search over the single-agent A* search of AStarPlanner."""
+import copy
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import simulator.utils.config as cfg
+from simulator.utils.shared_imports import np, State, Pos
+from simulator.uav.uav import UAV
+from simulator.environment.environment import Environment
+from simulator.reservations.reservations import make_reservation_store
+from simulator.path_planner.distance_field import DistanceFieldCache
+from simulator.path_planner.path_planner import AStarPlanner, remove_same_timestep_oscillations, SEARCH_STATS
+
+# constraints are booked in the low-level reservation store under this id
+CONSTRAINT_ID = -2
+
+
+class CTNode:
+    """A node of the constraint tree: per-UAV constraints, the paths satisfying them and their cost."""
+
+    def __init__(self, node_id: int, constraints: Dict[int, FrozenSet[tuple]],
+                 paths: Dict[int, List[State]], searched: Dict[int, int], depth: int = 0):
+        self.id = node_id
+        self.constraints = constraints
+        self.paths = paths
+        self.searched = searched
+        self.depth = depth
+        # sum of arrival times
+        self.cost = sum(path[-1].time for path in paths.values())
+        self.conflict: Optional[Tuple[tuple, int, int]] = None
+        self.conflict_count = 0
+
+
+def plan_single_uav(planner: AStarPlanner, uav: UAV, constraints: FrozenSet[tuple], grid: np.ndarray,
+                    env_reservations: list, max_time: int, obstacles: Dict[tuple, bool],
+                    goals: List[Pos], starts: List[Pos]):
+    """
+    Low level of CBS: plan every segment of uav from its start time with a_star_search,
+    treating env reservations and the UAV's constraints as booked by other UAVs.
+    Like plan_path, the spawn is delayed while its footprint is booked at the spawn time or the step after.
+    Module level so that it can run in a worker process.
+    Returns (path or None, nodes searched, wall time in seconds).
+    """
+    begin = time.perf_counter()
+    reservations = make_reservation_store(planner.reservation_backend, grid.shape, max_time)
+    planner.track_footprint(reservations, uav)
+    for state in env_reservations:
+        reservations.add(*state, -1)
+    for x, y, z, t in constraints:
+        reservations.add(x, y, z, t, CONSTRAINT_ID)
+    searched = 0
+    spawn = uav.destinations[0]
+    footprint = planner.footprint_cells(uav, spawn.x, spawn.y, spawn.z)
+    start_time = uav.start_time
+    while reservations.any_other(footprint, start_time, uav.id) or reservations.any_other(footprint, start_time + 1, uav.id):
+        start_time += 1
+        if start_time >= max_time:
+            return None, searched, time.perf_counter() - begin
+    path = [State(spawn.x, spawn.y, spawn.z, start_time)]
+    for dest in uav.destinations[1:]:
+        segment, segment_searched = planner.a_star_search(
+            path[-1], dest, grid, max_time, uav, obstacles, reservations, goals, starts)
+        searched += segment_searched
+        if segment is None or planner.budget_hit is not None:
+            # a partial path cannot be part of a conflict-free solution
+            return None, searched, time.perf_counter() - begin
+        path.extend(segment[1:])
+    return remove_same_timestep_oscillations(path), searched, time.perf_counter() - begin
+
+
+# planner and shared inputs of a worker process, set once by init_worker
+_worker = None
+
+
+def init_worker(planner: AStarPlanner, shared: tuple) -> None:
+    """Pool initializer: keep the low-level planner and the inputs shared by every job."""
+    global _worker
+    _worker = (planner, shared)
+
+
+def plan_in_worker(uav: UAV, constraints: FrozenSet[tuple]):
+    """plan_single_uav in a worker process, with the search stats the job gathered appended."""
+    planner, shared = _worker
+    planner.stats = dict.fromkeys(SEARCH_STATS, 0)
+    return plan_single_uav(planner, uav, constraints, *shared) + (planner.stats,)
+
+
+class CBSPlanner(AStarPlanner):
+    """
+    Conflict-Based Search. Every UAV is planned on its own with a_star_search; the
+    earliest pair of overlapping footprint reservations is split into two child nodes,
+    each forbidding that voxel at that time to one of the UAVs.
+    Constraints are enforced through the neighbour filter, so collisions are always disabled.
+    focal_weight > 1 gives ECBS-style bounded-suboptimal search: the next node is the one
+    with the fewest conflicts among those within focal_weight of the cheapest.
+    If no conflict-free node is found within max_nodes, falls back to prioritised planning.
+    With several workers, each round expands up to workers // 2 of the best open nodes that
+    still have conflicts (one pair of low-level searches each) and runs all their searches in
+    parallel. A conflict-free node is only accepted once it is the best node open, so results
+    match the one-node-at-a-time search whenever no batch holds the node it would return.
+    """
+
+    def __init__(self, *args, focal_weight: float = cfg.CBS_FOCAL_WEIGHT,
+                 max_nodes: int = cfg.CBS_MAX_NODES, workers: int = cfg.CBS_WORKERS, **kwargs):
+        """
+        focal_weight - float >= 1, suboptimality bound of the high-level search (1 is plain CBS)
+        max_nodes - int, constraint tree nodes to generate before falling back
+        workers - int, processes used for the low-level searches of child nodes (1 runs them inline,
+            expanding one node at a time)
+        Other arguments are as for AStarPlanner."""
+        kwargs["disable_collisions"] = True
+        super().__init__(*args, **kwargs)
+        self.focal_weight = focal_weight
+        self.max_nodes = max_nodes
+        self.workers = workers
+        self.node_log: List[Dict[str, float]] = []
+
+    def reservation_cells(self, uav: UAV, path: List[State]) -> set:
+        """Voxel-times the path books, following add_reservation."""
+        cells = set()
+        for i, node in enumerate(path):
+            for x, y, z in self.footprint_cells(uav, node.x, node.y, node.z).tolist():
+                cells.add((x, y, z, node.time))
+            if i > 0 and node.time > path[i - 1].time:
+                prev = path[i - 1]
+                for x, y, z in self.footprint_cells(uav, prev.x, prev.y, prev.z).tolist():
+                    cells.add((x, y, z, node.time))
+        last = path[-1]
+        for x, y, z in self.footprint_cells(uav, last.x, last.y, last.z).tolist():
+            cells.add((x, y, z, last.time + 1))
+        return cells
+
+    def low_level_planner(self) -> "CBSPlanner":
+        """Copy of the planner to send to worker processes once, without the
+        per-run records and caches that grow while planning."""
+        planner = copy.copy(self)
+        planner.node_log = []
+        planner.stats = dict.fromkeys(SEARCH_STATS, 0)
+        planner.distance_fields = DistanceFieldCache()
+        planner.failures, planner.budget_exhausted, planner.expansions_saved = {}, {}, {}
+        planner.failed_searches = {}
+        return planner
+
+    def find_conflicts(self, node: CTNode, uavs: Dict[int, UAV]) -> None:
+        """Set node.conflict to the earliest shared voxel-time and node.conflict_count to the conflicting pairs."""
+        owners: Dict[tuple, int] = {}
+        pairs = set()
+        earliest = None
+        for uav_id in sorted(node.paths):
+            for cell in self.reservation_cells(uavs[uav_id], node.paths[uav_id]):
+                other = owners.setdefault(cell, uav_id)
+                if other != uav_id:
+                    pairs.add((other, uav_id))
+                    if earliest is None or (cell[3], cell) < (earliest[0][3], earliest[0]):
+                        earliest = (cell, other, uav_id)
+        node.conflict = earliest
+        node.conflict_count = len(pairs)
+
+    def pop_node(self, open_list: list) -> CTNode:
+        if self.focal_weight <= 1:
+            return heapq.heappop(open_list)[-1]
+        bound = open_list[0][0] * self.focal_weight
+        focal = [entry for entry in open_list if entry[0] <= bound]
+        chosen = min(focal, key=lambda entry: (entry[-1].conflict_count, entry[0], entry[2]))
+        open_list.remove(chosen)
+        heapq.heapify(open_list)
+        return chosen[-1]
+
+    def pop_batch(self, open_list: list) -> List[CTNode]:
+        """
+        Up to workers // 2 of the next nodes to expand, in the order pop_node gives them,
+        stopping before a conflict-free node unless it comes first: that node is the solution
+        only when nothing better is open, so it goes back until the batch has been expanded.
+        Never takes more nodes than can be expanded within max_nodes.
+        """
+        size = max(1, self.workers // 2)
+        batch = []
+        while open_list and len(batch) < size and self.stats["ct_nodes"] + 2 * len(batch) < self.max_nodes:
+            node = self.pop_node(open_list)
+            if node.conflict is None and batch:
+                heapq.heappush(open_list, (node.cost, node.conflict_count, node.id, node))
+                break
+            batch.append(node)
+            if node.conflict is None:
+                break
+        return batch
+
+    def plan_path(self, environment: Environment):
+        """Plan every UAV with CBS. Returns (candidate_paths, delay_counts, searched_counts)."""
+        self.stats = dict.fromkeys(SEARCH_STATS, 0)
+        self.stats.update({"ct_nodes": 0, "ct_expanded": 0, "ct_batches": 0, "low_level_searches": 0,
+                           "low_level_searched": 0, "fallback": 0})
+        self.node_log = []
+        self.failures, self.budget_exhausted, self.expansions_saved = {}, {}, {}
+        uav_list = environment.uav_list
+        uavs = {uav.id: uav for uav in uav_list}
+        grid = environment.world_data
+        max_time = max(uav.start_time for uav in uav_list) + cfg.MAX_SIM_TIME
+        obstacles = self.create_obstacle_dict(environment)
+        goals = [dest for uav in uav_list for dest in uav.destinations[1:]]
+        starts = [uav.destinations[0] for uav in uav_list]
+        env_reservations = list(environment.reservations)
+        searched_counts = {uav.id: 0 for uav in uav_list}
+        delay_counts = {uav.id: 0 for uav in uav_list}
+        shared = (grid, env_reservations, max_time, obstacles, goals, starts)
+
+        executor = None
+        if self.workers > 1:
+            # the planner and shared inputs are sent once per worker, not with every job
+            executor = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                           initargs=(self.low_level_planner(), shared))
+        try:
+            def run(jobs):
+                """Low-level searches for [(uav_id, constraints)], in parallel when a pool exists."""
+                if executor is None:
+                    return [plan_single_uav(self, uavs[uav_id], constraints, *shared) for uav_id, constraints in jobs]
+                futures = [executor.submit(plan_in_worker, uavs[uav_id], constraints)
+                           for uav_id, constraints in jobs]
+                results = []
+                for future in futures:
+                    *result, stats = future.result()
+                    for key, value in stats.items():
+                        self.stats[key] = self.stats.get(key, 0) + value
+                    results.append(tuple(result))
+                return results
+
+            def record(node: CTNode, replanned, results, batch_time: float, began: float):
+                """Log a new node. wall_time is the low-level batch that produced it plus its conflict check."""
+                searched = sum(result[1] for result in results)
+                for uav_id, result in zip(replanned, results):
+                    searched_counts[uav_id] += result[1]
+                self.stats["low_level_searches"] += len(results)
+                self.stats["low_level_searched"] += searched
+                self.node_log.append({
+                    "node": node.id, "depth": node.depth, "cost": node.cost,
+                    "conflicts": node.conflict_count, "replanned": list(replanned),
+                    "searched": searched, "low_level_time": sum(result[2] for result in results),
+                    "wall_time": batch_time + time.perf_counter() - began})
+
+            began = time.perf_counter()
+            root_ids = [uav.id for uav in uav_list]
+            results = run([(uav_id, frozenset()) for uav_id in root_ids])
+            batch_time = time.perf_counter() - began
+            if all(result[0] is not None for result in results):
+                began = time.perf_counter()
+                root = CTNode(0, {uav_id: frozenset() for uav_id in root_ids},
+                              {uav_id: result[0] for uav_id, result in zip(root_ids, results)},
+                              {uav_id: result[1] for uav_id, result in zip(root_ids, results)})
+                self.find_conflicts(root, uavs)
+                record(root, root_ids, results, batch_time, began)
+                self.stats["ct_nodes"] = 1
+                open_list = [(root.cost, root.conflict_count, root.id, root)]
+                while open_list and self.stats["ct_nodes"] < self.max_nodes:
+                    batch = self.pop_batch(open_list)
+                    self.stats["ct_expanded"] += len(batch)
+                    self.stats["ct_batches"] += 1
+                    if batch[0].conflict is None:
+                        node = batch[0]
+                        for uav_id, path in node.paths.items():
+                            delay_counts[uav_id] = path[0].time - uavs[uav_id].start_time
+                        return dict(node.paths), delay_counts, searched_counts
+                    # (parent, uav_id, constraints) of every child of the batch
+                    jobs = []
+                    for node in batch:
+                        cell, first, second = node.conflict
+                        # a constraint the UAV already has cannot be resolved by replanning it (e.g. at its spawn)
+                        jobs += [(node, uav_id, node.constraints[uav_id] | {cell}) for uav_id in (first, second)
+                                 if cell not in node.constraints[uav_id]]
+                    began = time.perf_counter()
+                    results = run([(uav_id, constraints) for _, uav_id, constraints in jobs])
+                    batch_time = time.perf_counter() - began
+                    for (node, uav_id, constraints), result in zip(jobs, results):
+                        began = time.perf_counter()
+                        self.stats["ct_nodes"] += 1
+                        if result[0] is None:
+                            continue
+                        child = CTNode(self.stats["ct_nodes"] - 1,
+                                       {**node.constraints, uav_id: constraints},
+                                       {**node.paths, uav_id: result[0]},
+                                       {**node.searched, uav_id: result[1]}, node.depth + 1)
+                        self.find_conflicts(child, uavs)
+                        record(child, [uav_id], [result], batch_time, began)
+                        heapq.heappush(open_list, (child.cost, child.conflict_count, child.id, child))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # no conflict-free solution within the node budget
+        self.stats["fallback"] = 1
+        cbs_stats, cbs_searched = self.stats, searched_counts
+        candidate_paths, delay_counts, searched_counts = super().plan_path(environment)
+        # the fallback's search stats add to those of the CBS low level
+        for key, value in self.stats.items():
+            cbs_stats[key] = cbs_stats.get(key, 0) + value
+        self.stats = cbs_stats
+        for uav_id, searched in cbs_searched.items():
+            searched_counts[uav_id] += searched
+        return candidate_paths, delay_counts, searched_counts
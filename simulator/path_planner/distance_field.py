@@ -0,0 +1,202 @@
+"""Backward distance fields over the static free space, used by the true_distance heuristic."""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from simulator.utils.shared_imports import np
+from simulator.utils.footprint import footprint_stencil, footprint_sums
+import simulator.utils.config as cfg
+
+UNREACHABLE = -1
+
+
+def obstacle_counts(world_data: np.ndarray, radius: float, shape: int) -> np.ndarray:
+    """
+    Number of obstacle voxels a footprint of the given class covers when centred on each
+    voxel of the grid: count_obstacles of its footprint cells, for every voxel at once.
+    Voxels outside the grid count as free, like count_obstacles.
+    """
+    obstacles = (world_data == 1).astype(np.min_scalar_type(len(footprint_stencil(radius, shape))))
+    return footprint_sums(obstacles, radius, shape)
+
+
+def inflate_obstacles(world_data: np.ndarray, radius: float, shape: int) -> np.ndarray:
+    """
+    Boolean grid marking the voxels where a footprint of the given class would
+    overlap an obstacle. Voxels outside the grid count as free, like count_obstacles.
+    """
+    return obstacle_counts(world_data, radius, shape) > 0
+
+
+def distance_field(free: np.ndarray, goal: Tuple[int, int, int]) -> np.ndarray:
+    """
+    Number of 6-connected moves from every voxel to goal through free voxels,
+    UNREACHABLE where the goal cannot be reached. Breadth-first, one layer per step.
+    """
+    dist = np.full(free.shape, UNREACHABLE, dtype=np.int32)
+    if not all(0 <= g < n for g, n in zip(goal, free.shape)):
+        return dist
+    dist[goal] = 0
+    frontier = np.zeros(free.shape, dtype=bool)
+    frontier[goal] = True
+    unvisited = free.copy()
+    unvisited[goal] = False
+    step = 0
+    while frontier.any():
+        step += 1
+        grown = np.zeros_like(frontier)
+        grown[1:] |= frontier[:-1]
+        grown[:-1] |= frontier[1:]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        grown[:, :, 1:] |= frontier[:, :, :-1]
+        grown[:, :, :-1] |= frontier[:, :, 1:]
+        frontier = grown & unvisited
+        unvisited &= ~frontier
+        dist[frontier] = step
+    dist.flags.writeable = False
+    return dist
+
+
+def label_components(free: np.ndarray) -> np.ndarray:
+    """
+    6-connected components of the free voxels. Each free voxel is labelled with the
+    smallest flat index in its component, blocked voxels with UNREACHABLE.
+    Labels spread to neighbours one step per pass, with pointer jumping in between
+    so long corridors settle in a few passes.
+    """
+    size = free.size
+    flat_free = free.ravel()
+    labels = np.where(flat_free, np.arange(size, dtype=np.int64), size)
+    while True:
+        grid = labels.reshape(free.shape)
+        spread = grid.copy()
+        np.minimum(spread[1:], grid[:-1], out=spread[1:])
+        np.minimum(spread[:-1], grid[1:], out=spread[:-1])
+        np.minimum(spread[:, 1:], grid[:, :-1], out=spread[:, 1:])
+        np.minimum(spread[:, :-1], grid[:, 1:], out=spread[:, :-1])
+        np.minimum(spread[:, :, 1:], grid[:, :, :-1], out=spread[:, :, 1:])
+        np.minimum(spread[:, :, :-1], grid[:, :, 1:], out=spread[:, :, :-1])
+        spread = np.where(flat_free, spread.ravel(), size)
+        # follow each label to the label of the voxel it names
+        while True:
+            jumped = spread.copy()
+            jumped[flat_free] = spread[spread[flat_free]]
+            if np.array_equal(jumped, spread):
+                break
+            spread = jumped
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    labels = np.where(flat_free, labels, UNREACHABLE).reshape(free.shape)
+    labels.flags.writeable = False
+    return labels
+
+
+class DistanceFieldCache:
+    """
+    LRU cache of distance fields for one world grid, keyed by (goal, footprint class).
+    A footprint class of None means only the UAV's centre voxel has to be free.
+    The obstacle counts, inflated obstacles and connected components of the free space
+    are kept per footprint class as well. Switching to a different grid clears the cache.
+    build_time is the total time spent computing what the cache holds.
+    """
+
+    def __init__(self, max_entries: int = cfg.DISTANCE_FIELD_CACHE_SIZE,
+                 max_bytes: int = cfg.DISTANCE_FIELD_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.grid: Optional[np.ndarray] = None
+        self.fields: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.counts = {}
+        self.inflated = {}
+        self.free_space = {}
+        self.labels = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.build_time = 0.0
+
+    def _use(self, grid: np.ndarray) -> None:
+        if grid is not self.grid:
+            self.clear()
+            self.grid = grid
+
+    def obstacle_counts(self, grid: np.ndarray, footprint: Tuple[float, int]) -> np.ndarray:
+        """Obstacle voxels under a footprint of the class centred on each voxel (see obstacle_counts)."""
+        self._use(grid)
+        counts = self.counts.get(footprint)
+        if counts is None:
+            began = time.perf_counter()
+            counts = obstacle_counts(grid, *footprint)
+            counts.flags.writeable = False
+            self.counts[footprint] = counts
+            self.build_time += time.perf_counter() - began
+        return counts
+
+    def blocked(self, grid: np.ndarray, footprint: Tuple[float, int]) -> np.ndarray:
+        """Voxels where a footprint of the class overlaps an obstacle (see inflate_obstacles)."""
+        self._use(grid)
+        blocked = self.inflated.get(footprint)
+        if blocked is None:
+            counts = self.obstacle_counts(grid, footprint)
+            began = time.perf_counter()
+            blocked = counts > 0
+            blocked.flags.writeable = False
+            self.inflated[footprint] = blocked
+            self.build_time += time.perf_counter() - began
+        return blocked
+
+    def _free(self, footprint: Optional[Tuple[float, int]]) -> np.ndarray:
+        free = self.free_space.get(footprint)
+        if free is None:
+            # the inflated obstacles time themselves
+            blocked = None if footprint is None else self.blocked(self.grid, footprint)
+            began = time.perf_counter()
+            free = self.grid == 0
+            if blocked is not None:
+                free &= ~blocked
+            self.free_space[footprint] = free
+            self.build_time += time.perf_counter() - began
+        return free
+
+    def get(self, grid: np.ndarray, goal: Tuple[int, int, int],
+            footprint: Optional[Tuple[float, int]] = None) -> np.ndarray:
+        self._use(grid)
+        key = (goal, footprint)
+        field = self.fields.get(key)
+        if field is not None:
+            self.hits += 1
+            self.fields.move_to_end(key)
+            return field
+        self.misses += 1
+        free = self._free(footprint)
+        began = time.perf_counter()
+        field = distance_field(free, goal)
+        self.build_time += time.perf_counter() - began
+        self.fields[key] = field
+        self.nbytes += field.nbytes
+        while len(self.fields) > 1 and (len(self.fields) > self.max_entries or self.nbytes > self.max_bytes):
+            _, evicted = self.fields.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return field
+
+    def components(self, grid: np.ndarray, footprint: Optional[Tuple[float, int]] = None) -> np.ndarray:
+        """Connected-component labels of the free space (see label_components)."""
+        self._use(grid)
+        labels = self.labels.get(footprint)
+        if labels is None:
+            free = self._free(footprint)
+            began = time.perf_counter()
+            labels = label_components(free)
+            self.labels[footprint] = labels
+            self.build_time += time.perf_counter() - began
+        return labels
+
+    def clear(self) -> None:
+        self.grid = None
+        self.fields.clear()
+        self.counts.clear()
+        self.inflated.clear()
+        self.free_space.clear()
+        self.labels.clear()
+        self.nbytes = 0
@@ -0,0 +1,253 @@
+"""Bounded open sets for beam search in the A* planner."""
+import heapq
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional
+
+_f_of = itemgetter(0)
+
+
+class MinMaxHeap:
+    """
+    Double-ended priority queue: the smallest and the largest entry can both be
+    read in O(1) and removed in O(log n). Even levels are min levels, odd levels max levels.
+    """
+
+    def __init__(self, entries: Optional[List] = None):
+        self.heap = list(entries) if entries else []
+        for i in reversed(range(len(self.heap) // 2)):
+            self._trickle_down(i)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    @staticmethod
+    def _is_min_level(i: int) -> bool:
+        return (i + 1).bit_length() % 2 == 1
+
+    def _max_index(self) -> int:
+        n = len(self.heap)
+        if n <= 2:
+            return n - 1
+        return 1 if self.heap[1] >= self.heap[2] else 2
+
+    def peek_min(self):
+        return self.heap[0]
+
+    def peek_max(self):
+        return self.heap[self._max_index()]
+
+    def push(self, entry):
+        heap = self.heap
+        heap.append(entry)
+        i = len(heap) - 1
+        if i == 0:
+            return
+        parent = (i - 1) // 2
+        if self._is_min_level(i):
+            if heap[i] > heap[parent]:
+                heap[i], heap[parent] = heap[parent], heap[i]
+                self._bubble_up(parent, True)
+            else:
+                self._bubble_up(i, False)
+        else:
+            if heap[i] < heap[parent]:
+                heap[i], heap[parent] = heap[parent], heap[i]
+                self._bubble_up(parent, False)
+            else:
+                self._bubble_up(i, True)
+
+    def pop_min(self):
+        return self._remove(0)
+
+    def pop_max(self):
+        return self._remove(self._max_index())
+
+    def _remove(self, i: int):
+        heap = self.heap
+        last = heap.pop()
+        if i == len(heap):
+            return last
+        entry = heap[i]
+        heap[i] = last
+        self._trickle_down(i)
+        return entry
+
+    def _bubble_up(self, i: int, towards_max: bool):
+        # compare with grandparents on the same kind of level
+        heap = self.heap
+        while i > 2:
+            grandparent = ((i - 1) // 2 - 1) // 2
+            if (heap[i] > heap[grandparent]) if towards_max else (heap[i] < heap[grandparent]):
+                heap[i], heap[grandparent] = heap[grandparent], heap[i]
+                i = grandparent
+            else:
+                break
+
+    def _trickle_down(self, i: int):
+        heap = self.heap
+        n = len(heap)
+        is_min = self._is_min_level(i)
+        while True:
+            first_child = 2 * i + 1
+            if first_child >= n:
+                return
+            candidates = [c for c in (first_child, first_child + 1) if c < n]
+            candidates += [g for g in range(4 * i + 3, 4 * i + 7) if g < n]
+            if is_min:
+                m = min(candidates, key=heap.__getitem__)
+                better = heap[m] < heap[i]
+            else:
+                m = max(candidates, key=heap.__getitem__)
+                better = heap[m] > heap[i]
+            if not better:
+                return
+            heap[i], heap[m] = heap[m], heap[i]
+            if m <= first_child + 1:
+                return
+            parent = (m - 1) // 2
+            if (heap[m] > heap[parent]) if is_min else (heap[m] < heap[parent]):
+                heap[m], heap[parent] = heap[parent], heap[m]
+            i = m
+
+
+class BeamFrontier:
+    """
+    Open set of the global beam: a binary heap cut back to the capacity entries with the
+    smallest f before each pop, keeping the earliest heap positions among entries tied on f.
+    This is the selection a_star_search has always made with heapq.nsmallest, so beam
+    searches keep their paths; a stable in-place sort stands in for nsmallest's copy.
+    Evictions are counted in stats["beam_evictions"] when stats is given.
+    """
+
+    def __init__(self, capacity: int, stats: Optional[Dict[str, int]] = None):
+        self.capacity = capacity
+        self.stats = stats
+        self.heap: List = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, entry) -> None:
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        heap = self.heap
+        if len(heap) > self.capacity:
+            if self.stats is not None:
+                self.stats["beam_evictions"] += len(heap) - self.capacity
+            # sorted by f alone, ties keep their heap order: nsmallest(capacity, heap, key=f)
+            heap.sort(key=_f_of)
+            del heap[self.capacity:]
+            heapq.heapify(heap)
+        return heapq.heappop(heap)
+
+
+class BoundedFrontier:
+    """
+    Open set holding at most capacity entries. Pushing into a full frontier evicts
+    the worst entry, so the frontier always holds the capacity best entries seen.
+    Uses a plain binary heap until the bound is first reached.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.heap: List = []
+        self.bounded: Optional[MinMaxHeap] = None
+
+    def __len__(self) -> int:
+        return len(self.bounded) if self.bounded is not None else len(self.heap)
+
+    def push(self, entry):
+        """Add an entry, returning the evicted entry (possibly entry itself) or None."""
+        if self.bounded is None:
+            if len(self.heap) < self.capacity:
+                heapq.heappush(self.heap, entry)
+                return None
+            self.bounded = MinMaxHeap(self.heap)
+            self.heap = []
+        if len(self.bounded) < self.capacity:
+            self.bounded.push(entry)
+            return None
+        if entry >= self.bounded.peek_max():
+            return entry
+        self.bounded.push(entry)
+        return self.bounded.pop_max()
+
+    def pop(self):
+        if self.bounded is not None:
+            return self.bounded.pop_min()
+        return heapq.heappop(self.heap)
+
+
+class LayeredFrontier:
+    """
+    Open set that bounds each time layer separately instead of the whole frontier.
+    layer_of maps a search state to its layer.
+    Evictions are counted in stats["beam_evictions"] when stats is given.
+    """
+
+    def __init__(self, capacity: int, layer_of: Callable, stats: Optional[Dict[str, int]] = None):
+        self.capacity = capacity
+        self.layer_of = layer_of
+        self.stats = stats
+        self.layers: Dict[int, BoundedFrontier] = {}
+        self.heap: List = []
+        self.evicted: Dict = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, entry):
+        layer = self.layer_of(entry[1])
+        frontier = self.layers.get(layer)
+        if frontier is None:
+            frontier = self.layers[layer] = BoundedFrontier(self.capacity)
+        evicted = frontier.push(entry)
+        if evicted is not None and self.stats is not None:
+            self.stats["beam_evictions"] += 1
+        if evicted is entry:
+            return
+        heapq.heappush(self.heap, entry)
+        if evicted is None:
+            self.size += 1
+        else:
+            # evicted entries stay in the global heap and are skipped on pop
+            self.evicted[evicted] = self.evicted.get(evicted, 0) + 1
+
+    def pop(self):
+        while True:
+            entry = heapq.heappop(self.heap)
+            count = self.evicted.get(entry)
+            if not count:
+                break
+            if count == 1:
+                del self.evicted[entry]
+            else:
+                self.evicted[entry] = count - 1
+        # the smallest live entry overall is also the smallest in its layer
+        self.layers[self.layer_of(entry[1])].pop()
+        self.size -= 1
+        return entry
+
+
+def state_time(state) -> int:
+    return state[3]
+
+
+BEAM_MODES = {
+    "global": lambda capacity, layer_of, stats: BeamFrontier(capacity, stats),
+    "layered": lambda capacity, layer_of, stats: LayeredFrontier(capacity, layer_of, stats),
+}
+
+
+def make_frontier(beam_mode: str, capacity: int, layer_of: Callable = state_time,
+                  stats: Optional[Dict[str, int]] = None):
+    """
+    Create the open set for a search with the given beam mode and width.
+    layer_of gives the time of the states the search pushes, for the layered mode.
+    Entries the beam drops are counted in stats["beam_evictions"] when stats is given.
+    """
+    if beam_mode not in BEAM_MODES:
+        raise ValueError(f"Unknown beam mode: {beam_mode}")
+    return BEAM_MODES[beam_mode](capacity, layer_of, stats)
@@ -0,0 +1,402 @@
+"""
+Heuristic terms for the A* planner.
+Each term is registered once at module level under the name used in the planner's
+heuristics dictionary. AStarPlanner resolves the enabled terms when it is created and
+binds them to a SearchContext once per segment search, so the inner loop only calls
+the terms that are switched on.
+"""
+from typing import Callable, Dict, List, Tuple
+from simulator.utils.shared_imports import np, Math
+from simulator.utils.footprint import footprint_class
+
+# a bound term is called as score(state, came_from)
+Scorer = Callable[[tuple, dict], float]
+
+
+class SearchContext:
+    """Segment-specific inputs that the heuristic terms are bound to."""
+
+    def __init__(self, planner, uav, start, goal, grid, reservations, obstacles, goals, starts):
+        self.planner = planner
+        self.uav = uav
+        self.start = start
+        self.goal = goal
+        self.grid = grid
+        self.reservations = reservations
+        self.obstacles = obstacles
+        self.goals = goals
+        self.starts = starts
+
+
+class Heuristic:
+    """
+    A named term of the h score.
+    bind - function taking a SearchContext and returning a Scorer
+    veto - a positive score rejects the neighbour when collisions are disabled
+    consistent - the term is a consistent heuristic on its own when each move costs at least 1
+    per_timestep - the term counts timesteps at max_speed rather than cells. Under macro moves
+        a step of cost 1 crosses up to max_speed cells, so the other consistent terms are
+        divided by max_speed there (see bind_terms)
+    """
+
+    def __init__(self, name: str, bind: Callable[[SearchContext], Scorer],
+                 veto: bool = False, consistent: bool = False, per_timestep: bool = False):
+        self.name = name
+        self.bind = bind
+        self.veto = veto
+        self.consistent = consistent
+        self.per_timestep = per_timestep
+
+    def enabled(self, heuristics: Dict[str, bool]) -> bool:
+        return heuristics.get(self.name) is True
+
+
+class TruthyHeuristic(Heuristic):
+    """A term that is enabled by any truthy value rather than only True."""
+
+    def enabled(self, heuristics: Dict[str, bool]) -> bool:
+        return bool(heuristics.get(self.name))
+
+
+# name -> Heuristic, in the order the terms are added to h
+HEURISTICS: Dict[str, Heuristic] = {}
+# zeroes h after every other term has been evaluated
+DJIKSTRA = "djikstra"
+
+
+def register_heuristic(name: str, veto: bool = False, consistent: bool = False,
+                       per_timestep: bool = False, cls=Heuristic):
+    """Decorator registering a binder function as the heuristic term called name."""
+    def decorator(bind: Callable[[SearchContext], Scorer]):
+        if name in HEURISTICS or name == DJIKSTRA:
+            raise ValueError(f"Heuristic already registered: {name}")
+        HEURISTICS[name] = cls(name, bind, veto=veto, consistent=consistent, per_timestep=per_timestep)
+        return bind
+    return decorator
+
+
+def compile_heuristics(heuristics: Dict[str, bool], disable_collisions: bool) -> Tuple[List[Tuple[Heuristic, bool]], bool]:
+    """
+    Resolve the enabled terms of a heuristics dictionary.
+    Returns ([(term, vetoes)], zero_h) where zero_h is True if djikstra is enabled.
+    """
+    terms = [(term, term.veto and disable_collisions is True)
+             for term in HEURISTICS.values() if term.enabled(heuristics)]
+    return terms, heuristics.get(DJIKSTRA) is True
+
+
+def bind_terms(terms: List[Tuple[Heuristic, bool]], ctx: SearchContext, macro_moves: bool = False) -> List[Tuple[Scorer, bool]]:
+    """
+    Bind compiled terms to a segment search.
+    With macro_moves g counts timesteps, so consistent terms measured in cells are divided by
+    max_speed to stay consistent (and admissible) rather than overestimate the cost to go.
+    """
+    bound = []
+    for term, vetoes in terms:
+        score = term.bind(ctx)
+        if macro_moves and term.consistent and not term.per_timestep and ctx.uav.max_speed > 1:
+            score = _per_timestep(score, ctx.uav.max_speed)
+        bound.append((score, vetoes))
+    return bound
+
+
+def _per_timestep(score: Scorer, max_speed: int) -> Scorer:
+    def scaled(state, came_from):
+        return score(state, came_from) / max_speed
+    return scaled
+
+
+def is_consistent(heuristics: Dict[str, bool]) -> bool:
+    """True if the enabled terms sum to a consistent heuristic for unit move costs,
+    or for unit timestep costs once bound by bind_terms with macro moves."""
+    enabled = [term for term in HEURISTICS.values() if term.enabled(heuristics)]
+    if heuristics.get(DJIKSTRA) is True:
+        # djikstra zeroes h, but vetoing terms can still reject neighbours
+        return not any(term.veto for term in enabled)
+    return len(enabled) <= 1 and all(term.consistent for term in enabled)
+
+
+def _distance(x, y, z, goal) -> float:
+    return Math.sqrt((x - goal.x) ** 2 + (y - goal.y) ** 2 + (z - goal.z) ** 2)
+
+
+@register_heuristic("euclidean", consistent=True)
+def euclidean(ctx: SearchContext) -> Scorer:
+    """Admissible heuristic when speed == 1 Euclidean distance to goal."""
+    goal = ctx.goal
+
+    def score(state, came_from):
+        return _distance(state[0], state[1], state[2], goal)
+    return score
+
+
+@register_heuristic("move_from_goals")
+def move_from_goals(ctx: SearchContext) -> Scorer:
+    """Incentivise UAVs to move away from UAV goals"""
+    goals = ctx.goals
+
+    def score(state, came_from):
+        x, y, z, t, used = state
+        distance = 0
+        for goal in goals:
+            distance += abs(x - goal.x) + abs(y - goal.y) + abs(z - goal.z)
+        return distance
+    return score
+
+
+@register_heuristic("move_from_starts")
+def move_from_starts(ctx: SearchContext) -> Scorer:
+    """Incentivise UAVs to move away from all currently known UAV starting positions."""
+    starts = ctx.starts
+
+    def score(state, came_from):
+        x, y, z, t, used = state
+        distance = 0
+        for start in starts:
+            distance -= abs(x - start.x) + abs(y - start.y) + abs(z - start.z)
+        return -distance
+    return score
+
+
+@register_heuristic("avoid_indirect_collisions", veto=True)
+def avoid_indirect_collisions(ctx: SearchContext) -> Scorer:
+    """
+    Heuristic for indirect collisions with other UAVs and obstacles.
+    Returns a penalty score based on the number of collisions.
+    """
+    planner, uav, grid, reservations = ctx.planner, ctx.uav, ctx.grid, ctx.reservations
+    world_weight = 50 if planner.enable_indirect_world_collisions is True else 10000
+    world_collisions = planner.obstacle_counts(grid, uav).item
+    footprint = footprint_class(uav)
+
+    def score(state, came_from):
+        x, y, z, t, used = state
+        nodes = planner.footprint_cells(uav, x, y, z)
+        uav_collisions = 0
+        if not reservations.footprint_clear(footprint, x, y, z, t):
+            uav_collisions += reservations.count_others_cells(nodes, t, uav.id)
+        if used == uav.max_speed - 1 and not reservations.footprint_clear(footprint, x, y, z, t + 1):
+            uav_collisions += reservations.count_others_cells(nodes, t + 1, uav.id)
+        return (uav_collisions * 10000) + (world_collisions(x, y, z) * world_weight)
+    return score
+
+
+@register_heuristic("avoid_direct_collisions", veto=True)
+def avoid_direct_collisions(ctx: SearchContext) -> Scorer:
+    """heavily penalize direct collisions with other UAVs"""
+    uav, reservations, obstacles = ctx.uav, ctx.reservations, ctx.obstacles
+
+    def score(state, came_from):
+        if state[:4] in reservations:
+            return reservations.count_others(*state[:4], uav.id) * 10000
+        if obstacles.get((state[0], state[1], state[2]), False):
+            return 1
+        return 0
+    return score
+
+
+@register_heuristic("move_in_straight_line")
+def move_in_straight_line(ctx: SearchContext) -> Scorer:
+    """Incentivise UAVs to move in a straight line based on previous movement"""
+    sx, sy, sz, st = ctx.start
+    gx, gy, gz = ctx.goal.x, ctx.goal.y, ctx.goal.z
+
+    def score(state, came_from):
+        x, y, z, t, used = state
+        px, py, pz, pt, pu = came_from[state]
+        if gx - sx > gz - sz:
+            if x == gx:
+                return 0
+            if x - px == 0:
+                return 0.5
+        elif gz - sz > gx - sx:
+            if z == gz:
+                return 0
+            if z - pz == 0:
+                return 0.5
+        return 0
+    return score
+
+
+@register_heuristic("same_y")
+def same_y(ctx: SearchContext) -> Scorer:
+    """Incentivise UAVs to stay at the same altitude as their goal."""
+    gy = ctx.goal.y
+
+    def score(state, came_from):
+        return abs(state[1] - gy) * 2
+    return score
+
+
+@register_heuristic("higher_inaccuracy_penalty")
+def higher_inaccuracy_penalty(ctx: SearchContext) -> Scorer:
+    """Incentivise inaccurate UAVs to maintain a higher altitude whilst not above goal"""
+    goal, height, radius = ctx.goal, ctx.grid.shape[1], ctx.uav.inaccuracy[0]
+
+    def score(state, came_from):
+        x, y, z, t, used = state
+        if x == goal.x and z == goal.z:
+            return 0
+        return ((height - y) * radius) / height
+    return score
+
+
+@register_heuristic("traffic_density_penalty")
+def traffic_density_penalty(ctx: SearchContext, neighborhood=1, time_horizon=3, weight=1.0) -> Scorer:
+    """Penalize high-traffic regions by counting reserved cells in spatiotemporal neighborhood."""
+    reservations = ctx.reservations
+
+    def score(state, came_from):
+        x, y, z, t, _ = state
+        return weight * reservations.count_in_box(x, y, z, t, neighborhood, time_horizon)
+    return score
+
+
+@register_heuristic("manhattan", consistent=True)
+def manhattan(ctx: SearchContext) -> Scorer:
+    """Basic Manhattan distance heuristic."""
+    gx, gy, gz = ctx.goal.x, ctx.goal.y, ctx.goal.z
+
+    def score(state, came_from):
+        return abs(state[0] - gx) + abs(state[1] - gy) + abs(state[2] - gz)
+    return score
+
+
+@register_heuristic("manhattan_scaled", consistent=True, per_timestep=True)
+def manhattan_scaled(ctx: SearchContext) -> Scorer:
+    """
+    Scaled Manhattan distance heuristic.
+    Use this over manhattan normally
+    """
+    gx, gy, gz = ctx.goal.x, ctx.goal.y, ctx.goal.z
+    max_speed = ctx.uav.max_speed
+
+    def score(state, came_from):
+        man_dist = abs(state[0] - gx) + abs(state[1] - gy) + abs(state[2] - gz)
+        if 1 <= max_speed:
+            return Math.ceil(man_dist / max_speed)
+        return man_dist
+    return score
+
+
+@register_heuristic("euclidean_scaled", consistent=True, per_timestep=True)
+def euclidean_scaled(ctx: SearchContext) -> Scorer:
+    """Admissible heuristic when speed > 1 Euclidean distance to goal."""
+    goal, max_speed = ctx.goal, ctx.uav.max_speed
+
+    def score(state, came_from):
+        distance = _distance(state[0], state[1], state[2], goal)
+        if 1 <= max_speed:
+            return Math.ceil(distance / max_speed)
+        return distance
+    return score
+
+
+@register_heuristic("reverse_manhattan")
+def reverse_manhattan(ctx: SearchContext) -> Scorer:
+    """
+    Reverse Manhattan distance heuristic.
+    Encourages UAVs to move away from their goals.
+    Most likely will fail
+    """
+    gx, gy, gz = ctx.goal.x, ctx.goal.y, ctx.goal.z
+
+    def score(state, came_from):
+        return -(abs(state[0] - gx) + abs(state[1] - gy) + abs(state[2] - gz))
+    return score
+
+
+@register_heuristic("manhattan_conflicts")
+def manhattan_with_conflicts(ctx: SearchContext, conflict_weight=10.0) -> Scorer:
+    """Inadmissable heuristic that adds a penalty for
+    each conflict between neighbour and goal."""
+    gx, gy, gz = ctx.goal.x, ctx.goal.y, ctx.goal.z
+    reservations = ctx.reservations
+
+    def score(state, came_from):
+        x, y, z, t, _ = state
+        man_dist = abs(x - gx) + abs(y - gy) + abs(z - gz)
+        # Conflict penalty: sample along straight path
+        penalty = 0.0
+        dx, dy, dz = np.sign(gx - x), np.sign(gy - y), np.sign(gz - z)
+        cx, cy, cz = x, y, z
+        for step in range(1, int(man_dist) + 1):
+            if abs(cx - gx) > 0: cx += dx
+            elif abs(cy - gy) > 0: cy += dy
+            else: cz += dz
+            penalty += conflict_weight * reservations.count(int(cx), int(cy), int(cz), t + step)
+        return man_dist + penalty
+    return score
+
+
+@register_heuristic("oscillation_penalty")
+def oscillation_penalty(ctx: SearchContext, weight=5.0) -> Scorer:
+    """
+    Penalize moves that reverse the last displacement,
+    encouraging the planner to hover instead of zig-zag.
+    Redundant due to path cleaning
+    """
+    def score(state, came_from):
+        x, y, z, t, _ = state
+        parent = came_from.get(state)
+        if parent is None or came_from.get(parent) is None:
+            return 0.0
+        # grandparent to compute last displacement
+        grand = came_from[parent]
+        dx1, dy1, dz1 = parent[0]-grand[0], parent[1]-grand[1], parent[2]-grand[2]
+        dx2, dy2, dz2 = x-parent[0], y-parent[1], z-parent[2]
+        if dx1*dx2 + dy1*dy2 + dz1*dz2 < 0:
+            return weight
+        return 0.0
+    return score
+
+
+@register_heuristic("incentivise_waiting", cls=TruthyHeuristic)
+def incentivise_moving(ctx: SearchContext) -> Scorer:
+    """
+    Incentivise UAVs to move by returning higher a
+    higher score for each consecutive wait
+    """
+    def score(state, came_from):
+        # walks the parent state rather than came_from, as it always has
+        parent = came_from[state]
+        count = 0
+        current = state
+        while current in parent:
+            previous = parent[current]
+            x, y, z, t, _ = current
+            px, py, pz, pt, _ = previous
+            if (px, py, pz) == (x, y, z) and t == pt + 1:
+                count += 1
+                current = previous
+            else:
+                break
+        return count
+    return score
+
+
+@register_heuristic("true_distance", consistent=True, per_timestep=True)
+def true_distance(ctx: SearchContext) -> Scorer:
+    """
+    Obstacle-aware lower bound: moves to the goal through static free space,
+    from a cached backward distance field, divided by max_speed.
+    """
+    field = ctx.planner.goal_distance_field(ctx.grid, ctx.goal, ctx.uav).item
+    max_speed = ctx.uav.max_speed
+
+    def score(state, came_from):
+        distance = field(state[0], state[1], state[2])
+        if distance < 0:
+            return Math.inf
+        return distance / max_speed
+    return score
+
+
+@register_heuristic("minimum_time_lower_bound", consistent=True, per_timestep=True)
+def minimum_time_lower_bound(ctx: SearchContext) -> Scorer:
+    """returns lower bound on time-to-go: distance divided by max_speed"""
+    goal, max_speed = ctx.goal, ctx.uav.max_speed
+
+    def score(state, came_from):
+        return _distance(state[0], state[1], state[2], goal) / max_speed
+    return score
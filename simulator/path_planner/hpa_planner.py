@@ -0,0 +1,310 @@
+"""Hierarchical path-finding A* (HPA*) over a cluster/portal abstraction of the world grid."""
+import heapq
+from typing import Dict, List, Optional, Tuple
+import simulator.utils.config as cfg
+from simulator.utils.shared_imports import np, State, Pos
+from simulator.uav.uav import UAV
+from simulator.environment.environment import Environment
+from simulator.reservations.reservations import ReservationStore
+from simulator.utils.footprint import footprint_class
+from simulator.path_planner.distance_field import distance_field
+from simulator.path_planner.path_planner import AStarPlanner
+
+Cell = Tuple[int, int, int]
+
+
+def manhattan(a: Cell, b: Cell) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1]) + abs(a[2] - b[2])
+
+
+class ClusterAbstraction:
+    """
+    Static abstraction of a world grid: cubic clusters of cluster_size voxels a side,
+    portal pairs on every connected free stretch of each face two clusters share (its middle,
+    plus the cells nearest the face corners on large stretches), and the free-space distance
+    between the portals of each cluster.
+    Reservations are not part of it; they only matter when an abstract path is refined.
+    """
+
+    def __init__(self, free: np.ndarray, cluster_size: int):
+        self.free = free
+        self.size = cluster_size
+        self.shape = free.shape
+        # portal cells of each cluster and the weighted edges between portals
+        self.portals: Dict[Cell, List[Cell]] = {}
+        self.edges: Dict[Cell, List[Tuple[Cell, int]]] = {}
+        # clusters without blocked voxels, where distances are plain Manhattan distances
+        self.open_clusters = set()
+        # summed-area table of blocked voxels, padded with a leading zero plane on each axis
+        blocked = np.zeros(tuple(n + 1 for n in self.shape), dtype=np.int32)
+        blocked[1:, 1:, 1:] = (~free).cumsum(0).cumsum(1).cumsum(2)
+        self.blocked_sums = blocked
+        counts = [-(-n // cluster_size) for n in self.shape]
+        for cluster in np.ndindex(*counts):
+            if self.free[self.bounds(cluster)].all():
+                self.open_clusters.add(cluster)
+        self._link_clusters()
+        for cluster, cells in self.portals.items():
+            for i, a in enumerate(cells):
+                for b, distance in self._distances(cluster, a, cells[i + 1:]):
+                    self._link(a, b, distance)
+
+    def cluster_of(self, cell: Cell) -> Cell:
+        return (cell[0] // self.size, cell[1] // self.size, cell[2] // self.size)
+
+    def bounds(self, cluster: Cell) -> tuple:
+        return tuple(slice(k * self.size, min((k + 1) * self.size, n)) for k, n in zip(cluster, self.shape))
+
+    def _link(self, a: Cell, b: Cell, cost: int) -> None:
+        self.edges.setdefault(a, []).append((b, cost))
+        self.edges.setdefault(b, []).append((a, cost))
+
+    def _add_portal(self, cell: Cell) -> None:
+        cells = self.portals.setdefault(self.cluster_of(cell), [])
+        if cell not in cells:
+            cells.append(cell)
+
+    def _link_clusters(self) -> None:
+        """Add a portal pair for every connected stretch of free voxel pairs across each cluster face."""
+        size = self.size
+        for axis in range(3):
+            across = [a for a in range(3) if a != axis]
+            for boundary in range(size, self.shape[axis], size):
+                pairs = self.free.take(boundary - 1, axis) & self.free.take(boundary, axis)
+                for i in range(0, pairs.shape[0], size):
+                    for j in range(0, pairs.shape[1], size):
+                        for u, v in self._entrances(pairs[i:i + size, j:j + size]):
+                            cell = [0, 0, 0]
+                            cell[across[0]], cell[across[1]] = i + u, j + v
+                            cell[axis] = boundary - 1
+                            inside = tuple(cell)
+                            cell[axis] = boundary
+                            outside = tuple(cell)
+                            self._add_portal(inside)
+                            self._add_portal(outside)
+                            self._link(inside, outside, 1)
+
+    @staticmethod
+    def _entrances(face: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Transition cells of each 4-connected component of a face: the cell nearest its middle and,
+        for components wider than ENTRANCE_SPLIT in both directions, the cells nearest the face corners.
+        """
+        if not face.any():
+            return []
+        if face.all():
+            components = [[(u, v) for u in range(face.shape[0]) for v in range(face.shape[1])]]
+        else:
+            components = ClusterAbstraction._components(face)
+        last_u, last_v = face.shape[0] - 1, face.shape[1] - 1
+        entrances = []
+        for component in components:
+            us = [u for u, _ in component]
+            vs = [v for _, v in component]
+            targets = [(sum(us) / len(us), sum(vs) / len(vs))]
+            if max(us) - min(us) >= cfg.HPA_ENTRANCE_SPLIT and max(vs) - min(vs) >= cfg.HPA_ENTRANCE_SPLIT:
+                targets += [(0, 0), (0, last_v), (last_u, 0), (last_u, last_v)]
+            for target_u, target_v in targets:
+                cell = min(component, key=lambda c: (c[0] - target_u) ** 2 + (c[1] - target_v) ** 2)
+                if cell not in entrances:
+                    entrances.append(cell)
+        return entrances
+
+    @staticmethod
+    def _components(face: np.ndarray) -> List[List[Tuple[int, int]]]:
+        """4-connected components of the free cells of a face."""
+        unseen = {tuple(cell) for cell in np.argwhere(face).tolist()}
+        components = []
+        while unseen:
+            stack = [unseen.pop()]
+            component = []
+            while stack:
+                u, v = stack.pop()
+                component.append((u, v))
+                for cell in ((u - 1, v), (u + 1, v), (u, v - 1), (u, v + 1)):
+                    if cell in unseen:
+                        unseen.remove(cell)
+                        stack.append(cell)
+            components.append(component)
+        return components
+
+    def box_is_free(self, a: Cell, b: Cell) -> bool:
+        """True if the box spanned by a and b has no blocked voxel, so a Manhattan path joins them."""
+        low = [min(p, q) for p, q in zip(a, b)]
+        high = [max(p, q) + 1 for p, q in zip(a, b)]
+        sums = self.blocked_sums
+        total = (sums[high[0], high[1], high[2]] - sums[low[0], high[1], high[2]]
+                 - sums[high[0], low[1], high[2]] - sums[high[0], high[1], low[2]]
+                 + sums[low[0], low[1], high[2]] + sums[low[0], high[1], low[2]]
+                 + sums[high[0], low[1], low[2]] - sums[low[0], low[1], low[2]])
+        return total == 0
+
+    def _distances(self, cluster: Cell, source: Cell, targets: List[Cell]) -> List[Tuple[Cell, int]]:
+        """(target, moves) for every target reachable from source without leaving the cluster."""
+        if cluster in self.open_clusters:
+            return [(target, manhattan(source, target)) for target in targets]
+        if not targets:
+            return []
+        bounds = self.bounds(cluster)
+        origin = [axis.start for axis in bounds]
+        local = tuple(c - o for c, o in zip(source, origin))
+        field = distance_field(self.free[bounds], local)
+        reachable = []
+        for target in targets:
+            distance = int(field[tuple(c - o for c, o in zip(target, origin))])
+            if distance >= 0:
+                reachable.append((target, distance))
+        return reachable
+
+    def waypoints(self, start: Cell, goal: Cell) -> Optional[List[Cell]]:
+        """
+        Cells to refine towards, in order: the first voxel of every cluster the abstract
+        path enters, then the goal. [goal] if both ends share a cluster, None if there is
+        no abstract path (for instance because an end is blocked).
+        """
+        if not (self.free[start] and self.free[goal]):
+            return None
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        if start_cluster == goal_cluster:
+            return [goal]
+        # temporary edges from the start and into the goal
+        exits = dict(self._distances(start_cluster, start, self.portals.get(start_cluster, [])))
+        entries = dict(self._distances(goal_cluster, goal, self.portals.get(goal_cluster, [])))
+        g_score = {start: 0}
+        came_from = {}
+        open_set = [(manhattan(start, goal), start)]
+        while open_set:
+            _, cell = heapq.heappop(open_set)
+            if cell == goal:
+                path = []
+                while cell in came_from:
+                    path.append(cell)
+                    cell = came_from[cell]
+                path.reverse()
+                entries = [cell for previous, cell in zip([start] + path, path)
+                           if self.cluster_of(previous) != self.cluster_of(cell)] + [goal]
+                return self.smooth(start, entries)
+            g = g_score[cell]
+            if cell == start:
+                successors = list(exits.items())
+            else:
+                successors = list(self.edges.get(cell, []))
+                if cell in entries:
+                    successors.append((goal, entries[cell]))
+            for successor, cost in successors:
+                if g + cost < g_score.get(successor, np.inf):
+                    g_score[successor] = g + cost
+                    came_from[successor] = cell
+                    heapq.heappush(open_set, (g + cost + manhattan(successor, goal), successor))
+        return None
+
+    def smooth(self, start: Cell, waypoints: List[Cell]) -> List[Cell]:
+        """Drop every waypoint that lies before a later one reachable through a free box."""
+        smoothed = []
+        anchor = start
+        i = 0
+        while i < len(waypoints):
+            j = len(waypoints) - 1
+            while j > i and not self.box_is_free(anchor, waypoints[j]):
+                j -= 1
+            anchor = waypoints[j]
+            smoothed.append(anchor)
+            i = j + 1
+        return smoothed
+
+
+class HPAPlanner(AStarPlanner):
+    """
+    Prioritised planner that first searches the static cluster abstraction of the map and
+    then refines the abstract path with a_star_search, one cluster entry at a time, so the
+    fine, reservation-aware search only covers short segments.
+    The abstraction is cached on the Map, so every planner and scenario sharing it reuses it.
+    Falls back to a single a_star_search when the abstraction finds no path or a segment
+    cannot be refined.
+    """
+
+    def __init__(self, *args, cluster_size: int = None, **kwargs):
+        """
+        cluster_size - int, voxels per cluster side. Defaults to the map's scale factor,
+            or cfg.HPA_CLUSTER_SIZE for unscaled maps
+        Other arguments are as for AStarPlanner."""
+        super().__init__(*args, **kwargs)
+        self.cluster_size = cluster_size
+        self.map = None
+        # used for environments that were not built from a Map
+        self.abstractions = {}
+        self.abstraction_grid = None
+
+    def plan_path(self, environment: Environment):
+        """Plan every UAV as AStarPlanner does. Returns (candidate_paths, delay_counts, searched_counts)."""
+        self.map = getattr(environment, "map", None)
+        return super().plan_path(environment)
+
+    def abstraction(self, grid: np.ndarray, uav: UAV) -> ClusterAbstraction:
+        """Cluster abstraction of grid for the UAV's footprint class, built on first use."""
+        footprint = None
+        if self.disable_collisions is True and self.enable_indirect_world_collisions is False:
+            footprint = footprint_class(uav)
+        if self.map is not None and self.map.world_data is grid:
+            cache = self.map.abstractions
+            scale = self.map.scale if self.map.scale > 1 else cfg.HPA_CLUSTER_SIZE
+        else:
+            if grid is not self.abstraction_grid:
+                self.abstractions = {}
+                self.abstraction_grid = grid
+            cache = self.abstractions
+            scale = cfg.HPA_CLUSTER_SIZE
+        size = self.cluster_size or scale
+        key = ("clusters", size, footprint)
+        abstraction = cache.get(key)
+        if abstraction is None:
+            free = grid == 0
+            if footprint is not None:
+                # the inflated grid is shared through the environment index
+                free &= ~self.distance_fields.blocked(grid, footprint)
+            abstraction = ClusterAbstraction(free, size)
+            cache[key] = abstraction
+        return abstraction
+
+    def a_star_search(
+        self,
+        start: State,
+        goal: Pos,
+        grid: np.ndarray,
+        max_time: int,
+        uav: UAV,
+        obstacles: Dict[tuple, bool],
+        reservations: ReservationStore,
+        goals: List[Pos],
+        starts: List[Pos]
+    ):
+        """
+        Refine the abstract path from start to goal segment by segment.
+        Returns the path as a list of State and the number of nodes searched,
+        or (None, searched) if no path is found.
+        """
+        stats = self.stats
+        waypoints = self.abstraction(grid, uav).waypoints((start.x, start.y, start.z), (goal.x, goal.y, goal.z))
+        if waypoints is None or len(waypoints) == 1:
+            return super().a_star_search(start, goal, grid, max_time, uav, obstacles, reservations, goals, starts)
+        stats["abstract_paths"] = stats.get("abstract_paths", 0) + 1
+        path = [start]
+        searched = 0
+        for cell in waypoints:
+            segment, segment_searched = super().a_star_search(
+                path[-1], Pos(*cell), grid, max_time, uav, obstacles, reservations, goals, starts)
+            searched += segment_searched
+            stats["refined_segments"] = stats.get("refined_segments", 0) + 1
+            # a failure to reach a waypoint says nothing about retries towards the goal
+            self.exhausted = None
+            if self.budget_hit is not None:
+                # out of budget part way along the abstract path
+                return path + segment[1:], searched
+            if segment is None:
+                # the reservations block this route, search the fine grid directly
+                stats["refine_fallbacks"] = stats.get("refine_fallbacks", 0) + 1
+                segment, segment_searched = super().a_star_search(
+                    start, goal, grid, max_time, uav, obstacles, reservations, goals, starts)
+                return segment, searched + segment_searched
+            path.extend(segment[1:])
+        return path, searched
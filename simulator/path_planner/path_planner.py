@@ -1,13 +1,59 @@
 """Path Planner for 4D A* pathfinding in a 3D environment."""
 import heapq
-from typing import List,Dict
+import time
+from typing import List,Dict,Optional,Iterable
 import simulator.utils.config as cfg
 from simulator.utils.shared_imports import np, Math, State, Pos
 from simulator.uav.uav import UAV
 from simulator.environment.environment import Environment
+from simulator.environment.environment_index import EnvironmentIndex
+from simulator.reservations.reservations import ReservationStore, DictReservationStore, make_reservation_store
+from simulator.reservations.archive import ReservationArchive
+from simulator.utils.footprint import uav_footprint, footprint_class, footprint_stencil, SMALL_FOOTPRINT
+from simulator.path_planner.frontier import make_frontier
+from simulator.path_planner.distance_field import DistanceFieldCache
+from simulator.path_planner.search_nodes import StateCodec, SearchNodes, ParentView
+from simulator.path_planner.heuristics import SearchContext, bind_terms, compile_heuristics, is_consistent
 
 
 
+SEARCH_STATS = ("pushes", "pops", "stale_skips", "reopenings", "expansions", "beam_evictions",
+                "budget_nodes", "budget_time")
+MOVES = [(-1,0,0), (1,0,0), (0,-1,0), (0,1,0), (0,0,-1), (0,0,1)]
+# small enough never to reorder states whose f differs
+MACRO_TIE_BREAK = 1e-9
+
+
+def spawn_exits(footprint: np.ndarray, shape: tuple) -> List[tuple]:
+    """Voxels inside the grid within one step (26-neighbourhood) of any voxel of the footprint."""
+    cells = footprint.reshape(-1, 3)
+    offsets = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                        if (dx, dy, dz) != (0, 0, 0)])
+    near = np.unique((cells[:, None, :] + offsets[None, :, :]).reshape(-1, 3), axis=0)
+    inside = np.all((near >= 0) & (near < np.array(shape)), axis=1)
+    return [tuple(cell) for cell in near[inside].tolist()]
+
+
+class FailedSearch:
+    """
+    An a_star_search that expanded every state it generated without reaching the goal.
+    ready holds the (x, y, z, t) of the expanded states that had used enough moves to leave the
+    timestep, which have exactly the successors of a fresh start there. A retry of the same
+    segment from one of them can only reach states this search reached, so it fails as well,
+    as long as nothing reserved at or after the retry's start time has been released since.
+    """
+
+    def __init__(self, ready: set, expansions: int, searched: int, valid_from: int = 0):
+        self.ready = ready
+        self.expansions = expansions
+        self.searched = searched
+        # earliest retry start time the certificate still holds for
+        self.valid_from = valid_from
+
+    def covers(self, start: State) -> bool:
+        return start.time >= self.valid_from and (start.x, start.y, start.z, start.time) in self.ready
+
+
 def remove_same_timestep_oscillations(path: List[State]) -> List[State]:
     """
     Collapse any A→B→A oscillation occurring all at the same time.
@@ -72,27 +118,57 @@ class AStarPlanner():
     """
     A* path planner.
     """
-    cached_footprints = {}
-    
     def __init__(
             self,
             heuristics: Dict[str,bool] = cfg.DEFAULT_HEURISTICS,
             beam_width: int = cfg.DEFAULT_BEAM_WIDTH,
+            beam_mode: str = cfg.DEFAULT_BEAM_MODE,
             ordering: Dict[str,int] = cfg.DEFAULT_ORDERING,
             g_score_multiplier: float = cfg.DEFAULT_G_SCORE_MULTIPLIER,
             g_score_increment: float = cfg.DEFAULT_G_SCORE_INCREMENT,
             disable_collisions: bool = cfg.ENABLE_PARTIAL_COLLISION_DISABLER,
-            enable_indirect_world_collisions: bool = cfg.ENABLE_INDIRECT_WORLD_COLLISIONS
+            enable_indirect_world_collisions: bool = cfg.ENABLE_INDIRECT_WORLD_COLLISIONS,
+            reservation_backend: str = cfg.DEFAULT_RESERVATION_BACKEND,
+            closed_set: bool = cfg.ENABLE_CLOSED_SET,
+            reopen_closed = "auto",
+            macro_moves: bool = cfg.ENABLE_MACRO_MOVES,
+            node_budget_per_segment: Optional[int] = cfg.NODE_BUDGET_PER_SEGMENT,
+            time_budget_per_uav_ms: Optional[float] = cfg.TIME_BUDGET_PER_UAV_MS,
+            total_time_budget_s: Optional[float] = cfg.TOTAL_TIME_BUDGET_S,
+            footprint_masks: bool = cfg.ENABLE_FOOTPRINT_MASKS,
+            evict_reservations: bool = cfg.EVICT_RESERVATIONS,
+            reservation_archive: Optional[str] = cfg.RESERVATION_ARCHIVE
             ):
         """
         Heuristics - Dict[heuristic_name: str, enabled: bool]
         beam_width - int, number of nodes to keep in the open set
+        beam_mode - str, "global" bounds the whole open set, "layered" bounds each time layer
         ordering - Dict[ordering_name: int], ordering of UAVs to process
         g_score_multiplier - float, multiplier for g_score
         g_score_increment - float, increment for g_score
-        disable_collisions - bool, disable partial collision checking"""
+        disable_collisions - bool, disable partial collision checking
+        reservation_backend - str, "occupancy" (default) or "dict" reservation store
+        closed_set - bool, skip stale heap entries and track expanded states
+        reopen_closed - bool or "auto", re-expand closed states when a cheaper path to them is found.
+            "auto" only disables reopening for consistent heuristic combinations
+        macro_moves - bool, expand every cell reachable within max_speed moves as one successor
+            instead of one (x, y, z, t, moves_used) node per move. g then counts timesteps,
+            so pair it with the speed-scaled heuristics
+        node_budget_per_segment - int or None, expansions one search may make before it stops
+            and returns the path to the expanded state closest to the goal
+        time_budget_per_uav_ms - float or None, search time one UAV may use over all its attempts
+        total_time_budget_s - float or None, search time plan_path may use over all UAVs.
+            A UAV reached with no time left holds at its spawn
+        footprint_masks - bool, have the reservation store keep a mask of the footprint centres
+            that overlap a reservation for every footprint class of at least SMALL_FOOTPRINT voxels,
+            so most footprint-vs-traffic checks are one lookup
+        evict_reservations - bool, drop reservations older than the current planning time as
+            plan_path moves forward, so the store only holds the active horizon
+        reservation_archive - str or None, directory the evicted timesteps are saved to
+            (see ReservationArchive)"""
         self.heuristics = heuristics
         self.beam_width = beam_width
+        self.beam_mode = beam_mode
         if (ordering is None):
             ordering = cfg.DEFAULT_ORDERING
         self.ordering = ordering
@@ -100,6 +176,42 @@ class AStarPlanner():
         self.g_score_increment = g_score_increment
         self.disable_collisions = disable_collisions
         self.enable_indirect_world_collisions = enable_indirect_world_collisions
+        self.reservation_backend = reservation_backend
+        self.heuristic_terms, self.zero_heuristic = compile_heuristics(heuristics, disable_collisions)
+        self.distance_fields = DistanceFieldCache()
+        self.closed_set = closed_set
+        if reopen_closed == "auto":
+            reopen_closed = not self.heuristics_are_consistent()
+        self.reopen_closed = reopen_closed
+        self.macro_moves = macro_moves
+        self.node_budget_per_segment = node_budget_per_segment
+        self.time_budget_per_uav_ms = time_budget_per_uav_ms
+        self.total_time_budget_s = total_time_budget_s
+        self.footprint_masks = footprint_masks
+        self.evict_reservations = evict_reservations
+        self.archive = ReservationArchive(reservation_archive) if reservation_archive else None
+        # perf_counter time at which a_star_search stops, set by plan_path
+        self.search_deadline: Optional[float] = None
+        # "nodes" or "time" when the last a_star_search ran out of budget
+        self.budget_hit: Optional[str] = None
+        # budget each UAV of the last plan_path ran out of, by id; their paths stop short
+        self.budget_exhausted: Dict[int, str] = {}
+        self.stats: Dict[str, int] = dict.fromkeys(SEARCH_STATS, 0)
+        # reason each UAV given up on by the last plan_path was not planned, by id
+        self.failures: Dict[int, str] = {}
+        # set by a_star_search when it fails after expanding everything it generated,
+        # None after any other search
+        self.exhausted = None
+        self.failed_searches: Dict[tuple, FailedSearch] = {}
+        self.expansions_saved: Dict[int, int] = {}
+
+    def heuristics_are_consistent(self) -> bool:
+        """True if the enabled heuristics sum to a consistent heuristic,
+        in which case an expanded state never needs to be expanded again.
+        Under macro moves that relies on bind_terms dividing cell distances by max_speed."""
+        if self.g_score_multiplier < 1 or self.g_score_increment < 1:
+            return False
+        return is_consistent(self.heuristics)
 
     # def get_uav_locations(self, candidate_paths: dict, t: int) -> dict:
     #     """Return a mapping from UAV ids to their candidate State at time t.
@@ -111,91 +223,212 @@ class AStarPlanner():
     #             uav_locations[uav_id] = path[t]
     #     return uav_locations
 
-    def compute_footprint(self, uav: UAV, pos: Pos) -> List[State]:
+    def compute_footprint(self, uav: UAV, pos: Pos) -> List[Pos]:
         """Compute the set of voxels that the UAV may occupy at a given position.
-           Returns a list of Pos objects representing the footprint."""
-        footprint = []
-        radius = uav.inaccuracy[0]
-        shape = uav.inaccuracy[1]
-        if shape == 0:  # circular footprint
-            x_min = max(0, int(pos.x - radius))
-            x_max = int(pos.x + radius) + 1
-            y_min = max(0, int(pos.y - radius))
-            y_max = int(pos.y + radius) + 1
-            z_min = max(0, int(pos.z - radius))
-            z_max = int(pos.z + radius) + 1
-            for x in range(x_min, x_max):
-                for y in range(y_min, y_max):
-                    for z in range(z_min, z_max):
-                        distance = Math.sqrt((x - pos.x)**2 + (y - pos.y)**2 + (z - pos.z)**2)
-                        if distance <= radius:
-                            footprint.append(Pos(x, y, z))
-        elif shape == 1:  # square footprint
-            x_min = max(0, int(pos.x - radius))
-            x_max = int(pos.x + radius) + 1
-            y_min = max(0, int(pos.y - radius))
-            y_max = int(pos.y + radius) + 1
-            z_min = max(0, int(pos.z - radius))
-            z_max = int(pos.z + radius) + 1
-            for x in range(x_min, x_max):
-                for y in range(y_min, y_max):
-                    for z in range(z_min, z_max):
-                        footprint.append(Pos(x, y, z))
-        else:
-            raise ValueError("Invalid shape type")
-        return footprint
+           Returns a list of Pos objects representing the footprint.
+           The planner's hot paths use footprint_cells instead, which avoids building Pos objects."""
+        return [Pos(x, y, z) for x, y, z in self.footprint_cells(uav, pos.x, pos.y, pos.z).tolist()]
+
+    def footprint_cells(self, uav: UAV, x: int, y: int, z: int) -> np.ndarray:
+        """Footprint of the UAV at (x, y, z) as a cached (N, 3) array.
+        Only clipped below 0, voxels past the far edges of the grid are kept."""
+        return uav_footprint(uav, x, y, z)
+
+    def static_footprint(self, uav: UAV):
+        """Footprint class the static free space is shrunk for, or None when only the centre voxel has to be free.
+        Footprints that touch obstacles are only filtered out when collisions are disabled."""
+        if self.disable_collisions is True and self.enable_indirect_world_collisions is False:
+            return footprint_class(uav)
+        return None
+
+    def obstacle_counts(self, grid: np.ndarray, uav: UAV) -> np.ndarray:
+        """Cached grid of the obstacle voxels the UAV's footprint covers when centred on each voxel,
+        so a world-collision check is one lookup instead of one per footprint voxel."""
+        return self.distance_fields.obstacle_counts(grid, footprint_class(uav))
+
+    def goal_distance_field(self, grid: np.ndarray, goal: Pos, uav: UAV) -> np.ndarray:
+        """Cached backward distance field to goal over the static free space."""
+        return self.distance_fields.get(grid, (goal.x, goal.y, goal.z), self.static_footprint(uav))
+
+    def route_is_reachable(self, grid: np.ndarray, uav: UAV) -> bool:
+        """
+        True if every destination of the UAV lies in the same connected component of the
+        static free space as the previous one. The spawn itself may be blocked, as long as
+        a neighbour the UAV can leave to is not.
+        """
+        labels = self.distance_fields.components(grid, self.static_footprint(uav))
+        size_x, size_y, size_z = grid.shape
+        spawn = uav.destinations[0]
+        current = set()
+        for dx, dy, dz in [(0, 0, 0)] + MOVES:
+            x, y, z = spawn.x + dx, spawn.y + dy, spawn.z + dz
+            if 0 <= x < size_x and 0 <= y < size_y and 0 <= z < size_z and labels[x, y, z] >= 0:
+                current.add(int(labels[x, y, z]))
+        previous = spawn
+        for dest in uav.destinations[1:]:
+            if (dest.x, dest.y, dest.z) == (previous.x, previous.y, previous.z):
+                continue
+            if not (0 <= dest.x < size_x and 0 <= dest.y < size_y and 0 <= dest.z < size_z):
+                return False
+            label = int(labels[dest.x, dest.y, dest.z])
+            if label not in current:
+                return False
+            current = {label}
+            previous = dest
+        return True
+
+    def goal_blocked(self, goal: Pos, start_time: int, max_time: int, reservations: ReservationStore,
+                     grid: np.ndarray, uav: UAV, provisional: Iterable[int] = ()) -> bool:
+        """
+        True if the UAV's footprint at goal collides at every timestep it could arrive by max_time.
+        provisional holds the ids whose reservations may still be released (spawns booked for
+        UAVs not planned yet, see release_spawn); a timestep they alone block does not count.
+        Every other reservation stays for the rest of planning, so a later start cannot help.
+        """
+        if self.disable_collisions is False:
+            return False
+        ignored = set(provisional)
+        ignored.add(uav.id)
+        for t in range(start_time + 1, max_time):
+            if not self.footprint_collides((goal.x, goal.y, goal.z, t, 0), reservations, grid, uav):
+                return False
+            if len(ignored) > 1 and not self.permanently_blocked(goal, t, reservations, grid, uav, ignored):
+                return False
+        return True
+
+    def permanently_blocked(self, goal: Pos, t: int, reservations: ReservationStore, grid: np.ndarray,
+                            uav: UAV, ignored: set) -> bool:
+        """footprint_collides at goal and time t, counting only reservations by ids not in ignored."""
+        if self.enable_indirect_world_collisions is False and self.obstacle_counts(grid, uav).item(goal.x, goal.y, goal.z) > 0:
+            return True
+        for x, y, z in self.footprint_cells(uav, goal.x, goal.y, goal.z).tolist():
+            for at in (t, t + 1):
+                if not ignored.issuperset(reservations.get(x, y, z, at)):
+                    return True
+        return False
+
+    def footprint_collides(self, state: tuple, reservations: ReservationStore, grid: np.ndarray, uav: UAV) -> bool:
+        """
+        Check if the UAV's footprint at the current state collides with any other UAVs or obstacles.
+        """
+        x, y, z, t, used = state
+        if self.enable_indirect_world_collisions is False:
+            if self.obstacle_counts(grid, uav).item(x, y, z) > 0:
+                return True
+        footprint = footprint_class(uav)
+        nodes = self.footprint_cells(uav, x, y, z)
+        # footprint at t and t+1 (t+1 also covers the last move of a timestep)
+        for at in (t, t + 1):
+            if not reservations.footprint_clear(footprint, x, y, z, at) and reservations.any_other(nodes, at, uav.id):
+                return True
+        return False
+
+    def static_index(self, environment: Environment) -> EnvironmentIndex:
+        """The environment's shared EnvironmentIndex.
+        Distance fields and free-space components are taken from it from then on."""
+        index = environment.static_index()
+        self.distance_fields = index.distance_fields
+        return index
 
     def create_obstacle_dict(self, environment: Environment) -> dict:
         """Return a dict mapping (x,y,z) positions occupied by obstacles from world_data.
         If an obstacle is present, the value is True.
+        The dict is built once per environment and shared, see static_index.
         """
-        obstacles = {}
-        obs_coords = np.argwhere(environment.world_data==1)
-        obstacles = {tuple(coord):True for coord in obs_coords}
-        return obstacles
+        return self.static_index(environment).obstacles
+
+    def create_reservation_store(self, environment: Environment, horizon: int, start: int = 0) -> ReservationStore:
+        """Return an empty reservation store of the configured backend for this environment,
+        sized for the timesteps [start, start + horizon]."""
+        reservations = make_reservation_store(self.reservation_backend, environment.world_data.shape, horizon, start)
+        for uav in environment.uav_list:
+            self.track_footprint(reservations, uav)
+        return reservations
+
+    def track_footprint(self, reservations: ReservationStore, uav: UAV) -> None:
+        """Ask the store to mask the UAV's footprint class, when footprint_masks is on and the
+        footprint is large enough that probing its voxels costs more than keeping the mask."""
+        if self.footprint_masks and len(footprint_stencil(*footprint_class(uav))) >= SMALL_FOOTPRINT:
+            reservations.track_footprint(footprint_class(uav))
 
     def add_footprints_to_reservations(
         self,
-        reservations: dict,
-        footprint: List[State],
+        reservations: ReservationStore,
+        footprint: np.ndarray,
         uav_id: int,
         time: int
-        ) -> dict:
+        ) -> ReservationStore:
         """Add each voxel from footprint to reservations keyed by (x,y,z,time)."""
-        for voxel in footprint:
-            key = (voxel.x, voxel.y, voxel.z, time)
-            if key in reservations:
-                if uav_id not in reservations[key]:
-                    reservations[key].append(uav_id)
-            else:
-                reservations[key] = [uav_id]
+        if isinstance(reservations, dict):
+            reservations = DictReservationStore(reservations)
+        reservations.add_cells(footprint, time, uav_id)
         return reservations
 
-    def add_reservation(self, reservations: dict, uav: UAV, path: List[State]) -> dict:
+    def add_reservation(self, reservations: ReservationStore, uav: UAV, path: List[State]) -> ReservationStore:
         """For each state in a candidate path, reserve its footprint and
-          the previous state's last footprint from the last time period."""
-        for i, node in enumerate(path):
-            pos = Pos(node.x, node.y, node.z)
-            t = node.time
-            footprint = self.compute_footprint(uav, pos)
+          the previous state's last footprint from the last time period.
+          A plain dict is wrapped in a DictReservationStore (and updated in place)."""
+        if isinstance(reservations, dict):
+            reservations = DictReservationStore(reservations)
+        for footprint, t in self.path_footprints(uav, path):
             reservations = self.add_footprints_to_reservations(reservations, footprint, uav.id, t)
+        return reservations
+
+    def remove_reservation(self, reservations: ReservationStore, uav: UAV, path: List[State],
+                           since: int = 0) -> None:
+        """Release what add_reservation booked for the path at times >= since."""
+        for footprint, t in self.path_footprints(uav, path):
+            if t >= since:
+                reservations.remove_cells(footprint, t, uav.id)
+
+    def path_footprints(self, uav: UAV, path: List[State]):
+        """(footprint, time) pairs booked for a path: each state's footprint, the previous
+        state's footprint again when time moves on, and the last footprint one step after arrival."""
+        for i, node in enumerate(path):
+            yield self.footprint_cells(uav, node.x, node.y, node.z), node.time
             if i > 0:
                 prev_node = path[i-1]
                 if node.time > prev_node.time:
-                    prev_pos = Pos(prev_node.x, prev_node.y, prev_node.z)
-                    prev_footprint = self.compute_footprint(uav, prev_pos)
-                    reservations = self.add_footprints_to_reservations(
-                        reservations, prev_footprint, uav.id, t
-                        )
-        # Add the last footprint for the last time step
-        last_pos = Pos(path[-1].x, path[-1].y, path[-1].z)
-        last_footprint = self.compute_footprint(uav, last_pos)
-        last_time = path[-1].time + 1
-        last_footprint = self.add_footprints_to_reservations(
-            reservations, last_footprint, uav.id, last_time
-            )
-        return reservations
+                    yield self.footprint_cells(uav, prev_node.x, prev_node.y, prev_node.z), node.time
+        # the last footprint for the last time step
+        yield self.footprint_cells(uav, path[-1].x, path[-1].y, path[-1].z), path[-1].time + 1
+
 
+    def earliest_start(self, uav: UAV, footprint: np.ndarray, t: int, reservations: ReservationStore,
+                       grid: np.ndarray, until: int) -> Optional[int]:
+        """
+        Earliest time >= t, up to until, at which the UAV can spawn: no other UAV reserves its
+        spawn footprint at that time or the next, and some voxel next to the footprint is free
+        to have moved to by the next timestep. None if there is no such time.
+        """
+        exits = None
+        while t <= until:
+            t = reservations.first_free(footprint, t, uav.id, until)
+            if t is None:
+                return None
+            if exits is None:
+                exits = spawn_exits(footprint, grid.shape)
+            for x, y, z in exits:
+                if reservations.count_others(x, y, z, t + 1, uav.id) == 0:
+                    return t
+            t += 1
+        return None
+
+    def release_spawn(self, reservations: ReservationStore, footprint: np.ndarray, uav_id: int, time: int) -> None:
+        """Give back a spawn booked at time and time + 1. The space freed may let other UAVs'
+        failed searches succeed from then on, so they no longer vouch for retries before time + 2."""
+        for t in (time, time + 1):
+            reservations.remove_cells(footprint, t, uav_id)
+        for (owner, _), certificate in self.failed_searches.items():
+            if owner != uav_id:
+                certificate.valid_from = max(certificate.valid_from, time + 2)
+
+    @staticmethod
+    def delay_to(uav: UAV, spawn_time: Optional[int], max_time: int,
+                 schedule_times: Dict[int, int], delay_counts: Dict[int, int]) -> None:
+        """Reschedule the UAV to spawn_time (past max_time if None); delay_counts keeps the total delay."""
+        schedule_times[uav.id] = max_time + 1 if spawn_time is None else spawn_time
+        delay_counts[uav.id] = schedule_times[uav.id] - uav.start_time
 
     def order_uavs(
             self,
@@ -206,6 +439,11 @@ class AStarPlanner():
         Always primary‐sort by start_time (ascending), then by every other
         field in self.ordering (abs() gives position, sign gives direction).
         """
+        uav_list.sort(key=self.ordering_key(delay_counts))
+        return uav_list
+
+    def ordering_key(self, delay_counts: Dict[int,int] = None):
+        """Composite sort key used by order_uavs. delay_counts is read when the key is computed."""
         key_funcs = {
             "id":         lambda u: u.id,
             "inaccuracy": lambda u: u.inaccuracy[0],
@@ -232,20 +470,22 @@ class AStarPlanner():
                     val = -val
                 key.append(val)
             return tuple(key)
-        uav_list.sort(key=sort_key)
-        return uav_list
+        return sort_key
 
     def plan_path(self, environment: Environment) -> Dict[int, List[State]]:
         """Plan a path for each UAV in the environment.
         Returns a dict mapping UAV ids to their candidate paths."""
 
         candidate_paths: Dict[int, List[State]] = {}
-        reservations: Dict[tuple, List[int]] = {}
-        # env reservations act as a uav with an impossible id
-        if len(environment.reservations) != 0:
-            for state in environment.reservations:
-                reservations[state] = [-1]
+        self.stats = dict.fromkeys(SEARCH_STATS, 0)
+        self.stats.update({"retries_skipped": 0, "expansions_saved": 0, "budget_holds": 0,
+                           "reservations_evicted": 0})
+        self.failures = {}
+        self.budget_exhausted = {}
+        # exhaustive failed searches by (uav id, segment index), see FailedSearch
+        self.failed_searches: Dict[tuple, FailedSearch] = {}
         uav_list = environment.uav_list
+        self.expansions_saved: Dict[int, int] = {uav.id: 0 for uav in uav_list}
         #schedule times are the time at which each UAV is scheduled
         # to start its route from the path planner
         schedule_times = {uav.id: uav.start_time for uav in uav_list}
@@ -264,27 +504,48 @@ class AStarPlanner():
         obstacles = self.create_obstacle_dict(environment)
         #Initialize searched node counts
         searched_counts: Dict[int, int] = {uav.id: 0 for uav in uav_list}
+        # search time spent on each UAV, for time_budget_per_uav_ms
+        uav_time: Dict[int, float] = {uav.id: 0.0 for uav in uav_list}
+        total_deadline = None
+        if self.total_time_budget_s is not None:
+            total_deadline = time.perf_counter() + self.total_time_budget_s
         latest_start_time = max(schedule_times[uav.id] for uav in uav_list)
         max_sim_time = latest_start_time + cfg.MAX_SIM_TIME
-        for current_time in range(0, max_sim_time + 1):
+        reservations = self.create_reservation_store(environment, max_sim_time)
+        # env reservations act as a uav with an impossible id
+        for state in environment.reservations:
+            reservations.add(*state, -1)
+        # UAVs with a destination cut off from the previous one are never scheduled
+        for uav in uav_list:
+            if not self.route_is_reachable(environment.world_data, uav):
+                self.failures[uav.id] = "unreachable"
+        # pending UAVs as (schedule time, ordering key, position in uav_list, uav), so the
+        # loop jumps straight to the next scheduled time and pops each batch in planning order.
+        # A UAV's key only changes when it is delayed, and then it is pushed again.
+        sort_key = self.ordering_key(delay_counts)
+        queue = [(schedule_times[uav.id], sort_key(uav), position, uav)
+                 for position, uav in enumerate(uav_list) if uav.id not in self.failures]
+        positions = {entry[-1].id: entry[2] for entry in queue}
+        heapq.heapify(queue)
+        while queue and queue[0][0] <= max_sim_time:
             # collect UAVs whose scheduled time == current_time
-            to_plan = [u for u in uav_list if schedule_times[u.id] == current_time]
-            to_plan = self.order_uavs(to_plan,delay_counts)
+            current_time = queue[0][0]
+            if self.evict_reservations:
+                # every search and spawn check from here on starts at current_time or later
+                self.stats["reservations_evicted"] += reservations.evict_before(current_time, self.archive)
+            to_plan = []
+            while queue and queue[0][0] == current_time:
+                to_plan.append(heapq.heappop(queue)[-1])
+            # UAVs of this batch whose spawn booking is released again if they fail
+            provisional = set()
             for uav in to_plan:
-                # Check spawn-cell occupancy (ignore self)
-                spawn_pos = Pos(uav.destinations[0].x, uav.destinations[0].y, uav.destinations[0].z)
-                footprint = self.compute_footprint(uav, spawn_pos)
-                occupied = False
-                for voxel in footprint:
-                    for i in range(0,1):
-                        voxel_key = (voxel.x, voxel.y, voxel.z, current_time + i)
-                        occupied_by = reservations[voxel_key] if voxel_key in reservations else []
-                        if any(other_id != uav.id for other_id in occupied_by):
-                            occupied = True
-                            break
-                if occupied:
-                    schedule_times[uav.id] += 1
-                    delay_counts[uav.id] += 1
+                # jump straight to the earliest time the spawn can be used (ignoring self)
+                spawn_pos = uav.destinations[0]
+                footprint = self.footprint_cells(uav, spawn_pos.x, spawn_pos.y, spawn_pos.z)
+                spawn_time = self.earliest_start(uav, footprint, current_time, reservations,
+                                                 environment.world_data, max_sim_time)
+                if spawn_time != current_time:
+                    self.delay_to(uav, spawn_time, max_sim_time, schedule_times, delay_counts)
                     continue
                 #add uav starting positions to reservations if unoccupied
                 reservations = self.add_footprints_to_reservations(
@@ -293,78 +554,67 @@ class AStarPlanner():
                 reservations = self.add_footprints_to_reservations(
                     reservations, footprint, uav.id, current_time + 1
                     )
+                provisional.add(uav.id)
             for uav in to_plan:
-                # Check spawn-cell occupancy (ignore self)
-                spawn_pos = Pos(uav.destinations[0].x, uav.destinations[0].y, uav.destinations[0].z)
-                footprint = self.compute_footprint(uav, spawn_pos)
-                occupied = False
-                #second check to make sure there is value in spawning uav at this time
-                #checks if an available move is possible from starting location
-                free_neighbours = 0
-                for voxel in footprint:
-                    for dx in [-1, 0, 1]:
-                        for dy in [-1, 0, 1]:
-                            for dz in [-1, 0, 1]:
-                                if dx == 0 and dy == 0 and dz == 0:
-                                    continue
-                                neighbour_key = State(
-                                    voxel.x + dx, voxel.y + dy, voxel.z + dz, current_time
-                                    )
-                                if not (0 <= neighbour_key.x < environment.world_data.shape[0] and
-                                        0 <= neighbour_key.y < environment.world_data.shape[1] and
-                                        0 <= neighbour_key.z < environment.world_data.shape[2]):
-                                    continue  
-                                if neighbour_key in reservations:
-                                    if (
-                                        (uav.id not in reservations[neighbour_key] and
-                                         len(reservations[neighbour_key]) > 0
-                                         ) or (
-                                             uav.id in reservations[neighbour_key] and
-                                             len(reservations[neighbour_key]) > 1)):
-                                        break
-                                free_neighbours += 1
-                if free_neighbours == 0:
-                    schedule_times[uav.id] += 1
-                    delay_counts[uav.id] += 1
+                if schedule_times[uav.id] != current_time:
                     continue
-                for i in range(0,2):
-                    voxel_key = (voxel.x, voxel.y, voxel.z, current_time + i)
-                    occupied_by = reservations[voxel_key] if voxel_key in reservations else []
-                    if any(other_id != uav.id for other_id in occupied_by):
-                        occupied = True
-                        break
-                #delay to next time step
-                if occupied is True or free_neighbours == 0:
-                    schedule_times[uav.id] += 1
-                    delay_counts[uav.id] += 1
+                # by the end of this iteration the spawn is either released or kept with the path
+                provisional.discard(uav.id)
+                spawn_pos = uav.destinations[0]
+                footprint = self.footprint_cells(uav, spawn_pos.x, spawn_pos.y, spawn_pos.z)
+                #second check, as UAVs planned earlier at this time may have booked the spawn or its exits
+                spawn_time = self.earliest_start(uav, footprint, current_time, reservations,
+                                                 environment.world_data, max_sim_time)
+                if spawn_time != current_time:
+                    self.release_spawn(reservations, footprint, uav.id, current_time)
+                    self.delay_to(uav, spawn_time, max_sim_time, schedule_times, delay_counts)
                     continue
 
                 # perform search to build path for the uav
                 full_path: List[State] = []
+                began = time.perf_counter()
+                self.search_deadline = total_deadline
+                if self.time_budget_per_uav_ms is not None:
+                    uav_deadline = began + self.time_budget_per_uav_ms / 1000 - uav_time[uav.id]
+                    self.search_deadline = uav_deadline if total_deadline is None else min(total_deadline, uav_deadline)
                 #segmented search for each goal
                 for idx, dest in enumerate(uav.destinations):
                     if idx == 0:
                         full_path.append(State(dest.x, dest.y, dest.z, current_time))
                     else:
                         start_state = full_path[-1]
-                        segment,segment_searched = self.a_star_search(
-                            start_state, dest, environment.world_data,
-                            max_sim_time,
-                            uav, obstacles, reservations,
-                            goals, starts)
+                        if self.search_deadline is not None and time.perf_counter() >= self.search_deadline:
+                            # out of search time: hold where the plan has got to
+                            self.stats["budget_holds"] += 1
+                            self.budget_exhausted[uav.id] = "time"
+                            break
+                        if self.goal_blocked(dest, start_state.time, max_sim_time, reservations,
+                                             environment.world_data, uav, provisional):
+                            # no delay can free the goal, so give up on this UAV
+                            self.release_spawn(reservations, footprint, uav.id, current_time)
+                            self.failures[uav.id] = "goal blocked"
+                            full_path = None
+                            break
+                        self.budget_hit = None
+                        certificate = self.failed_searches.get((uav.id, idx))
+                        if certificate is not None and certificate.covers(start_state):
+                            # an earlier attempt already searched everything this one could reach
+                            segment, segment_searched = None, 0
+                            self.stats["retries_skipped"] += 1
+                            self.stats["expansions_saved"] += certificate.expansions
+                            self.expansions_saved[uav.id] += certificate.expansions
+                        else:
+                            self.exhausted = None
+                            segment,segment_searched = self.a_star_search(
+                                start_state, dest, environment.world_data,
+                                max_sim_time,
+                                uav, obstacles, reservations,
+                                goals, starts)
+                            if segment is None and self.exhausted is not None:
+                                self.failed_searches[(uav.id, idx)] = self.exhausted
                         if segment is None:
                             # If no path is found, remove any reservations made for this UAV
-                            footprint = self.compute_footprint(uav, spawn_pos)
-                            for time in range(0,2):
-                                for voxel in footprint:
-                                    key = (voxel.x, voxel.y, voxel.z, current_time + time)
-                                    if key in reservations and uav.id in reservations[key]:
-                                        reservations[key].remove(uav.id)
-                                    try:
-                                        if reservations[key] == []:
-                                            del reservations[key]
-                                    except KeyError:
-                                        pass
+                            self.release_spawn(reservations, footprint, uav.id, current_time)
                             # delay the UAV and continue to the next one
                             schedule_times[uav.id] += 1
                             delay_counts[uav.id] += 1
@@ -373,6 +623,11 @@ class AStarPlanner():
                         # If a path is found, add the segment to the full path
                         full_path.extend(segment[1:])
                         searched_counts[uav.id] += segment_searched
+                        if self.budget_hit is not None:
+                            # the search ran out of budget: keep its best partial plan and stop there
+                            self.budget_exhausted[uav.id] = self.budget_hit
+                            break
+                uav_time[uav.id] += time.perf_counter() - began
                 if not full_path:
                     continue
                 # Remove oscillations from the path
@@ -381,7 +636,12 @@ class AStarPlanner():
                 reservations = self.add_reservation(reservations, uav, full_path)
                 # Assign the computed path
                 candidate_paths[uav.id] = full_path
+            # re-insert the UAVs delayed at this time
+            for uav in to_plan:
+                if schedule_times[uav.id] > current_time and uav.id not in self.failures:
+                    heapq.heappush(queue, (schedule_times[uav.id], sort_key(uav), positions[uav.id], uav))
 
+        self.search_deadline = None
         return candidate_paths, delay_counts,searched_counts
 
     def a_star_search(
@@ -392,392 +652,261 @@ class AStarPlanner():
         max_time: int,
         uav: UAV,
         obstacles: Dict[tuple,bool],
-        reservations: Dict[tuple,List[int]],
+        reservations: ReservationStore,
         goals: List[Pos],
-        starts: List[Pos]
+        starts: List[Pos],
+        horizon: int = None
     ):
         """
         A* search from start (State) to goal (Pos) using TMState.
         Returns a list of State (dropping moves_used) representing the found path,
         or None if no valid path is found.
+        When the node budget or search_deadline runs out, the search stops, sets budget_hit and
+        returns the path to the expanded state closest (Manhattan) to the goal, which may be start alone.
+        With a horizon, the search also stops at the first state popped at that time; such
+        states are scored with the static distance to the goal instead of the heuristics.
         Inspired by the A* algorithm from GeeksForGeeks
         Source: https://www.geeksforgeeks.org/a-search-algorithm/
         """
-        # TMState = (x, y, z, time, moves_used)
-        beam_width = self.beam_width
+        # TMState = (x, y, z, time, moves_used), packed into one int by StateCodec
+        codec = StateCodec(grid.shape, max(max_time, start.time), uav.max_speed)
+        sx, sy, sz, st, _ = codec.shifts
+        nodes = SearchNodes(codec)
+        index, codes, g_score, parent = nodes.index, nodes.codes, nodes.g, nodes.parent
+        came_from = ParentView(nodes)
         start_state = (start.x, start.y, start.z, start.time, uav.max_speed)
-        open_set = [(0, start_state)]
-        came_from = {}
-        g_score = {start_state: 0.00}
-        f_score = {start_state: 0.00} # for tracking the cost of the path over time
+        start_code = codec.encode(start_state)
+        nodes.add(start_code, 0.00)
+        # heap entries are (f, code, g); g lets stale entries be recognised on pop
+        open_set = make_frontier(self.beam_mode, self.beam_width, codec.time_of, self.stats)
+        open_set.push((0, start_code, 0.00))
+        # macro moves only: cells passed through on the way to each node
+        via = {}
+        macro = self.macro_moves and uav.max_speed > 1
+        # macro moves only: whether the UAV may end a move in a voxel at a time, by (x, y, z, t)
+        allowed = {}
+        # closed nodes
+        closed = set()
+        stats = self.stats
+        stats["pushes"] += 1
+        expansions_before = stats["expansions"]
+        evictions_before = stats["beam_evictions"]
         searched = 0
-
-        def euclidean_heuristic(state):
-            """Admissible heuristic when speed == 1 Euclidean distance to goal."""
-            x, y, z, t, used = state
-            return np.linalg.norm(np.array((x, y, z)) - np.array(goal.to_array()))
-
-        def euclidean_heuristic_scaled(state):
-            """Admissible heuristic when speed > 1 Euclidean distance to goal."""
-            x, y, z, t, used = state
-            if 1 <= uav.max_speed:
-                return np.ceil(
-                    np.linalg.norm(np.array((x, y, z)) - np.array(goal.to_array()))
-                    / uav.max_speed)
-            else:
-                return np.linalg.norm(np.array((x, y, z)) - np.array(goal.to_array()))
-
-        def manhattan_with_conflicts(state, goal: Pos, reservations, conflict_weight=10.0):
-            """Inadmissable heuristic that adds a penalty for
-            each conflict between neighbour and goal."""
-            x, y, z, t, _ = state
-            gx, gy, gz = goal.x, goal.y, goal.z
-            # Basic Manhattan distance
-            man_dist = abs(x - gx) + abs(y - gy) + abs(z - gz)
-            # Conflict penalty: sample along straight path
-            penalty = 0.0
-            steps = int(man_dist)
-            dx, dy, dz = np.sign(gx - x), np.sign(gy - y), np.sign(gz - z)
-            cx, cy, cz = x, y, z
-            for step in range(1, steps + 1):
-                if abs(cx - gx) > 0: cx += dx
-                elif abs(cy - gy) > 0: cy += dy
-                else: cz += dz
-                key = (int(cx), int(cy), int(cz), t + step)
-                if key in reservations:
-                    penalty += conflict_weight * len(reservations[key])
-            return man_dist + penalty
-
-        def manhattan(state, goal: Pos):
-            """
-            Basic Manhattan distance heuristic.
-            """
-            x, y, z, t, _ = state
-            gx, gy, gz = goal.x, goal.y, goal.z
-            # Basic Manhattan distance
-            man_dist = abs(x - gx) + abs(y - gy) + abs(z - gz)
-            return man_dist
-
-        def manhattan_scaled(state, goal: Pos,uav: UAV):
-            """
-            Scaled Manhattan distance heuristic.
-            Use this over manhattan normally
-            """
-            x, y, z, t, _ = state
-            gx, gy, gz = goal.x, goal.y, goal.z
-            # Basic Manhattan distance
-            if 1 <= uav.max_speed:
-                man_dist = Math.ceil((abs(x - gx) + abs(y - gy) + abs(z - gz)) / uav.max_speed)
-            else:
-                man_dist = abs(x - gx) + abs(y - gy) + abs(z - gz)
-            return man_dist
-
-        def reverse_manhattan(state, goal: Pos):
-            """
-            Reverse Manhattan distance heuristic.
-            Encourages UAVs to move away from their goals.
-            Most likely will fail
-            """
-            x, y, z, t, _ = state
-            gx, gy, gz = goal.x, goal.y, goal.z
-            # Basic Manhattan distance
-            man_dist = abs(x - gx) + abs(y - gy) + abs(z - gz)
-
-            return -man_dist
-
-        def oscillation_penalty(state, came_from, weight=5.0):
-            """
-            Penalize moves that reverse the last displacement, 
-            encouraging the planner to hover instead of zig-zag.
-            Redundant due to path cleaning
-            """
-            # state and its parent
-            x, y, z, t, _ = state
-            parent = came_from.get(state)
-            if parent is None or came_from.get(parent) is None:
-                return 0.0
-            # grandparent to compute last displacement
-            grand = came_from[parent]
-            # vectors
-            dx1, dy1, dz1 = parent[0]-grand[0], parent[1]-grand[1], parent[2]-grand[2]
-            dx2, dy2, dz2 = x-parent[0], y-parent[1], z-parent[2]
-            # dot product
-            dot = dx1*dx2 + dy1*dy2 + dz1*dz2
-            if dot < 0:  
-                return weight
-            return 0.0
-
-
-
-        def traffic_density_penalty(state, reservations, neighborhood=1, time_horizon=3, weight=1.0):
-            """
-            Penalize high-traffic regions by counting reserved cells in spatiotemporal neighborhood.
-            """
-            x, y, z, t, _ = state
-            count = 0
-            for (vx, vy, vz, tv), uavs in reservations.items():
-                if abs(vx - x) <= neighborhood and abs(vy - y) <= neighborhood and abs(vz - z) <= neighborhood:
-                    if t <= tv <= t + time_horizon:
-                        count += len(uavs)
-            return weight * count
-
-        def avoid_indirect_collisions_heuristic(state, reservations, obstacles, uav) -> int:
-            """
-            Heuristic for indirect collisions with other UAVs and obstacles.
-            Returns a penalty score based on the number of collisions.
-            """
-            x, y, z, t, used = state
-            nodes = self.compute_footprint(uav, Pos(x, y, z))
-            uav_collisions = 0
-            world_collisions = 0
-            for node in nodes:
-                for i in range(0,1):
-                    key = (node.x, node.y, node.z, t + i)
-                    if key in reservations:
-                        if uav.id in reservations[key]:
-                            uav_collisions += len(reservations[key]) - 1
-                        else:
-                            uav_collisions += len(reservations[key])
-                    if (node.x, node.y, node.z) in obstacles:
-                        world_collisions += 1
-                    if used == uav.max_speed - 1:
-                        key_next = (node.x, node.y, node.z, t +  1)
-                        if key_next in reservations:
-                            if uav.id in reservations[key_next]:
-                                uav_collisions += len(reservations[key_next]) - 1
-                            else:
-                                uav_collisions += len(reservations[key_next])
-            if self.enable_indirect_world_collisions is True:
-                return (uav_collisions * 10000) + (world_collisions * 50)
-            else:
-                return (uav_collisions * 10000) + (world_collisions * 10000)
-
-        def avoid_indirect_collisions_bool(state, reservations, obstacles, uav) -> bool:
-            """
-            Check if the UAV's footprint at the current state collides with any other UAVs or obstacles.
-            """
-            x, y, z, t, used = state
-            nodes = self.compute_footprint(uav, Pos(x, y, z))
-            for node in nodes:
-                for i in range(0,2):
-                    key = (node.x, node.y, node.z, t + i)
-                    if key in reservations:
-                        if uav.id in reservations[key]:
-                            if len(reservations[key]) - 1 > 0:
-                                return True
-                        else: return True
-                    if self.enable_indirect_world_collisions is False:
-                        if (node.x, node.y, node.z) in obstacles:
-                            return True
-                    if used == uav.max_speed - 1:
-                        key_next = (node.x, node.y, node.z, t +  1)
-                        if key_next in reservations:
-                            if uav.id in reservations[key_next]:
-                                if len(reservations[key_next]) - 1 > 0:
-                                    return True
-                            else:
-                                return True
-            return False
-    
-        def avoid_direct_collisions(state, reservations, uav):
-            """
-            heavily penalize direct collisions with other UAVs
-            """
-            if state in reservations:
-                if uav.id in reservations[state]:
-                    return (len(reservations[state]) - 1) * 10000
-                else:
-                    return len(reservations[state]) * 10000
-            else:
-                if obstacles.get((state[0], state[1], state[2]), False):
-                    return 1
-            return 0
-
-        def move_from_goals(state, goals):
-            """
-            Incentivise UAVs to move away from UAV goals
-            """
-            x, y, z, t, used = state
-            distance = 0
-            for goal in goals:
-                distance += abs(x - goal.x) + abs(y - goal.y) + abs(z - goal.z)
-            return distance
-
-        def move_from_starts(state, starts):
-            """
-            Incentivise UAVs to move away from all currently known UAV starting positions.
-            """
-            x, y, z, t, used = state
-            distance = 0
-            for start in starts:
-                distance -= abs(x - start.x) + abs(y - start.y) + abs(z - start.z)
-            return -distance
-
-        def same_y(state,goal):
-            """
-            Incentivise UAVs to stay at the same altitude as their goal.
-            """
-            x, y, z, t, used = state
-            return abs(y - goal.y) * 2
-
-        def incentivise_moving(state,came_from):
-            """
-            Incentivise UAVs to move by returning higher a
-            higher score for each consecutive wait
-            """
-            count = 0
-            current = state
-            while current in came_from:
-                parent = came_from[current]
-                x, y, z, t, _      = current
-                px, py, pz, pt, _  = parent
-                if (px, py, pz) == (x, y, z) and t == pt + 1:
-                    count += 1
-                    current = parent
-                else:
-                    break
-            return count
-
-        def higher_inaccuracy_penalty(state, uav,grid,goal):
-            """
-            Incentivise inaccurate UAVs to maintain a higher altitude whilst not above goal
-            """
-            x, y, z, t, used = state
-            if x == goal.x and z == goal.z:
-                return 0
-            return  ((grid.shape[1] - y ) * uav.inaccuracy[0]) / grid.shape[1]
-
-        def move_in_straight_line(state,came_from,goal,start):
-            """
-            Incentivise UAVs to move in a straight line based on previous movement
-            """
-            sx, sy, sz, st = start
-            x, y, z, t, used = state
-            px, py, pz, pt, pu = came_from
-            gx, gy, gz = goal.x, goal.y, goal.z
-            if gx - sx > gz - sz:
-                if x == gx:
-                    return 0
-                if x - px == 0:
-                    return 0.5
-            elif gz - sz > gx - sx:
-                if z == gz:
-                    return 0
-                if z - pz == 0:
-                    return 0.5
-            else:
-                return 0
-            return 0
-
-        def minimum_time_lower_bound(state, goal, max_speed):
-            """
-            returns lower bound on time-to-go: distance divided by max_speed
-            """
-            x, y, z, t, _ = state
-            dist = np.linalg.norm(np.array((x, y, z)) - np.array(goal.to_array()))
-            return dist / max_speed
+        # states dropped by the beam or a veto make a failed search incomplete
+        pruned = False
+        self.budget_hit = None
+        self.exhausted = None
+        node_budget = self.node_budget_per_segment
+        deadline = self.search_deadline
+        budgeted = node_budget is not None or deadline is not None
+        expanded = 0
+        closest, closest_key = 0, None
+        increment, multiplier = self.g_score_increment, self.g_score_multiplier
+
+        context = SearchContext(self, uav, start, goal, grid, reservations, obstacles, goals, starts)
+        terms = bind_terms(self.heuristic_terms, context, macro)
+        zero_heuristic = self.zero_heuristic
+        if horizon is not None:
+            static_distance = self.goal_distance_field(grid, goal, uav).item
 
         while open_set:
+            f, code, entry_g = open_set.pop()
+            stats["pops"] += 1
+            current_node = index[code]
+            if self.closed_set:
+                if entry_g > g_score[current_node]:
+                    # a cheaper entry for this state was pushed after this one
+                    stats["stale_skips"] += 1
+                    continue
+                closed.add(current_node)
+            stats["expansions"] += 1
 
-            if len(open_set) > beam_width:
-                open_set = heapq.nsmallest(beam_width, open_set, key=lambda x: x[0])
-                heapq.heapify(open_set)
-            f, current = heapq.heappop(open_set)
-
+            current = codec.decode(code)
             x, y, z, t, used = current
-            if (x, y, z) == (goal.x, goal.y, goal.z):
-                path = [current]
-                while current in came_from:
-                    current = came_from[current]
-                    path.append(current)
-
-                path.reverse()
-                return ([State(s[0], s[1], s[2], s[3]) for s in path],searched)
+            if (x, y, z) == (goal.x, goal.y, goal.z) or (horizon is not None and t >= horizon):
+                return (self.trace_path(current_node, nodes, via),searched)
+            if budgeted:
+                # best partial plan so far: nearest the goal, then earliest
+                key = (abs(x - goal.x) + abs(y - goal.y) + abs(z - goal.z), t)
+                if closest_key is None or key < closest_key:
+                    closest, closest_key = current_node, key
+                expanded += 1
+                if node_budget is not None and expanded > node_budget:
+                    self.budget_hit = "nodes"
+                elif deadline is not None and time.perf_counter() >= deadline:
+                    self.budget_hit = "time"
+                if self.budget_hit is not None:
+                    stats["budget_" + self.budget_hit] += 1
+                    return (self.trace_path(closest, nodes, via),searched)
             if t >= max_time:
                 continue
-            neighbors = []
-            #generate neighbors based on UAV max speed
-            for dx, dy, dz in [(-1,0,0), (1,0,0), (0,-1,0), (0,1,0), (0,0,-1), (0,0,1)]:
-                nx, ny, nz = x + dx, y + dy, z + dz
-                if (0 <= nx < grid.shape[0] and
-                    0 <= ny < grid.shape[1] and
-                    0 <= nz < grid.shape[2]):
-                    if grid[nx, ny, nz] == 0:
-                        key = (nx, ny, nz, t)
-                        if key not in reservations or uav.id not in reservations[key]:
-                            if used < uav.max_speed - 1:
-                                neighbor = (nx, ny, nz, t, used + 1)
-                                neighbors.append(neighbor)
-                            else:
-                                if t + 1 < max_time:
-                                    neighbor = (nx, ny, nz, t + 1, 0)
-                                    neighbors.append(neighbor)
-            key = (x, y, z, t + 1, 0)
-            if key not in reservations or uav.id not in reservations[key] and t + 1 < max_time:
-                neighbors.append((x, y, z, t + 1, 0)) # add wait state
-            if self.disable_collisions is False:
-                filtered_neighbors = neighbors
+            if macro:
+                successors = self.macro_successors(current, grid, reservations, uav, max_time, allowed)
             else:
-                filtered_neighbors = []
-                for nbr in neighbors:
-                    if avoid_indirect_collisions_bool(nbr, reservations, obstacles, uav) is True:
-                        # disable collisions with other UAVs
-                        # would overlap footprints in t or t+1
-                        continue
-                    filtered_neighbors.append(nbr)
-
-            for neighbor in filtered_neighbors:
-                tentative_g = (g_score[current] + self.g_score_increment) * self.g_score_multiplier
-                if neighbor not in g_score or tentative_g < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g
+                successors = self.unit_successors(current, grid, reservations, uav, max_time)
+            for neighbor, cells in successors:
+                tentative_g = (g_score[current_node] + increment) * multiplier
+                nx, ny, nz, nt, nused = neighbor
+                neighbor_code = nx << sx | ny << sy | nz << sz | nt << st | nused
+                node = index.get(neighbor_code)
+                if node is None or tentative_g < g_score[node]:
+                    if node is None:
+                        node = nodes.add(neighbor_code, tentative_g, current_node)
+                    else:
+                        if node in closed:
+                            if not self.reopen_closed:
+                                searched += 1
+                                continue
+                            closed.discard(node)
+                            stats["reopenings"] += 1
+                        parent[node] = current_node
+                        g_score[node] = tentative_g
+                    if macro:
+                        via[node] = cells
                     h = 0.0
-                    if self.heuristics.get("euclidean") is True:
-                        h += euclidean_heuristic(neighbor)
-                    if self.heuristics.get("move_from_goals") is True:
-                        h += move_from_goals(neighbor, goals)
-                    if self.heuristics.get("move_from_starts") is True:
-                        h += move_from_starts(neighbor, starts)
-                    if self.heuristics.get("avoid_indirect_collisions") is True:
-                        collision_score = avoid_indirect_collisions_heuristic(
-                            neighbor, reservations, obstacles, uav
-                            )
-                        if collision_score > 0 and self.disable_collisions is True:
+                    vetoed = False
+                    for score, vetoes in terms:
+                        value = score(neighbor, came_from)
+                        if vetoes and value > 0:
+                            vetoed = True
                             break
-                        h += collision_score
-                    if self.heuristics.get("avoid_direct_collisions") is True:
-                        collision_score = avoid_direct_collisions(neighbor, reservations, uav)
-                        if collision_score > 0 and self.disable_collisions is True:
-                            break
-                        h += collision_score
-                    if self.heuristics.get("move_in_straight_line") is True:
-                        h += move_in_straight_line(neighbor,came_from[neighbor],goal,start)
-                    if self.heuristics.get("same_y") is True:
-                        h += same_y(neighbor,goal)
-                    if self.heuristics.get("higher_inaccuracy_penalty") is True:
-                        h += higher_inaccuracy_penalty(neighbor, uav, grid,goal)
-                    if self.heuristics.get("traffic_density_penalty") is True:
-                        h += traffic_density_penalty(neighbor, reservations)
-                    if self.heuristics.get("manhattan") is True:
-                        h += manhattan(neighbor, goal)
-                    if self.heuristics.get("manhattan_scaled") is True:
-                        h += manhattan_scaled(neighbor, goal,uav)
-                    if self.heuristics.get("euclidean_scaled") is True:
-                        h += euclidean_heuristic_scaled(neighbor)
-                    if self.heuristics.get("reverse_manhattan") is True:
-                        h += reverse_manhattan(neighbor, goal)
-                    if self.heuristics.get("manhattan_conflicts") is True:
-                        h += manhattan_with_conflicts(neighbor, goal, reservations)
-                    if self.heuristics.get("oscillation_penalty") is True:
-                        h += oscillation_penalty(neighbor, came_from)
-                    if self.heuristics.get("incentivise_waiting"):
-                        h += incentivise_moving(neighbor,came_from[neighbor])
-                    if self.heuristics.get("minimum_time_lower_bound") is True:
-                        h += minimum_time_lower_bound(neighbor, goal, uav.max_speed)
-                    if self.heuristics.get("djikstra") is True:
+                        h += value
+                    if vetoed:
+                        pruned = True
+                        break
+                    if zero_heuristic:
                         h = 0
+                    if horizon is not None and nt >= horizon:
+                        # beyond the window only the static distance to the goal is known
+                        distance = static_distance(nx, ny, nz)
+                        if distance < 0:
+                            searched += 1
+                            continue
+                        h = distance / uav.max_speed
                     f = tentative_g + h
-                    f_score[neighbor] = f 
-                    heapq.heappush(open_set, (f, neighbor))
+                    if macro:
+                        # the scaled heuristics round up, so many macro states tie on f: prefer the later ones
+                        f -= MACRO_TIE_BREAK * tentative_g
+                    stats["pushes"] += 1
+                    open_set.push((f, neighbor_code, tentative_g))
                 searched += 1
+        if stats["beam_evictions"] > evictions_before:
+            pruned = True
+        if horizon is None and not pruned:
+            # every state generated was expanded, so this failure can vouch for retries (see FailedSearch)
+            ready = set()
+            for state_code in codes:
+                state = codec.decode(state_code)
+                if state[4] >= uav.max_speed - 1:
+                    ready.add(state[:4])
+            self.exhausted = FailedSearch(ready, stats["expansions"] - expansions_before, searched)
         return None,searched
+
+    @staticmethod
+    def trace_path(node: int, nodes: SearchNodes, via: Dict[int, list]) -> List[State]:
+        """Path from the search's start to node, including the cells macro moves pass through."""
+        path = []
+        for step in nodes.lineage(node):
+            x, y, z, t, _ = nodes.state(step)
+            for cell in via.get(step) or ():
+                path.append(State(*cell, t))
+            path.append(State(x, y, z, t))
+        return path
+
+    def unit_successors(self, state: tuple, grid: np.ndarray, reservations: ReservationStore,
+                        uav: UAV, max_time: int) -> List[tuple]:
+        """
+        Single moves and the wait from state, as (neighbor, cells passed through).
+        A move stays in the current timestep until max_speed moves have been used.
+        """
+        x, y, z, t, used = state
+        neighbors = []
+        #generate neighbors based on UAV max speed
+        for dx, dy, dz in MOVES:
+            nx, ny, nz = x + dx, y + dy, z + dz
+            if (0 <= nx < grid.shape[0] and
+                0 <= ny < grid.shape[1] and
+                0 <= nz < grid.shape[2]):
+                if grid[nx, ny, nz] == 0:
+                    if not reservations.has_uav(nx, ny, nz, t, uav.id):
+                        if used < uav.max_speed - 1:
+                            neighbor = (nx, ny, nz, t, used + 1)
+                            neighbors.append(neighbor)
+                        else:
+                            if t + 1 < max_time:
+                                neighbor = (nx, ny, nz, t + 1, 0)
+                                neighbors.append(neighbor)
+        # waiting is always allowed, also where this UAV itself is booked (its spawn while it searches)
+        if t + 1 < max_time:
+            neighbors.append((x, y, z, t + 1, 0)) # add wait state
+        if self.disable_collisions is False:
+            filtered_neighbors = neighbors
+        else:
+            filtered_neighbors = []
+            for nbr in neighbors:
+                if self.footprint_collides(nbr, reservations, grid, uav) is True:
+                    # disable collisions with other UAVs
+                    # would overlap footprints in t or t+1
+                    continue
+                filtered_neighbors.append(nbr)
+        return [(nbr, None) for nbr in filtered_neighbors]
+
+    def macro_successors(self, state: tuple, grid: np.ndarray, reservations: ReservationStore,
+                         uav: UAV, max_time: int, allowed: Dict[tuple, bool] = None) -> List[tuple]:
+        """
+        Every cell reachable from state within max_speed moves during the next timestep,
+        plus the wait, as (neighbor, cells passed through).
+        A bounded breadth-first search applies the checks unit_successors makes to every move,
+        so the UAV ends each timestep in one state (x, y, z, t + 1, max_speed).
+        Each successor costs one g step, so g counts timesteps rather than moves
+        and the speed-scaled heuristics fit it.
+        allowed memoises the obstacle and footprint checks of a voxel at t + 1 across calls
+        that share the same reservations.
+        """
+        x, y, z, t, _ = state
+        speed = uav.max_speed
+        next_t = t + 1
+        if next_t >= max_time:
+            return []
+        size_x, size_y, size_z = grid.shape
+        disable_collisions = self.disable_collisions
+        if allowed is None:
+            allowed = {}
+        successors = []
+        wait = (x, y, z, next_t, speed)
+        if not (disable_collisions and self.footprint_collides(wait, reservations, grid, uav)):
+            successors.append((wait, None))
+        parents = {(x, y, z): None}
+        frontier = [(x, y, z)]
+        for moves in range(1, speed + 1):
+            # the first move leaves from time t, the rest from t + 1
+            from_t = t if moves == 1 else next_t
+            reached = []
+            for cell in frontier:
+                cx, cy, cz = cell
+                for dx, dy, dz in MOVES:
+                    nx, ny, nz = cx + dx, cy + dy, cz + dz
+                    if (nx, ny, nz) in parents:
+                        continue
+                    neighbor = (nx, ny, nz, next_t, speed)
+                    key = (nx, ny, nz, next_t)
+                    free = allowed.get(key)
+                    if free is None:
+                        free = (0 <= nx < size_x and 0 <= ny < size_y and 0 <= nz < size_z
+                                and grid[nx, ny, nz] == 0
+                                and not (disable_collisions and
+                                         self.footprint_collides(neighbor, reservations, grid, uav)))
+                        allowed[key] = free
+                    if not free or reservations.has_uav(nx, ny, nz, from_t, uav.id):
+                        continue
+                    parents[(nx, ny, nz)] = cell
+                    reached.append((nx, ny, nz))
+                    cells = []
+                    step = cell
+                    while parents[step] is not None:
+                        cells.append(step)
+                        step = parents[step]
+                    cells.reverse()
+                    successors.append((neighbor, cells))
+            frontier = reached
+        return successors
@@ -0,0 +1,126 @@
+"""Portfolio planning: prioritised planning under several UAV orderings, keeping the best."""
+import copy
+import multiprocessing
+import random
+from typing import Dict, List
+import simulator.utils.config as cfg
+from simulator.environment.environment import Environment
+from simulator.tester.tester import candidate_evaluator
+from simulator.path_planner.path_planner import AStarPlanner
+
+
+def plan_member(planner: AStarPlanner, index: int, ordering: Dict[str, int], environment: Environment):
+    """
+    Plan the environment with AStarPlanner.plan_path under one ordering and score the result
+    by simulating it, as run_tests would.
+    Module level so that it can run in a worker process.
+    Returns (index, candidate_paths, delay_counts, searched_counts, score, perfect, details),
+    details holding the stats, failures, expansions_saved and budget_exhausted of the run.
+    """
+    member = copy.copy(planner)
+    member.ordering = ordering
+    environment.reset_environment()
+    start_times = {uav.id: uav.start_time for uav in environment.uav_list}
+    candidate, delays, searched = AStarPlanner.plan_path(member, environment)
+    key = f"portfolio-{index}"
+    results = {"success": False, "timesteps": 0, "movements": 0, "waited": 0, "collisions": (0, 0)}
+    if all(uav.id in candidate for uav in environment.uav_list):
+        output_mode = environment.output_mode
+        environment.output_mode = 0
+        environment.candidate_paths[key] = candidate
+        environment.set_active_candidate_path(key)
+        results = environment.run()
+        # the simulation moves start times to the planned spawns, put them back for the next member
+        del environment.candidate_paths[key]
+        for uav in environment.uav_list:
+            uav.start_time = start_times[uav.id]
+        environment.output_mode = output_mode
+        environment.reset_environment()
+    score = candidate_evaluator(key, results, searched_totals={key: sum(searched.values())})
+    perfect = results["success"] and results["collisions"] == (0, 0) and not any(delays.values())
+    details = {"stats": dict(member.stats), "failures": dict(member.failures),
+               "expansions_saved": dict(member.expansions_saved),
+               "budget_exhausted": dict(member.budget_exhausted)}
+    return index, candidate, delays, searched, score, perfect, details
+
+
+def _plan_member(args):
+    return plan_member(*args)
+
+
+class PortfolioPlanner(AStarPlanner):
+    """
+    Runs AStarPlanner.plan_path once per UAV ordering in a portfolio and returns the candidate
+    with the best candidate_evaluator score, ties going to the earlier ordering.
+    The portfolio is the planner's own ordering, then any given orderings, then `permutations`
+    random reorderings of its fields drawn with `seed`.
+    Members run in `workers` processes; once one plans every UAV with no delay and no collision
+    the members still outstanding are stopped.
+    """
+
+    def __init__(self, *args, orderings: List[Dict[str, int]] = None,
+                 permutations: int = cfg.PORTFOLIO_PERMUTATIONS, seed: int = cfg.PORTFOLIO_SEED,
+                 workers: int = cfg.PORTFOLIO_WORKERS, **kwargs):
+        """
+        orderings - list of ordering dicts to try, in the format of ordering
+        permutations - int, random orderings to add to the portfolio
+        seed - int, seed for the random orderings
+        workers - int, processes planning members; 1 runs them inline
+        Other arguments are as for AStarPlanner."""
+        super().__init__(*args, **kwargs)
+        self.orderings = self.portfolio(orderings or [], permutations, seed)
+        self.workers = workers
+        # (ordering, score or None if stopped early) of each member of the last plan_path
+        self.results: List[tuple] = []
+
+    def portfolio(self, orderings: List[Dict[str, int]], permutations: int, seed: int) -> List[Dict[str, int]]:
+        """Distinct orderings to try, in order."""
+        portfolio = []
+        for ordering in [self.ordering] + list(orderings):
+            if ordering not in portfolio:
+                portfolio.append(dict(ordering))
+        # start_time is always the primary key, so only the other fields are shuffled
+        fields = [field for field in self.ordering if field != "start_time"]
+        rng = random.Random(seed)
+        for _ in range(permutations):
+            positions = rng.sample(range(1, len(fields) + 1), len(fields))
+            ordering = {field: position if self.ordering[field] >= 0 else -position
+                        for field, position in zip(fields, positions)}
+            if "start_time" in self.ordering:
+                ordering["start_time"] = self.ordering["start_time"]
+            if ordering not in portfolio:
+                portfolio.append(ordering)
+        return portfolio
+
+    def plan_path(self, environment: Environment):
+        """Plan under every ordering of the portfolio. Returns (candidate_paths, delay_counts, searched_counts)."""
+        jobs = [(self, index, ordering, environment) for index, ordering in enumerate(self.orderings)]
+        outcomes = []
+        if self.workers > 1:
+            pool = multiprocessing.Pool(min(self.workers, len(jobs)))
+            try:
+                for outcome in pool.imap_unordered(_plan_member, jobs):
+                    outcomes.append(outcome)
+                    if outcome[5]:
+                        break
+            finally:
+                # stops members still running after a perfect one
+                pool.terminate()
+                pool.join()
+        else:
+            for job in jobs:
+                outcomes.append(plan_member(*job))
+                if outcomes[-1][5]:
+                    break
+
+        best = min(outcomes, key=lambda outcome: (outcome[4], outcome[0]))
+        index, candidate, delays, searched, score, _, details = best
+        scores = {outcome[0]: outcome[4] for outcome in outcomes}
+        self.results = [(ordering, scores.get(i)) for i, ordering in enumerate(self.orderings)]
+        self.failures = details["failures"]
+        self.expansions_saved = details["expansions_saved"]
+        self.budget_exhausted = details["budget_exhausted"]
+        self.stats = {**details["stats"], "portfolio_members": len(outcomes),
+                      "portfolio_stopped": len(self.orderings) - len(outcomes), "portfolio_best": index}
+        self.ordering_used = self.orderings[index]
+        return candidate, delays, searched
@@ -0,0 +1,99 @@
+"""Integer-packed search states and array-backed bookkeeping for a_star_search."""
+from array import array
+from typing import Dict, List, Optional
+
+
+class StateCodec:
+    """
+    Packs a search state (x, y, z, t, used) into one int, with bit widths taken from the
+    grid shape, the latest time and the UAV's max_speed. x takes the highest bits and used
+    the lowest, so codes sort in the same order as the tuples they encode.
+    """
+
+    def __init__(self, shape: tuple, max_time: int, max_speed: int):
+        widths = [max(1, int(n).bit_length()) for n in (shape[0] - 1, shape[1] - 1, shape[2] - 1,
+                                                          max_time, max_speed)]
+        # shift of each field, from x down to used
+        self.shifts = tuple(sum(widths[i + 1:]) for i in range(5))
+        self.masks = tuple((1 << width) - 1 for width in widths)
+        self.bits = sum(widths)
+
+    def encode(self, state: tuple) -> int:
+        sx, sy, sz, st, _ = self.shifts
+        x, y, z, t, used = state
+        return x << sx | y << sy | z << sz | t << st | used
+
+    def decode(self, code: int) -> tuple:
+        return tuple(code >> shift & mask for shift, mask in zip(self.shifts, self.masks))
+
+    def time_of(self, code: int) -> int:
+        return code >> self.shifts[3] & self.masks[3]
+
+
+class SearchNodes:
+    """
+    Every state a search has generated, numbered in order of generation.
+    Node n has code codes[n], g score g[n] and parent node parent[n] (-1 for the start);
+    index maps a code back to its node.
+    """
+
+    def __init__(self, codec: StateCodec):
+        self.codec = codec
+        self.index: Dict[int, int] = {}
+        self.codes = array("q")
+        self.g = array("d")
+        self.parent = array("l")
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def add(self, code: int, g: float, parent: int = -1) -> int:
+        node = len(self.codes)
+        self.index[code] = node
+        self.codes.append(code)
+        self.g.append(g)
+        self.parent.append(parent)
+        return node
+
+    def state(self, node: int) -> tuple:
+        return self.codec.decode(self.codes[node])
+
+    def lineage(self, node: int) -> List[int]:
+        """Nodes from the start to node."""
+        parent = self.parent
+        nodes = [node]
+        while parent[node] >= 0:
+            node = parent[node]
+            nodes.append(node)
+        nodes.reverse()
+        return nodes
+
+
+class ParentView:
+    """
+    Read-only came_from mapping of state tuples over SearchNodes, so heuristic terms can
+    keep walking parents with came_from[state] and came_from.get(state).
+    """
+
+    def __init__(self, nodes: SearchNodes):
+        self.nodes = nodes
+
+    def _parent(self, state: tuple) -> Optional[int]:
+        nodes = self.nodes
+        node = nodes.index.get(nodes.codec.encode(state))
+        if node is None or nodes.parent[node] < 0:
+            return None
+        return nodes.parent[node]
+
+    def __contains__(self, state: tuple) -> bool:
+        return self._parent(state) is not None
+
+    def __getitem__(self, state: tuple) -> tuple:
+        parent = self._parent(state)
+        if parent is None:
+            raise KeyError(state)
+        return self.nodes.state(parent)
+
+    def get(self, state: tuple, default=None):
+        parent = self._parent(state)
+        return default if parent is None else self.nodes.state(parent)
@@ -0,0 +1,272 @@
+"""Safe Interval Path Planning on top of the prioritised A* planner."""
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+from simulator.utils.shared_imports import np, State, Pos
+from simulator.uav.uav import UAV
+from simulator.reservations.reservations import ReservationStore
+from simulator.utils.footprint import footprint_class
+from simulator.path_planner.frontier import make_frontier
+from simulator.path_planner.heuristics import SearchContext
+from simulator.path_planner.path_planner import AStarPlanner
+
+MOVES = [(-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1)]
+
+
+class SafeIntervals:
+    """
+    Safe intervals of every voxel for one UAV, computed lazily from a reservation store.
+    With the planner's disable_collisions on, a voxel is safe at t when the UAV's footprint
+    there overlaps no other UAV's reservation at t or t+1 and, unless indirect world
+    collisions are allowed, no obstacle: the footprint test AStarPlanner filters neighbours
+    with. Otherwise AStarPlanner does not filter neighbours, so every voxel is always safe.
+    """
+
+    def __init__(self, planner: AStarPlanner, grid: np.ndarray, reservations: ReservationStore,
+                 uav: UAV, start_time: int, max_time: int):
+        self.planner = planner
+        self.grid = grid
+        self.reservations = reservations
+        self.uav = uav
+        self.start_time = start_time
+        self.max_time = max_time
+        # nothing after this time can make a voxel unsafe
+        self.quiet_after = reservations.latest_time()
+        self.intervals: Dict[tuple, List[Tuple[int, int]]] = {}
+        self.starts: Dict[tuple, List[int]] = {}
+
+    def of(self, cell: tuple) -> List[Tuple[int, int]]:
+        """Sorted, disjoint (first, last) safe timesteps of cell within [start_time, max_time]."""
+        intervals = self.intervals.get(cell)
+        if intervals is None:
+            intervals = self._compute(cell)
+            self.intervals[cell] = intervals
+            self.starts[cell] = [first for first, _ in intervals]
+        return intervals
+
+    def _compute(self, cell: tuple) -> List[Tuple[int, int]]:
+        planner, uav, reservations = self.planner, self.uav, self.reservations
+        if planner.disable_collisions is False:
+            return [(self.start_time, self.max_time)]
+        if planner.enable_indirect_world_collisions is False and planner.obstacle_counts(self.grid, uav).item(cell) > 0:
+            return []
+        nodes = planner.footprint_cells(uav, *cell)
+        footprint = footprint_class(uav)
+
+        def busy_at(t):
+            return not reservations.footprint_clear(footprint, *cell, t) and reservations.any_other(nodes, t, uav.id)
+        intervals = []
+        first = None
+        busy_next = busy_at(self.start_time)
+        for t in range(self.start_time, min(self.max_time, self.quiet_after) + 1):
+            busy = busy_next
+            busy_next = busy_at(t + 1)
+            if busy or busy_next:
+                if first is not None:
+                    intervals.append((first, t - 1))
+                    first = None
+            elif first is None:
+                first = t
+        if first is None:
+            first = max(self.start_time, min(self.max_time, self.quiet_after) + 1)
+        if first <= self.max_time:
+            intervals.append((first, self.max_time))
+        return intervals
+
+    def index(self, cell: tuple, t: int) -> Optional[int]:
+        """Index of the safe interval of cell containing t, or None if cell is unsafe at t."""
+        intervals = self.of(cell)
+        i = bisect_right(self.starts[cell], t) - 1
+        if i >= 0 and intervals[i][1] >= t:
+            return i
+        return None
+
+
+class SIPPPlanner(AStarPlanner):
+    """
+    Prioritised planner whose low-level search runs over (voxel, safe interval, moves used)
+    instead of every (x, y, z, t, moves used) state, so a hold behind other traffic is a
+    single successor rather than one node per waited timestep.
+    Takes the same options as AStarPlanner, except macro_moves, and returns the same
+    (candidate_paths, delay_counts, searched_counts) triple from plan_path.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Arguments are as for AStarPlanner; macro_moves is not supported."""
+        super().__init__(*args, **kwargs)
+        if self.macro_moves:
+            raise ValueError("SIPPPlanner does not support macro_moves")
+
+    def a_star_search(
+        self,
+        start: State,
+        goal: Pos,
+        grid: np.ndarray,
+        max_time: int,
+        uav: UAV,
+        obstacles: Dict[tuple, bool],
+        reservations: ReservationStore,
+        goals: List[Pos],
+        starts: List[Pos]
+    ):
+        """
+        SIPP search from start (State) to goal (Pos).
+        Returns the path as a list of State, with the waits expanded one timestep at a time,
+        and the number of successors evaluated, or (None, searched) if no path is found.
+        Budgets and heuristic vetoes work as in AStarPlanner.a_star_search.
+        """
+        speed = uav.max_speed
+        safe = SafeIntervals(self, grid, reservations, uav, start.time, max_time)
+        context = SearchContext(self, uav, start, goal, grid, reservations, obstacles, goals, starts)
+        terms = [(term.bind(context), vetoes) for term, vetoes in self.heuristic_terms]
+        zero_heuristic = self.zero_heuristic
+        stats = self.stats
+
+        start_state = (start.x, start.y, start.z, start.time, speed)
+        start_cell = (start.x, start.y, start.z)
+        start_interval = safe.index(start_cell, start.time)
+        # a start that is already unsafe may still be left straight away
+        start_end = start.time if start_interval is None else safe.of(start_cell)[start_interval][1]
+        key_of = {start_state: (start_cell, start_interval, speed)}
+        interval_end = {start_state: start_end}
+        departs = {}
+        came_from = {}
+        g_score = {key_of[start_state]: 0.00}
+        closed = set()
+        open_set = make_frontier(self.beam_mode, self.beam_width, stats=self.stats)
+        open_set.push((0, start_state, 0.00))
+        stats["pushes"] += 1
+        searched = 0
+        self.budget_hit = None
+        node_budget = self.node_budget_per_segment
+        deadline = self.search_deadline
+        budgeted = node_budget is not None or deadline is not None
+        expanded = 0
+        closest, closest_key = start_state, None
+
+        while open_set:
+            f, current, entry_g = open_set.pop()
+            stats["pops"] += 1
+            current_key = key_of[current]
+            if self.closed_set:
+                if entry_g > g_score[current_key]:
+                    stats["stale_skips"] += 1
+                    continue
+                closed.add(current_key)
+            stats["expansions"] += 1
+
+            x, y, z, t, used = current
+            if (x, y, z) == (goal.x, goal.y, goal.z):
+                return self.reconstruct(current, came_from, departs), searched
+            if budgeted:
+                # best partial plan so far: nearest the goal, then earliest
+                key = (abs(x - goal.x) + abs(y - goal.y) + abs(z - goal.z), t)
+                if closest_key is None or key < closest_key:
+                    closest, closest_key = current, key
+                expanded += 1
+                if node_budget is not None and expanded > node_budget:
+                    self.budget_hit = "nodes"
+                elif deadline is not None and time.perf_counter() >= deadline:
+                    self.budget_hit = "time"
+                if self.budget_hit is not None:
+                    stats["budget_" + self.budget_hit] += 1
+                    return self.reconstruct(closest, came_from, departs), searched
+            if t >= max_time:
+                continue
+            # latest timestep the UAV can keep waiting where it is
+            hold_until = min(interval_end[current], max_time - 1)
+            for successor, depart in self.successors(current, hold_until, grid, reservations, safe, uav):
+                nx, ny, nz, nt, nused = successor
+                key = ((nx, ny, nz), safe.index((nx, ny, nz), nt), nused)
+                tentative_g = entry_g
+                # one step per waited timestep plus the move itself
+                for _ in range(depart - t + 1):
+                    tentative_g = (tentative_g + self.g_score_increment) * self.g_score_multiplier
+                searched += 1
+                if key in g_score and tentative_g >= g_score[key]:
+                    continue
+                if key in closed:
+                    if not self.reopen_closed:
+                        continue
+                    closed.discard(key)
+                    stats["reopenings"] += 1
+                came_from[successor] = current
+                g_score[key] = tentative_g
+                key_of[successor] = key
+                departs[successor] = depart
+                interval_end[successor] = safe.of((nx, ny, nz))[key[1]][1]
+                h = 0.0
+                vetoed = False
+                for score, vetoes in terms:
+                    value = score(successor, came_from)
+                    if vetoes and value > 0:
+                        vetoed = True
+                        break
+                    h += value
+                if vetoed:
+                    # as in AStarPlanner, a veto drops the rest of this node's successors
+                    break
+                if zero_heuristic:
+                    h = 0
+                stats["pushes"] += 1
+                open_set.push((tentative_g + h, successor, tentative_g))
+        return None, searched
+
+    def successors(self, state: tuple, hold_until: int, grid: np.ndarray,
+                   reservations: ReservationStore, safe: SafeIntervals, uav: UAV):
+        """
+        Yield (successor, departure time) pairs: moving straight away, and the earliest
+        arrival in each later safe interval of a neighbour reachable by holding first.
+        Moves follow a_star_search: max_speed moves per timestep and no entering a voxel
+        this UAV itself has reserved at the departure time.
+        """
+        x, y, z, t, used = state
+        speed = uav.max_speed
+        size_x, size_y, size_z = grid.shape
+        for dx, dy, dz in MOVES:
+            nx, ny, nz = x + dx, y + dy, z + dz
+            if not (0 <= nx < size_x and 0 <= ny < size_y and 0 <= nz < size_z):
+                continue
+            if grid[nx, ny, nz] != 0:
+                continue
+            cell = (nx, ny, nz)
+            # move without holding first
+            if used < speed - 1:
+                earliest = (t, used + 1)
+            else:
+                earliest = (t + 1, 0)
+            arrival, nused = earliest
+            immediate = None
+            if arrival < safe.max_time and safe.index(cell, arrival) is not None \
+                    and not reservations.has_uav(nx, ny, nz, t, uav.id):
+                immediate = arrival
+                yield (nx, ny, nz, arrival, nused), t
+            # hold until w in (t, hold_until], then move: arrives at w with one move
+            # used, or at w + 1 when a single move ends the timestep
+            step = 0 if speed > 1 else 1
+            nused = 1 if speed > 1 else 0
+            low, high = t + 1 + step, hold_until + step
+            for first, last in safe.of(cell):
+                if last < low or first > high:
+                    continue
+                for arrival in range(max(first, low), min(last, high) + 1):
+                    if arrival == immediate or arrival >= safe.max_time:
+                        continue
+                    depart = arrival - step
+                    if not reservations.has_uav(nx, ny, nz, depart, uav.id):
+                        yield (nx, ny, nz, arrival, nused), depart
+                        break
+
+    @staticmethod
+    def reconstruct(state: tuple, came_from: Dict[tuple, tuple], departs: Dict[tuple, int]) -> List[State]:
+        """Path from the start to state, with every held timestep as its own State."""
+        path = []
+        while state in came_from:
+            parent = came_from[state]
+            path.append(State(state[0], state[1], state[2], state[3]))
+            for t in range(departs[state], parent[3], -1):
+                path.append(State(parent[0], parent[1], parent[2], t))
+            state = parent
+        path.append(State(state[0], state[1], state[2], state[3]))
+        path.reverse()
+        return path
@@ -0,0 +1,206 @@
+"""Windowed cooperative A* (WHCA*): prioritised planning over a rolling time window."""
+from typing import Dict, List
+import simulator.utils.config as cfg
+from simulator.utils.shared_imports import State, Pos
+from simulator.uav.uav import UAV
+from simulator.environment.environment import Environment
+from simulator.path_planner.path_planner import AStarPlanner, remove_same_timestep_oscillations, SEARCH_STATS
+
+
+class WindowedPlanner(AStarPlanner):
+    """
+    Prioritised planner that only plans and reserves the next `window` timesteps of each UAV.
+    Beyond the window a UAV is scored by its static distance to the goal (see a_star_search).
+    Every `window // 2` timesteps the committed part of each plan is kept and every UAV in the
+    air replans from where it is, against a fresh reservation store covering the new window,
+    so latency and reservation memory per round do not grow with the length of the mission.
+    Takes the same options as AStarPlanner and returns the same
+    (candidate_paths, delay_counts, searched_counts) triple from plan_path.
+    """
+
+    def __init__(self, *args, window: int = cfg.DEFAULT_WINDOW, **kwargs):
+        """
+        window - int >= 1, timesteps planned and reserved per round
+        Other arguments are as for AStarPlanner."""
+        super().__init__(*args, **kwargs)
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        self.window = window
+        self.replan_interval = max(1, window // 2)
+
+    def plan_path(self, environment: Environment):
+        """Plan every UAV one window at a time. Returns (candidate_paths, delay_counts, searched_counts)."""
+        self.stats = dict.fromkeys(SEARCH_STATS, 0)
+        self.stats.update({"rounds": 0, "window_failures": 0, "hold_replans": 0, "hold_conflicts": 0})
+        self.failures = {}
+        self.budget_exhausted = {}
+        self.failed_searches = {}
+        self.expansions_saved = {uav.id: 0 for uav in environment.uav_list}
+        uav_list = self.order_uavs(environment.uav_list)
+        grid = environment.world_data
+        schedule_times = {uav.id: uav.start_time for uav in uav_list}
+        delay_counts: Dict[int, int] = {uav.id: 0 for uav in uav_list}
+        searched_counts: Dict[int, int] = {uav.id: 0 for uav in uav_list}
+        goals: List[Pos] = [dest for uav in uav_list for dest in uav.destinations[1:]]
+        starts = [uav.destinations[0] for uav in uav_list]
+        obstacles = self.create_obstacle_dict(environment)
+        max_sim_time = max(schedule_times.values()) + cfg.MAX_SIM_TIME
+        # environment reservations by time, so each round only loads its own window
+        env_reservations: Dict[int, list] = {}
+        for state in environment.reservations:
+            env_reservations.setdefault(state[3], []).append(state)
+
+        # committed path and index of the next destination of every spawned UAV
+        committed: Dict[int, List[State]] = {}
+        next_dest: Dict[int, int] = {}
+        finished = set()
+
+        round_start = 0
+        while round_start <= max_sim_time and len(finished) < len(uav_list):
+            self.stats["rounds"] += 1
+            horizon = min(round_start + self.window, max_sim_time)
+            cut = round_start + self.replan_interval
+            reservations = self.create_reservation_store(environment, self.window + 1, start=round_start)
+            for t in range(round_start, horizon + 2):
+                for state in env_reservations.get(t, ()):
+                    reservations.add(*state, -1)
+
+            # UAVs in the air hold their current footprint; new UAVs book their spawn
+            to_plan = []
+            for uav in self.order_uavs([uav for uav in uav_list if uav.id not in finished], delay_counts):
+                if uav.id in committed:
+                    here = committed[uav.id][-1]
+                    footprint = self.footprint_cells(uav, here.x, here.y, here.z)
+                    reservations.add_cells(footprint, round_start, uav.id)
+                    reservations.add_cells(footprint, round_start + 1, uav.id)
+                    to_plan.append((uav, here))
+                    continue
+                spawn = uav.destinations[0]
+                footprint = self.footprint_cells(uav, spawn.x, spawn.y, spawn.z)
+                spawn_time = max(schedule_times[uav.id], round_start)
+                while spawn_time < cut and (reservations.any_other(footprint, spawn_time, uav.id) or
+                                            reservations.any_other(footprint, spawn_time + 1, uav.id)):
+                    spawn_time += 1
+                schedule_times[uav.id] = spawn_time
+                delay_counts[uav.id] = spawn_time - uav.start_time
+                if spawn_time >= cut:
+                    continue
+                reservations.add_cells(footprint, spawn_time, uav.id)
+                reservations.add_cells(footprint, spawn_time + 1, uav.id)
+                to_plan.append((uav, State(spawn.x, spawn.y, spawn.z, spawn_time)))
+
+            # what each UAV booked this round, so a hold can take its place: (uav, here, path,
+            # committed length and next destination before the round)
+            booked: Dict[int, tuple] = {}
+            replanned = set()
+            i = 0
+            while i < len(to_plan):
+                uav, here = to_plan[i]
+                i += 1
+                path, reached, searched = self.plan_window(
+                    here, uav, next_dest.get(uav.id, 1), horizon, grid, obstacles, reservations, goals, starts)
+                searched_counts[uav.id] += searched
+                if path is None:
+                    self.stats["window_failures"] += 1
+                    if uav.id not in committed:
+                        # not spawned yet: give the spawn back and try again a timestep later
+                        footprint = self.footprint_cells(uav, here.x, here.y, here.z)
+                        for t in (here.time, here.time + 1):
+                            reservations.remove_cells(footprint, t, uav.id)
+                        schedule_times[uav.id] = here.time + 1
+                        delay_counts[uav.id] = here.time + 1 - uav.start_time
+                        continue
+                    # hold position until the next round
+                    path = [here] + [State(here.x, here.y, here.z, t) for t in range(here.time + 1, cut + 1)]
+                    reached = []
+                    if self.hold_collides(uav, path, reservations, grid):
+                        # UAVs planned earlier this round give way to the hold and plan again after it
+                        for owner in sorted(self.hold_owners(uav, path, reservations) - replanned):
+                            if owner in booked:
+                                to_plan.append(self.unbook(booked.pop(owner), reservations, committed,
+                                                           next_dest, finished))
+                                replanned.add(owner)
+                                self.stats["hold_replans"] += 1
+                        if self.hold_collides(uav, path, reservations, grid):
+                            self.stats["hold_conflicts"] += 1
+                booked[uav.id] = (uav, here, path, len(committed.get(uav.id, ())), next_dest.get(uav.id))
+                reservations = self.add_reservation(reservations, uav, path)
+                # keep the plan up to the next round
+                prefix = [state for state in path if state.time <= cut]
+                if uav.id in committed:
+                    committed[uav.id].extend(prefix[1:])
+                else:
+                    committed[uav.id] = prefix
+                next_dest[uav.id] = next_dest.get(uav.id, 1) + sum(1 for time in reached if time <= cut)
+                if next_dest[uav.id] >= len(uav.destinations):
+                    finished.add(uav.id)
+            round_start = cut
+
+        candidate_paths = {uav_id: remove_same_timestep_oscillations(path) for uav_id, path in committed.items()}
+        return candidate_paths, delay_counts, searched_counts
+
+    def hold_collides(self, uav: UAV, hold: List[State], reservations, grid) -> bool:
+        """True if the hold fails the footprint test a_star_search filters neighbours with."""
+        if self.disable_collisions is False:
+            return False
+        return any(self.footprint_collides((s.x, s.y, s.z, s.time, 0), reservations, grid, uav) for s in hold[1:])
+
+    def hold_owners(self, uav: UAV, hold: List[State], reservations) -> set:
+        """Ids reserving any voxel the hold would book (-1 for env reservations), besides the UAV's own."""
+        owners = set()
+        for footprint, t in self.path_footprints(uav, hold):
+            for x, y, z in footprint.tolist():
+                owners.update(reservations.get(x, y, z, t))
+        owners.discard(uav.id)
+        return owners
+
+    def unbook(self, entry: tuple, reservations, committed: Dict[int, List[State]],
+               next_dest: Dict[int, int], finished: set):
+        """Undo a UAV's plan for this round, keeping the footprint it held at its start.
+        Returns its (uav, here) entry to plan again."""
+        uav, here, path, committed_length, dest_index = entry
+        self.remove_reservation(reservations, uav, path)
+        footprint = self.footprint_cells(uav, here.x, here.y, here.z)
+        reservations.add_cells(footprint, here.time, uav.id)
+        reservations.add_cells(footprint, here.time + 1, uav.id)
+        if committed_length:
+            del committed[uav.id][committed_length:]
+        else:
+            del committed[uav.id]
+        if dest_index is None:
+            next_dest.pop(uav.id, None)
+        else:
+            next_dest[uav.id] = dest_index
+        finished.discard(uav.id)
+        return uav, here
+
+    def plan_window(self, here: State, uav: UAV, dest_index: int, horizon: int, grid, obstacles,
+                    reservations, goals: List[Pos], starts: List[Pos]):
+        """
+        Plan from here through the remaining destinations until the window ends.
+        A search that runs out of budget ends the plan at its best partial path, as in
+        AStarPlanner.plan_path, and is recorded in budget_exhausted.
+        Returns (path or None, arrival times of the destinations reached, nodes searched).
+        """
+        path = [here]
+        reached = []
+        searched = 0
+        for dest in uav.destinations[dest_index:]:
+            self.budget_hit = None
+            segment, segment_searched = self.a_star_search(
+                path[-1], dest, grid, horizon + 1, uav, obstacles, reservations, goals, starts, horizon=horizon)
+            searched += segment_searched
+            if segment is None:
+                return None, reached, searched
+            path.extend(segment[1:])
+            if self.budget_hit is not None:
+                self.budget_exhausted[uav.id] = self.budget_hit
+                break
+            end = path[-1]
+            if (end.x, end.y, end.z) != (dest.x, dest.y, dest.z):
+                # stopped at the edge of the window
+                break
+            reached.append(end.time)
+            if end.time >= horizon:
+                break
+        return path, reached, searched
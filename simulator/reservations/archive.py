@@ -0,0 +1,54 @@
+"""On-disk archive of the reservation slices a planner evicts once they are in the past."""
+import os
+from typing import Dict, Iterable, Iterator, List, Tuple
+from simulator.utils.shared_imports import np
+
+
+class ReservationArchive:
+    """
+    One compressed .npz file per timestep in directory, holding an (N, 4) int array of
+    (x, y, z, uav_id) rows, so a finished run's traffic can be reloaded a slice at a time.
+    A timestep written twice is merged with what is already there.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, t: int) -> str:
+        return os.path.join(self.directory, f"t{t:07d}.npz")
+
+    def write(self, t: int, entries: Iterable[Tuple[tuple, List[int]]]) -> None:
+        """Store the (x, y, z, t) -> ids entries of timestep t."""
+        rows = [(key[0], key[1], key[2], uav_id) for key, ids in entries for uav_id in ids]
+        if not rows:
+            return
+        rows = np.array(rows, dtype=np.int32).reshape(-1, 4)
+        path = self._path(t)
+        if os.path.exists(path):
+            rows = np.concatenate([self.rows(t), rows])
+        np.savez_compressed(path, rows=rows)
+
+    def times(self) -> List[int]:
+        """Archived timesteps, in order."""
+        return sorted(int(name[1:-4]) for name in os.listdir(self.directory)
+                      if name.startswith("t") and name.endswith(".npz"))
+
+    def rows(self, t: int) -> np.ndarray:
+        """The (x, y, z, uav_id) rows archived for timestep t (empty if none)."""
+        path = self._path(t)
+        if not os.path.exists(path):
+            return np.zeros((0, 4), dtype=np.int32)
+        with np.load(path) as data:
+            return data["rows"]
+
+    def load(self, t: int) -> Dict[tuple, List[int]]:
+        """Reservations of timestep t, keyed by (x, y, z, t) like a reservation table."""
+        table: Dict[tuple, List[int]] = {}
+        for x, y, z, uav_id in self.rows(t).tolist():
+            table.setdefault((x, y, z, t), []).append(uav_id)
+        return table
+
+    def items(self) -> Iterator[Tuple[tuple, List[int]]]:
+        for t in self.times():
+            yield from self.load(t).items()
@@ -0,0 +1,678 @@
+"""Reservation stores used by the path planners to book space-time voxels."""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+from simulator.utils.shared_imports import np
+from simulator.utils.footprint import SMALL_FOOTPRINT, footprint_stencil, footprint_sums
+import simulator.utils.config as cfg
+
+# uint8 codes used by the occupancy backend
+_FREE = 0
+_SHARED = 255
+_ID_OFFSET = 3  # owner codes are uav_id + 3, so ids -2..251 fit in a single byte
+
+
+def _as_cells(cells) -> np.ndarray:
+    """Convert a footprint (array, list of tuples or list of Pos) to an (N, 3) int array."""
+    if isinstance(cells, np.ndarray):
+        return cells.reshape(-1, 3)
+    return np.array([tuple(cell) for cell in cells], dtype=np.int64).reshape(-1, 3)
+
+
+def _iter_cells(cells):
+    """Iterate a footprint as (x, y, z) triples of Python ints."""
+    if isinstance(cells, np.ndarray):
+        return cells.reshape(-1, 3).tolist()
+    return cells
+
+
+class ReservationStore(ABC):
+    """
+    Interface for a table of (x, y, z, t) -> [uav ids] reservations.
+    Env reservations use the id -1.
+    Behaves like the old dict for `in`, `[]`, `len` and `items()` so existing callers keep working.
+    """
+
+    @abstractmethod
+    def add(self, x: int, y: int, z: int, t: int, uav_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def remove(self, x: int, y: int, z: int, t: int, uav_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, x: int, y: int, z: int, t: int) -> List[int]:
+        """Return the ids reserving a voxel (empty list if free)."""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[tuple, List[int]]]:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def count(self, x: int, y: int, z: int, t: int) -> int:
+        """Number of UAVs reserving a voxel."""
+        return len(self.get(x, y, z, t))
+
+    def has_uav(self, x: int, y: int, z: int, t: int, uav_id: int) -> bool:
+        """True if the voxel is reserved by uav_id."""
+        return uav_id in self.get(x, y, z, t)
+
+    def count_others(self, x: int, y: int, z: int, t: int, uav_id: int) -> int:
+        """Number of UAVs other than uav_id reserving a voxel."""
+        ids = self.get(x, y, z, t)
+        return len(ids) - 1 if uav_id in ids else len(ids)
+
+    def add_cells(self, cells, t: int, uav_id: int) -> None:
+        """Reserve every voxel of a footprint at time t."""
+        for x, y, z in _iter_cells(cells):
+            self.add(x, y, z, t, uav_id)
+
+    def remove_cells(self, cells, t: int, uav_id: int) -> None:
+        """Release every voxel of a footprint at time t."""
+        for x, y, z in _iter_cells(cells):
+            self.remove(x, y, z, t, uav_id)
+
+    def any_other(self, cells, t: int, uav_id: int) -> bool:
+        """True if any voxel of the footprint is reserved by another UAV at time t."""
+        for x, y, z in _iter_cells(cells):
+            if self.count_others(x, y, z, t, uav_id) > 0:
+                return True
+        return False
+
+    def track_footprint(self, footprint: Tuple[float, int]) -> None:
+        """Keep footprint_clear answers for footprints of this (radius, shape) class, if the backend can."""
+
+    def footprint_clear(self, footprint: Tuple[float, int], x: int, y: int, z: int, t: int) -> bool:
+        """
+        True if nothing at all is reserved at time t under a footprint of a tracked class
+        centred on (x, y, z), answered in constant time. False means "not known": the
+        voxels have to be checked one by one, e.g. with any_other.
+        """
+        return False
+
+    def count_others_cells(self, cells, t: int, uav_id: int) -> int:
+        """Sum of count_others over every voxel of the footprint at time t."""
+        return sum(self.count_others(x, y, z, t, uav_id) for x, y, z in _iter_cells(cells))
+
+    def first_free(self, cells, t: int, uav_id: int, until: int) -> Optional[int]:
+        """
+        Earliest time in [t, until] at which no other UAV reserves any voxel of the footprint,
+        either at that time or the next, or None if there is none.
+        """
+        quiet_after = self.latest_time()
+        busy_next = self.any_other(cells, t, uav_id)
+        while t <= until:
+            if t > quiet_after:
+                return t
+            busy, busy_next = busy_next, self.any_other(cells, t + 1, uav_id)
+            if not busy and not busy_next:
+                return t
+            t += 1
+        return None
+
+    def count_in_box(self, x: int, y: int, z: int, t: int, radius: int, horizon: int) -> int:
+        """
+        Number of (voxel, uav) reservations within +-radius voxels of (x,y,z)
+        and between times t and t+horizon. Exhaustive scan, kept as the reference.
+        """
+        count = 0
+        for (vx, vy, vz, tv), ids in self.items():
+            if abs(vx - x) <= radius and abs(vy - y) <= radius and abs(vz - z) <= radius:
+                if t <= tv <= t + horizon:
+                    count += len(ids)
+        return count
+
+    def evict_before(self, t: int, archive=None) -> int:
+        """
+        Drop every reservation at a time before t, writing each dropped timestep to
+        archive (a ReservationArchive) first if one is given. Returns the number of
+        (voxel, uav) reservations dropped. Generic fallback over items().
+        """
+        by_time: Dict[int, list] = {}
+        for key, ids in self.items():
+            if key[3] < t:
+                by_time.setdefault(key[3], []).append((key, ids))
+        evicted = 0
+        for time in sorted(by_time):
+            if archive is not None:
+                archive.write(time, by_time[time])
+            for key, ids in by_time[time]:
+                for uav_id in ids:
+                    self.remove(*key, uav_id)
+                evicted += len(ids)
+        return evicted
+
+    def latest_time(self) -> int:
+        """Latest timestep that may hold a reservation, or -1 if there are none."""
+        return max((key[3] for key, _ in self.items()), default=-1)
+
+    def keys(self) -> Iterator[tuple]:
+        for key, _ in self.items():
+            yield key
+
+    def __contains__(self, key) -> bool:
+        # a search state (x,y,z,t,moves) would never match, so it is an error rather than False
+        if not isinstance(key, tuple) or len(key) != 4:
+            raise TypeError(f"Reservation keys are (x, y, z, t) tuples, got {key!r}")
+        return self.count(*key) > 0
+
+    def __getitem__(self, key) -> List[int]:
+        ids = self.get(*tuple(key))
+        if not ids:
+            raise KeyError(key)
+        return ids
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self.keys()
+
+
+class DictReservationStore(ReservationStore):
+    """
+    Reference backend: a plain dict keyed by (x, y, z, t) tuples.
+    An existing dict can be passed in and will be updated in place.
+    """
+
+    def __init__(self, table: Optional[Dict[tuple, List[int]]] = None):
+        self.table: Dict[tuple, List[int]] = table if table is not None else {}
+        # keys grouped by time so a single timestep can be read without a full scan
+        self._keys_by_time: Dict[int, set] = {}
+        for key in self.table:
+            self._keys_by_time.setdefault(key[3], set()).add(key)
+
+    @classmethod
+    def for_grid(cls, shape: Tuple[int, int, int], horizon: int, start: int = 0) -> "DictReservationStore":
+        return cls()
+
+    def add(self, x, y, z, t, uav_id):
+        key = (x, y, z, t)
+        ids = self.table.get(key)
+        if ids is None:
+            self.table[key] = [uav_id]
+            self._keys_by_time.setdefault(t, set()).add(key)
+        elif uav_id not in ids:
+            ids.append(uav_id)
+
+    def remove(self, x, y, z, t, uav_id):
+        key = (x, y, z, t)
+        ids = self.table.get(key)
+        if ids is None or uav_id not in ids:
+            return
+        ids.remove(uav_id)
+        if not ids:
+            del self.table[key]
+            self._keys_by_time[t].discard(key)
+
+    def get(self, x, y, z, t):
+        return list(self.table.get((x, y, z, t), []))
+
+    def has_uav(self, x, y, z, t, uav_id):
+        ids = self.table.get((x, y, z, t))
+        return ids is not None and uav_id in ids
+
+    def count(self, x, y, z, t):
+        ids = self.table.get((x, y, z, t))
+        return 0 if ids is None else len(ids)
+
+    def items(self):
+        for key, ids in self.table.items():
+            yield key, list(ids)
+
+    def items_at(self, t: int) -> Iterator[Tuple[tuple, List[int]]]:
+        """Reservations at a single timestep."""
+        for key in self._keys_by_time.get(t, ()):
+            yield key, list(self.table[key])
+
+    def any_at(self, t: int) -> bool:
+        """True if anything is reserved at timestep t."""
+        return bool(self._keys_by_time.get(t))
+
+    def times(self) -> List[int]:
+        """Timesteps holding at least one reservation."""
+        return [t for t, keys in self._keys_by_time.items() if keys]
+
+    def pop_at(self, t: int) -> List[Tuple[tuple, List[int]]]:
+        """Remove and return every reservation at timestep t."""
+        keys = self._keys_by_time.pop(t, ())
+        return [(key, self.table.pop(key)) for key in keys]
+
+    def evict_before(self, t, archive=None):
+        evicted = 0
+        for time in sorted(time for time in self.times() if time < t):
+            entries = self.pop_at(time)
+            if archive is not None:
+                archive.write(time, entries)
+            evicted += sum(len(ids) for _, ids in entries)
+        return evicted
+
+    def latest_time(self):
+        return max(self.times(), default=-1)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class OccupancyReservationStore(ReservationStore):
+    """
+    Default backend: one dense uint8 occupancy grid per timestep.
+    Time slices live in a ring buffer covering [t0, t0 + capacity); a slice is only
+    allocated once something is reserved in it. Each cell holds the owning id + 3,
+    or _SHARED when several UAVs reserve it (their ids are then kept in a small dict).
+    Voxels outside the grid or the window go to an overflow dict.
+    Each slice also gets a lazily rebuilt 3D summed-area table of reservation counts,
+    so count_in_box costs a constant number of lookups per timestep.
+    For every tracked footprint class, each slice keeps a "forbidden centres" mask: the
+    number of reservations a footprint centred on each voxel would overlap (the Minkowski
+    sum of the reservations and the footprint). Built on the first footprint_clear of the
+    class and updated on every add and remove from then on, so footprint_clear is one lookup.
+    evict_before frees the slices of past timesteps and slides the window forward, so a long
+    run only holds the slices between the current planning time and its horizon.
+    """
+
+    def __init__(self, shape: Tuple[int, int, int], horizon: int = cfg.MAX_SIM_TIME,
+                 max_bytes: int = cfg.OCCUPANCY_MAX_BYTES, start: int = 0):
+        self.shape = tuple(int(s) for s in shape)
+        cells = max(1, self.shape[0] * self.shape[1] * self.shape[2])
+        self.max_capacity = max(1, max_bytes // cells)
+        self.capacity = min(max(1, horizon + 2), self.max_capacity)
+        self.t0 = start
+        self._slots: List[Optional[np.ndarray]] = [None] * self.capacity
+        # summed-area tables per slot, None when missing or out of date
+        self._sums: List[Optional[np.ndarray]] = [None] * self.capacity
+        self._shared: Dict[tuple, List[int]] = {}
+        self._overflow = DictReservationStore()
+        self._dense_len = 0
+        # footprint classes to keep masks for, and their forbidden-centre count grid per slot
+        # (None while the slot has none)
+        self._tracked = set()
+        self._masks: Dict[tuple, List[Optional[np.ndarray]]] = {}
+
+    @classmethod
+    def for_grid(cls, shape: Tuple[int, int, int], horizon: int, start: int = 0) -> "OccupancyReservationStore":
+        return cls(shape, horizon, start=start)
+
+    # --- slice management ---
+    def _dense(self, x, y, z, t) -> bool:
+        return (self.t0 <= t < self.t0 + self.capacity and
+                0 <= x < self.shape[0] and 0 <= y < self.shape[1] and 0 <= z < self.shape[2])
+
+    def _slice(self, t: int, create: bool = False) -> Optional[np.ndarray]:
+        index = t % self.capacity
+        grid = self._slots[index]
+        if grid is None and create:
+            grid = np.zeros(self.shape, dtype=np.uint8)
+            self._slots[index] = grid
+        return grid
+
+    def _grow(self, t: int) -> None:
+        """Widen the window so that t fits, up to max_capacity slices."""
+        new_capacity = self.capacity
+        while t >= self.t0 + new_capacity and new_capacity < self.max_capacity:
+            new_capacity = min(new_capacity * 2, self.max_capacity)
+        if new_capacity == self.capacity:
+            return
+        old_slots = {self.t0 + i: self._slice(self.t0 + i) for i in range(self.capacity)}
+        old_masks = {footprint: {time: masks[time % self.capacity] for time in old_slots}
+                     for footprint, masks in self._masks.items()}
+        self.capacity = new_capacity
+        self._slots = [None] * new_capacity
+        self._sums = [None] * new_capacity
+        for time, grid in old_slots.items():
+            if grid is not None:
+                self._slots[time % new_capacity] = grid
+        for footprint, by_time in old_masks.items():
+            masks = self._masks[footprint] = [None] * new_capacity
+            for time, mask in by_time.items():
+                masks[time % new_capacity] = mask
+        self._absorb_overflow(self.t0 + len(old_slots), self.t0 + new_capacity)
+
+    def _absorb_overflow(self, start: int, stop: int) -> None:
+        """Move overflow reservations at times in [start, stop) that now fit the window into slices."""
+        for t in range(start, stop):
+            if not self._overflow.any_at(t):
+                continue
+            for key, ids in list(self._overflow.items_at(t)):
+                if self._dense(*key):
+                    for uav_id in ids:
+                        self._overflow.remove(*key, uav_id)
+                        self.add(*key, uav_id)
+
+    def evict_before(self, t, archive=None):
+        evicted = 0
+        end = self.t0 + self.capacity
+        dense_times = range(self.t0, min(t, end))
+        times = sorted(set(dense_times).union(time for time in self._overflow.times() if time < t))
+        for time in times:
+            entries = []
+            if time in dense_times:
+                index = time % self.capacity
+                grid = self._slots[index]
+                if grid is not None:
+                    for x, y, z in np.argwhere(grid != _FREE).tolist():
+                        code = int(grid[x, y, z])
+                        if code == _SHARED:
+                            entries.append(((x, y, z, time), self._shared.pop((x, y, z, time))))
+                        else:
+                            entries.append(((x, y, z, time), [code - _ID_OFFSET]))
+                    self._dense_len -= len(entries)
+                self._slots[index] = None
+                self._sums[index] = None
+                for masks in self._masks.values():
+                    masks[index] = None
+            entries += self._overflow.pop_at(time)
+            if archive is not None:
+                archive.write(time, entries)
+            evicted += sum(len(ids) for _, ids in entries)
+        if t > self.t0:
+            self.t0 = t
+            # the freed slots now hold the timesteps just past the old end of the window
+            self._absorb_overflow(max(end, t), t + self.capacity)
+        return evicted
+
+    # --- point operations ---
+    def add(self, x, y, z, t, uav_id):
+        if self._record(x, y, z, t, uav_id) and self._masks:
+            self._cover([(x, y, z)], t, 1)
+
+    def remove(self, x, y, z, t, uav_id):
+        if self._release(x, y, z, t, uav_id) and self._masks:
+            self._cover([(x, y, z)], t, -1)
+
+    def _record(self, x, y, z, t, uav_id) -> bool:
+        """Add a reservation, returning True if it is a new one in a dense slice."""
+        if t >= self.t0 + self.capacity:
+            self._grow(t)
+        if not self._dense(x, y, z, t):
+            self._overflow.add(x, y, z, t, uav_id)
+            return False
+        grid = self._slice(t, create=True)
+        self._sums[t % self.capacity] = None
+        code = int(grid[x, y, z])
+        key = (x, y, z, t)
+        if code == _FREE:
+            self._dense_len += 1
+            if -_ID_OFFSET < uav_id < _SHARED - _ID_OFFSET:
+                grid[x, y, z] = uav_id + _ID_OFFSET
+            else:
+                grid[x, y, z] = _SHARED
+                self._shared[key] = [uav_id]
+        elif code == _SHARED:
+            if uav_id in self._shared[key]:
+                return False
+            self._shared[key].append(uav_id)
+        elif code - _ID_OFFSET != uav_id:
+            grid[x, y, z] = _SHARED
+            self._shared[key] = [code - _ID_OFFSET, uav_id]
+        else:
+            return False
+        return True
+
+    def _release(self, x, y, z, t, uav_id) -> bool:
+        """Remove a reservation, returning True if one was removed from a dense slice."""
+        if not self._dense(x, y, z, t):
+            self._overflow.remove(x, y, z, t, uav_id)
+            return False
+        grid = self._slice(t)
+        if grid is None:
+            return False
+        self._sums[t % self.capacity] = None
+        code = int(grid[x, y, z])
+        key = (x, y, z, t)
+        if code == _SHARED:
+            ids = self._shared[key]
+            if uav_id not in ids:
+                return False
+            ids.remove(uav_id)
+            if not ids:
+                del self._shared[key]
+                grid[x, y, z] = _FREE
+                self._dense_len -= 1
+            elif len(ids) == 1 and -_ID_OFFSET < ids[0] < _SHARED - _ID_OFFSET:
+                grid[x, y, z] = ids[0] + _ID_OFFSET
+                del self._shared[key]
+            return True
+        if code != _FREE and code - _ID_OFFSET == uav_id:
+            grid[x, y, z] = _FREE
+            self._dense_len -= 1
+            return True
+        return False
+
+    def get(self, x, y, z, t):
+        if not self._dense(x, y, z, t):
+            return self._overflow.get(x, y, z, t)
+        grid = self._slice(t)
+        if grid is None:
+            return []
+        code = int(grid[x, y, z])
+        if code == _FREE:
+            return []
+        if code == _SHARED:
+            return list(self._shared[(x, y, z, t)])
+        return [code - _ID_OFFSET]
+
+    def has_uav(self, x, y, z, t, uav_id):
+        if not self._dense(x, y, z, t):
+            return self._overflow.has_uav(x, y, z, t, uav_id)
+        grid = self._slice(t)
+        if grid is None:
+            return False
+        code = int(grid[x, y, z])
+        if code == _SHARED:
+            return uav_id in self._shared[(x, y, z, t)]
+        return code != _FREE and code == uav_id + _ID_OFFSET
+
+    def count(self, x, y, z, t):
+        if not self._dense(x, y, z, t):
+            return self._overflow.count(x, y, z, t)
+        grid = self._slice(t)
+        if grid is None:
+            return 0
+        code = int(grid[x, y, z])
+        if code == _FREE:
+            return 0
+        if code == _SHARED:
+            return len(self._shared[(x, y, z, t)])
+        return 1
+
+    def count_others(self, x, y, z, t, uav_id):
+        if not self._dense(x, y, z, t):
+            return self._overflow.count_others(x, y, z, t, uav_id)
+        grid = self._slice(t)
+        if grid is None:
+            return 0
+        code = int(grid[x, y, z])
+        if code == _FREE:
+            return 0
+        if code == _SHARED:
+            ids = self._shared[(x, y, z, t)]
+            return len(ids) - 1 if uav_id in ids else len(ids)
+        return 0 if code == uav_id + _ID_OFFSET else 1
+
+    # --- footprint operations ---
+    def add_cells(self, cells, t, uav_id):
+        added = [cell for cell in _iter_cells(cells) if self._record(*cell, t, uav_id)]
+        if added and self._masks:
+            self._cover(added, t, 1)
+
+    def remove_cells(self, cells, t, uav_id):
+        removed = [cell for cell in _iter_cells(cells) if self._release(*cell, t, uav_id)]
+        if removed and self._masks:
+            self._cover(removed, t, -1)
+
+    def _cover(self, cells, t, delta):
+        """Add delta to every tracked mask at t, at each centre whose footprint covers one of the cells."""
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        index = t % self.capacity
+        for footprint, masks in self._masks.items():
+            centres = (cells[:, None, :] - footprint_stencil(*footprint)[None, :, :]).reshape(-1, 3)
+            centres = centres[np.all((centres >= 0) & (centres < self.shape), axis=1)]
+            mask = masks[index]
+            if mask is None:
+                mask = masks[index] = np.zeros(self.shape, dtype=np.uint16)
+            if delta > 0:
+                np.add.at(mask, (centres[:, 0], centres[:, 1], centres[:, 2]), 1)
+            else:
+                np.subtract.at(mask, (centres[:, 0], centres[:, 1], centres[:, 2]), 1)
+
+    def track_footprint(self, footprint):
+        # the masks are built on the first footprint_clear, so stores nobody asks cost nothing
+        self._tracked.add((footprint[0], footprint[1]))
+
+    def _build_masks(self, footprint) -> List[Optional[np.ndarray]]:
+        masks: List[Optional[np.ndarray]] = [None] * self.capacity
+        for index, grid in enumerate(self._slots):
+            if grid is not None:
+                t = self.t0 + ((index - self.t0) % self.capacity)
+                masks[index] = footprint_sums(self._counts(t).astype(np.uint16), *footprint)
+        self._masks[footprint] = masks
+        return masks
+
+    def footprint_clear(self, footprint, x, y, z, t):
+        masks = self._masks.get(footprint)
+        if masks is None:
+            if footprint not in self._tracked:
+                return False
+            masks = self._build_masks(footprint)
+        if not self.t0 <= t < self.t0 + self.capacity:
+            return False
+        # voxels past the far edges of the grid are only held in overflow
+        if self._overflow.any_at(t):
+            return False
+        mask = masks[t % self.capacity]
+        return mask is None or mask.item(x, y, z) == 0
+
+    def _split(self, cells, t):
+        """Split a footprint into the voxels held densely at t and those held in overflow."""
+        cells = _as_cells(cells)
+        if not self.t0 <= t < self.t0 + self.capacity:
+            return None, cells
+        inside = np.all((cells >= 0) & (cells < self.shape), axis=1)
+        return cells[inside], cells[~inside]
+
+    def _dense_codes(self, dense, t):
+        grid = self._slice(t)
+        if grid is None or dense is None or len(dense) == 0:
+            return None
+        return grid[dense[:, 0], dense[:, 1], dense[:, 2]]
+
+    def any_other(self, cells, t, uav_id):
+        if not isinstance(cells, np.ndarray) or len(cells) < SMALL_FOOTPRINT:
+            return super().any_other(cells, t, uav_id)
+        dense, outside = self._split(cells, t)
+        codes = self._dense_codes(dense, t)
+        if codes is not None:
+            own = uav_id + _ID_OFFSET
+            if np.any((codes != _FREE) & (codes != _SHARED) & (codes != own)):
+                return True
+            for x, y, z in dense[codes == _SHARED].tolist():
+                ids = self._shared[(x, y, z, t)]
+                if len(ids) > 1 or ids[0] != uav_id:
+                    return True
+        for x, y, z in outside.tolist():
+            if self._overflow.count_others(x, y, z, t, uav_id) > 0:
+                return True
+        return False
+
+    def count_others_cells(self, cells, t, uav_id):
+        if not isinstance(cells, np.ndarray) or len(cells) < SMALL_FOOTPRINT:
+            return super().count_others_cells(cells, t, uav_id)
+        dense, outside = self._split(cells, t)
+        codes = self._dense_codes(dense, t)
+        total = 0
+        if codes is not None:
+            own = uav_id + _ID_OFFSET
+            total += int(np.count_nonzero((codes != _FREE) & (codes != _SHARED) & (codes != own)))
+            for x, y, z in dense[codes == _SHARED].tolist():
+                ids = self._shared[(x, y, z, t)]
+                total += len(ids) - 1 if uav_id in ids else len(ids)
+        for x, y, z in outside.tolist():
+            total += self._overflow.count_others(x, y, z, t, uav_id)
+        return total
+
+    def _counts(self, t: int) -> Optional[np.ndarray]:
+        """Number of UAVs reserving each voxel of slice t, or None if the slice is not allocated."""
+        grid = self._slice(t)
+        if grid is None:
+            return None
+        counts = (grid != _FREE).astype(np.int32)
+        for x, y, z in np.argwhere(grid == _SHARED).tolist():
+            counts[x, y, z] = len(self._shared[(x, y, z, t)])
+        return counts
+
+    def _summed_area(self, t: int) -> Optional[np.ndarray]:
+        """Summed-area table of the reservation counts in slice t, padded with a zero plane per axis."""
+        index = t % self.capacity
+        sums = self._sums[index]
+        if sums is None:
+            counts = self._counts(t)
+            if counts is None:
+                return None
+            sums = np.zeros(tuple(s + 1 for s in self.shape), dtype=np.int32)
+            sums[1:, 1:, 1:] = counts.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)
+            self._sums[index] = sums
+        return sums
+
+    def count_in_box(self, x, y, z, t, radius, horizon):
+        count = 0
+        size_x, size_y, size_z = self.shape
+        x0, x1 = min(max(0, x - radius), size_x), min(max(0, x + radius + 1), size_x)
+        y0, y1 = min(max(0, y - radius), size_y), min(max(0, y + radius + 1), size_y)
+        z0, z1 = min(max(0, z - radius), size_z), min(max(0, z + radius + 1), size_z)
+        if x0 < x1 and y0 < y1 and z0 < z1:
+            # flat offsets of the box corners in the padded tables
+            sy, sz = (size_y + 1) * (size_z + 1), size_z + 1
+            ax, bx, ay, by = x0 * sy, x1 * sy, y0 * sz, y1 * sz
+            for tv in range(max(t, self.t0), min(t + horizon, self.t0 + self.capacity - 1) + 1):
+                sums = self._summed_area(tv)
+                if sums is None:
+                    continue
+                s = sums.item
+                count += (s(bx + by + z1) - s(ax + by + z1) - s(bx + ay + z1) - s(bx + by + z0)
+                          + s(ax + ay + z1) + s(ax + by + z0) + s(bx + ay + z0) - s(ax + ay + z0))
+        for tv in range(t, t + horizon + 1):
+            for (vx, vy, vz, _), ids in self._overflow.items_at(tv):
+                if abs(vx - x) <= radius and abs(vy - y) <= radius and abs(vz - z) <= radius:
+                    count += len(ids)
+        return count
+
+    def items(self):
+        for index in range(self.capacity):
+            t = self.t0 + ((index - self.t0) % self.capacity)
+            grid = self._slots[index]
+            if grid is None:
+                continue
+            for x, y, z in np.argwhere(grid != _FREE).tolist():
+                code = int(grid[x, y, z])
+                if code == _SHARED:
+                    yield (x, y, z, t), list(self._shared[(x, y, z, t)])
+                else:
+                    yield (x, y, z, t), [code - _ID_OFFSET]
+        yield from self._overflow.items()
+
+    def latest_time(self):
+        # allocated slices may have been emptied again, so this is an upper bound
+        latest = self._overflow.latest_time()
+        for t in range(self.t0 + self.capacity - 1, max(self.t0, latest + 1) - 1, -1):
+            if self._slice(t) is not None:
+                return t
+        return latest
+
+    def __len__(self):
+        return self._dense_len + len(self._overflow)
+
+
+RESERVATION_BACKENDS = {
+    "occupancy": OccupancyReservationStore,
+    "dict": DictReservationStore,
+}
+
+
+def make_reservation_store(backend: str, shape: Tuple[int, int, int], horizon: int,
+                           start: int = 0) -> ReservationStore:
+    """Build an empty reservation store for a grid of the given shape,
+    sized for the timesteps [start, start + horizon]."""
+    if backend not in RESERVATION_BACKENDS:
+        raise ValueError(f"Unsupported reservation backend: {backend}")
+    return RESERVATION_BACKENDS[backend].for_grid(shape, horizon, start)
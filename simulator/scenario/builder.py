@@ -0,0 +1,116 @@
+"""Build planners, UAVs, maps and scenarios from their json definitions."""
+import json
+from simulator.map.map import Map
+from simulator.uav.uav import UAV
+from simulator.maps import maps
+from simulator.utils.shared_imports import Pos
+from simulator.path_planner.path_planner import AStarPlanner, ObliviousPlanner
+from simulator.path_planner.sipp_planner import SIPPPlanner
+from simulator.path_planner.cbs_planner import CBSPlanner
+from simulator.path_planner.windowed_planner import WindowedPlanner
+from simulator.path_planner.hpa_planner import HPAPlanner
+from simulator.path_planner.portfolio_planner import PortfolioPlanner
+from simulator.scenario.scenario import Scenario
+import simulator.utils.config as cfg
+
+def load_config(path):
+    """
+    Load the scenario configuration from the JSON file provided by arg 1.
+    """
+
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            return json.load(f)
+    else:
+        raise ValueError("Unsupported scenario format; use .json")
+
+# planner classes by the "type" of their definition
+PLANNER_TYPES = {'AStarPlanner': AStarPlanner, 'SIPPPlanner': SIPPPlanner, 'CBSPlanner': CBSPlanner,
+                 'WindowedPlanner': WindowedPlanner, 'HPAPlanner': HPAPlanner,
+                 'PortfolioPlanner': PortfolioPlanner}
+
+def build_planners(planner_defs):
+    """
+    Build planners from the definitions provided in scenario config.
+    """
+    planners = {}
+    for name, config in planner_defs.items():
+        ptype = config.get('type', 'AStarPlanner')
+        if ptype in PLANNER_TYPES:
+            planners[name] = PLANNER_TYPES[ptype](
+                heuristics   = config.get('heuristics', cfg.DEFAULT_HEURISTICS),
+                beam_width   = config.get('beam_width', cfg.DEFAULT_BEAM_WIDTH),
+                ordering     = config.get('ordering', cfg.DEFAULT_ORDERING),
+                **{k: v for k, v in config.items()
+                if k not in ('heuristics','beam_width','ordering','type')}
+            )
+        elif ptype == 'Oblivious':
+            planners[name] = ObliviousPlanner()
+        else:
+            raise ValueError(f"Unsupported planner type: {config['type']}")
+    return planners
+
+def build_uav(uav_def):
+    """
+    Build a UAV from the definition provided in scenario config.
+    """
+    if 'name' not in uav_def:
+        raise ValueError("UAV definition must include 'name' key.")
+    if 'destinations' not in uav_def:
+        raise ValueError("UAV definition must include 'destinations' key.")
+    if len(uav_def['destinations']) < 2:
+        raise ValueError("UAV definition must include at least 2 destinations.")
+    dests = [Pos(*coords) for coords in uav_def['destinations']]
+    return UAV(
+        uav_type   = uav_def.get('uav_type', 0),
+        destinations=dests,
+        inaccuracy = uav_def.get('inaccuracy', [0,0]),
+        start_time = uav_def.get('start_time', 0),
+        max_speed  = uav_def.get('max_speed', 1),
+        name       = uav_def.get('name', '')
+    )
+
+def build_map(map_def, map_cache=None):
+    """
+    Build a Map from its json definition.
+    Maps already in map_cache are reused, so scenarios on the same map share what planners cache on it."""
+    map_name = map_def['name']
+    key = (map_name, map_def.get('scale', 1), map_def.get('repetitions', 0))
+    if map_cache is not None and key in map_cache:
+        return map_cache[key]
+    S_map = Map(
+        map_name,
+        getattr(maps, map_name),
+        scale       = key[1],
+        repetitions = key[2]
+    )
+    if map_cache is not None:
+        map_cache[key] = S_map
+    return S_map
+
+def build_scenario(sdef, planners, output_mode, map_cache=None):
+    """
+    Build a scenario from the json definition."""
+    S_map = build_map(sdef['map'], map_cache)
+
+    # build uav list
+    uavs = [build_uav(u) for u in sdef['uavs']]
+
+    # adds reservations to map
+    res_temp = sdef.get('reservations', [])
+    reservations = []
+    for res in res_temp:
+        reservations.append((res[0], res[1], res[2], res[3]))
+    
+    if output_mode == -1:
+        output_mode = sdef.get('output_mode', 0)
+    #creates scenario obj
+    scen = Scenario(
+        sdef.get('name', 'Unnamed'),
+        map=S_map,
+        uav_list=uavs,
+        output_mode=output_mode,
+        reservations=reservations
+    )
+    scen.assign_planners(planners)
+    return scen
@@ -20,7 +20,7 @@ class Scenario():
         self.uav_list = uav_list
         self.output_mode = output_mode
         self.reservations = reservations
-        self.env = Environment(map.world_data, output_mode)
+        self.env = Environment(map.world_data, output_mode, map=map)
         self.env.set_reservations(reservations)
         for uav in uav_list:
             self.env.register_uav(uav)
@@ -20,20 +20,30 @@ def run_tests(environment: Environment,
     searched_totals = {}
     time_dict = {}
     memory_dict = {}
+    stats_dict = {}
+    failures_dict = {}
+    saved_dict = {}
+    budget_dict = {}
+    node_logs = {}
     results = {}
 
     # prepare the final table
     table = PrettyTable()
     table.field_names = [
         "Scenario", "Planner", "Timesteps", "Movements", "Total Delayed",
-        "Collisions", "Success", "Score", "Total Searched",
+        "Collisions", "Success", "Failures", "Score", "Total Searched",
         "Run Time (s)", "Peak Mem (MB)"
     ]
 
+    # static data shared by the planners; the time spent building it is not part of any Run Time
+    index = environment.static_index()
+    index_time = 0.0
+
     # prepare measurement dicts
     for name, planner in planners.items():
         environment.reset_environment()
         tracemalloc.start()
+        built_before = index.build_time
         start_time = time.time()
 
         candidate, delay, searched = planner.plan_path(environment)
@@ -41,12 +51,19 @@ def run_tests(environment: Environment,
         end_time = time.time()
         current, peak = tracemalloc.get_traced_memory()
         tracemalloc.stop()
+        built = index.build_time - built_before
+        index_time += built
 
         all_candidate_paths[name] = candidate
         delay_dict[name]      = delay
         searched_dict[name]   = searched
-        time_dict[name]       = end_time - start_time
+        time_dict[name]       = end_time - start_time - built
         memory_dict[name]     = peak / 1024 / 1024
+        stats_dict[name]      = dict(getattr(planner, "stats", {}))
+        failures_dict[name]   = dict(getattr(planner, "failures", {}))
+        saved_dict[name]      = dict(getattr(planner, "expansions_saved", {}))
+        budget_dict[name]     = dict(getattr(planner, "budget_exhausted", {}))
+        node_logs[name]       = list(getattr(planner, "node_log", []))
 
     # assign the candidate paths to the environment
     for name, candidate in all_candidate_paths.items():
@@ -56,6 +73,10 @@ def run_tests(environment: Environment,
         #Build table
         path_table = PrettyTable()
         path_table.field_names = ["UAV ID", "UAV Name", "Path by Time Step","Times Delayed","Nodes Searched"]
+        # only shown when retries were skipped (see AStarPlanner.plan_path)
+        show_saved = any(saved_dict.get(name, {}).values())
+        if show_saved:
+            path_table.add_column("Expansions Saved", [])
         for uav in environment.uav_list:
             searched_totals[name] += searched_dict[name][uav.id]
             color_code = get_ansi_colour(uav.id)
@@ -82,21 +103,36 @@ def run_tests(environment: Environment,
                         segs.append(f"T{t}: " + " ".join(path_by_time[t]))
                     lines.append(" | ".join(segs))
 
+                if uav.id in budget_dict.get(name, {}):
+                    lines.append(f"(partial: out of {budget_dict[name][uav.id]} budget)")
                 # join with newline
                 path_repr = f"{reset}\n{color_code}".join(lines)
             except Exception:
                 path_repr = "No Path Found"
-            path_table.add_row([
+                if uav.id in failures_dict.get(name, {}):
+                    path_repr += f" ({failures_dict[name][uav.id]})"
+            row = [
                 f"{color_code}{uav.id}{reset}",
                 f"{color_code}{uav.name}{reset}",
                 f"{color_code}{path_repr}{reset}",
                 f"{color_code}{delay_dict[name][uav.id]}{reset}",
                 f"{color_code}{searched_dict[name][uav.id]}{reset}"
-            ])
+            ]
+            if show_saved:
+                row.append(f"{color_code}{saved_dict[name].get(uav.id, 0)}{reset}")
+            path_table.add_row(row)
         if output_mode in [0,1,2]:
             print(f"\nCandidate Path: {name}")
             print(path_table)
             print("\n")
+            if node_logs[name]:
+                # per high-level node instrumentation (CBS)
+                node_table = PrettyTable()
+                node_table.field_names = [key.replace("_", " ").title() for key in node_logs[name][0]]
+                for entry in node_logs[name]:
+                    node_table.add_row([round(v, 4) if isinstance(v, float) else v for v in entry.values()])
+                print(f"High-level nodes: {name}")
+                print(node_table)
         # run sim
         environment.set_active_candidate_path(name)
         results[name] = environment.run()
@@ -122,6 +158,10 @@ def run_tests(environment: Environment,
             lowest_names.append(name)
 
         score = candidate_evaluator(name, sim_res, searched_totals=searched_totals)
+        # UAVs the planner gave up on or stopped short of their goal, counted by reason
+        reasons = list(failures_dict.get(name, {}).values())
+        reasons += [f"out of {budget} budget" for budget in budget_dict.get(name, {}).values()]
+        failures = ", ".join(f"{reasons.count(reason)} {reason}" for reason in sorted(set(reasons))) or "-"
 
         row = [
             scenario_name,
@@ -131,6 +171,7 @@ def run_tests(environment: Environment,
             sim_res["waited"],
             sim_res["collisions"],
             sim_res["success"],
+            failures,
             score,
             searched_totals[name],
             round(time_dict[name], 4),
@@ -157,9 +198,9 @@ def run_tests(environment: Environment,
         # extract per‐planner lists
         planners_list = [r[1] for r in rows]
         timesteps     = [r[2] for r in rows]
-        runtimes      = [r[9] for r in rows]
-        memories      = [r[10] for r in rows]
-        scores        = [r[7] for r in rows]
+        runtimes      = [r[10] for r in rows]
+        memories      = [r[11] for r in rows]
+        scores        = [r[8] for r in rows]
 
         # 1) Timesteps
         plt.figure()
@@ -197,6 +238,17 @@ def run_tests(environment: Environment,
     else:
         print(table)
         print(f"Lowest timesteps: {lowest} by {lowest_names}")
+        print(f"Environment index build time (s): {round(index_time, 4)}")
+        stat_names = []
+        for stats in stats_dict.values():
+            stat_names += [key for key in stats if key not in stat_names]
+        if stat_names:
+            stats_table = PrettyTable()
+            stats_table.field_names = ["Planner"] + [key.replace("_", " ").title() for key in stat_names]
+            for name, stats in stats_dict.items():
+                stats_table.add_row([name] + [stats.get(key, "-") for key in stat_names])
+            print("Planner Search Stats")
+            print(stats_table)
 
 def candidate_evaluator(name: str, results: dict,searched_totals: dict = {}):
     """
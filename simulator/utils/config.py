@@ -5,6 +5,7 @@
 
 MAX_SEARCH_DEPTH = 1000
 DEFAULT_BEAM_WIDTH = 1000
+DEFAULT_BEAM_MODE = "global" # "global" or "layered" (per time layer)
 ENABLE_INDIRECT_WORLD_COLLISIONS = False
 DEFAULT_ORDERING = {"id": 0,"delay": 1, "inaccuracy": 2, "max_speed": 3, "start_time": 4, "distance": 5}
 MAX_SIM_TIME = 100
@@ -14,6 +15,29 @@ DEFAULT_G_SCORE_INCREMENT = 1.0
 DEFAULT_UAV_INACCURACY = [0, 0]
 ENABLE_PARTIAL_COLLISION_DISABLER = True
 MAX_DISPLAYED_NODES = 125000
+DEFAULT_RESERVATION_BACKEND = "occupancy" # "occupancy" (numpy time slices) or "dict" (reference)
+ENABLE_CLOSED_SET = True # skip stale open-set entries and keep a closed set in A*
+ENABLE_MACRO_MOVES = False # expand all cells reachable within max_speed moves as one A* successor
+OCCUPANCY_MAX_BYTES = 64 * 1024 * 1024 # cap on dense time slices before falling back to the overflow dict
+ENABLE_FOOTPRINT_MASKS = True # keep per-slice forbidden-centre masks for large footprints in the occupancy store
+EVICT_RESERVATIONS = True # drop reservations older than the current planning time in plan_path
+DAEMON_MAX_LINE = 64 * 1024 * 1024 # longest JSON line (e.g. a scenario config) the planning daemon accepts
+AIRSPACE_LATENCY_PERCENTILES = (50, 90, 99) # submit latency percentiles reported by AirspaceManager
+RESERVATION_ARCHIVE = None # directory evicted reservation slices are written to, None to discard them
+DISTANCE_FIELD_CACHE_SIZE = 64 # distance fields kept per planner for the true_distance heuristic
+DISTANCE_FIELD_CACHE_BYTES = 128 * 1024 * 1024
+CBS_FOCAL_WEIGHT = 1.0 # > 1 for bounded-suboptimal (ECBS-style) high-level search
+CBS_MAX_NODES = 200 # constraint tree nodes before CBS falls back to prioritised planning
+CBS_WORKERS = 2 # processes for the low-level searches of CBS child nodes, 1 runs them inline
+HPA_CLUSTER_SIZE = 10 # cluster side of HPAPlanner on unscaled maps, scaled maps use their scale factor
+HPA_ENTRANCE_SPLIT = 6 # face stretches at least this wide both ways also get transitions near the corners
+DEFAULT_WINDOW = 16 # timesteps planned and reserved per round by WindowedPlanner, replanned every window // 2
+NODE_BUDGET_PER_SEGMENT = None # expansions per a_star_search before returning the best partial path, None for no limit
+TIME_BUDGET_PER_UAV_MS = None # search time per UAV over all its attempts, None for no limit
+TOTAL_TIME_BUDGET_S = None # search time per plan_path, None for no limit
+PORTFOLIO_PERMUTATIONS = 4 # random orderings PortfolioPlanner tries on top of its own and any given ones
+PORTFOLIO_SEED = 0 # seed for those random orderings
+PORTFOLIO_WORKERS = 2 # processes planning portfolio members, 1 runs them inline
 DEFAULT_HEURISTICS = {
         "euclidean": False,
         "avoid_indirect_collisions": False,
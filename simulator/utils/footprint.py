@@ -0,0 +1,84 @@
+"""Precomputed UAV footprint stencils shared by the Environment and the path planners."""
+from functools import lru_cache
+from typing import Optional, Tuple
+from simulator.utils.shared_imports import np
+
+SPHERE = 0
+CUBE = 1
+# footprints are cached per (class, position); this bounds that cache
+FOOTPRINT_CACHE_SIZE = 65536
+# below this many cells a plain Python loop beats numpy's per-call overhead
+SMALL_FOOTPRINT = 8
+
+
+def footprint_class(uav) -> Tuple[float, int]:
+    """The (radius, shape) inaccuracy class of a UAV."""
+    return (uav.inaccuracy[0], uav.inaccuracy[1])
+
+
+@lru_cache(maxsize=None)
+def footprint_stencil(radius: float, shape: int) -> np.ndarray:
+    """
+    Integer (dx, dy, dz) offsets covered by a footprint of the given class,
+    in x, y, z loop order. shape 0 is a sphere, shape 1 is a cube.
+    """
+    if shape not in (SPHERE, CUBE):
+        raise ValueError("Invalid shape type")
+    low = -int(np.ceil(radius))
+    high = int(np.floor(radius))
+    span = np.arange(low, high + 1)
+    dx, dy, dz = np.meshgrid(span, span, span, indexing="ij")
+    offsets = np.stack((dx.ravel(), dy.ravel(), dz.ravel()), axis=1)
+    if shape == SPHERE:
+        offsets = offsets[np.sqrt(np.sum(offsets ** 2, axis=1)) <= radius]
+    offsets = offsets.astype(np.int64)
+    offsets.flags.writeable = False
+    return offsets
+
+
+@lru_cache(maxsize=FOOTPRINT_CACHE_SIZE)
+def footprint_cells(radius: float, shape: int, x: int, y: int, z: int,
+                    bounds: Optional[Tuple[int, int, int]] = None) -> np.ndarray:
+    """
+    (N, 3) array of voxels covered by a footprint centred on (x, y, z).
+    Voxels below 0 are always dropped; voxels at or above bounds are dropped when bounds is given.
+    The returned array is shared between callers and must not be modified.
+    """
+    cells = footprint_stencil(radius, shape) + np.array((x, y, z))
+    keep = np.all(cells >= 0, axis=1)
+    if bounds is not None:
+        keep &= np.all(cells < np.array(bounds), axis=1)
+    cells = cells[keep]
+    cells.flags.writeable = False
+    return cells
+
+
+def footprint_sums(values: np.ndarray, radius: float, shape: int) -> np.ndarray:
+    """
+    Sum of values over the footprint of the given class centred on each voxel, with
+    voxels outside the grid counting as 0. Same dtype as values.
+    """
+    sums = np.zeros_like(values)
+    size = values.shape
+    for dx, dy, dz in footprint_stencil(radius, shape).tolist():
+        # sums[p] += values[p + offset] wherever p + offset is inside the grid
+        src = tuple(slice(max(0, d), min(n, n + d)) for d, n in zip((dx, dy, dz), size))
+        dst = tuple(slice(max(0, -d), min(n, n - d)) for d, n in zip((dx, dy, dz), size))
+        sums[dst] += values[src]
+    return sums
+
+
+def uav_footprint(uav, x: int, y: int, z: int, bounds: Optional[Tuple[int, int, int]] = None) -> np.ndarray:
+    """Footprint cells of a UAV centred on (x, y, z)."""
+    return footprint_cells(uav.inaccuracy[0], uav.inaccuracy[1], x, y, z, bounds)
+
+
+def count_obstacles(world_data: np.ndarray, cells: np.ndarray) -> int:
+    """Number of footprint cells that are obstacles in world_data (cells outside the grid are free)."""
+    if len(cells) < SMALL_FOOTPRINT:
+        size_x, size_y, size_z = world_data.shape
+        return sum(1 for x, y, z in cells.tolist()
+                   if x < size_x and y < size_y and z < size_z and world_data[x, y, z] == 1)
+    inside = np.all(cells < np.array(world_data.shape), axis=1)
+    cells = cells[inside]
+    return int(np.count_nonzero(world_data[cells[:, 0], cells[:, 1], cells[:, 2]] == 1))
@@ -6,6 +6,19 @@ from simulator.utils.shared_imports import Pos,State, TMState, np, PrettyTable,
 from simulator.path_planner.path_planner import AStarPlanner,remove_same_timestep_oscillations, ObliviousPlanner
 from simulator.scenario.scenario import Scenario
 from simulator.tester.tester import run_tests
+from simulator.airspace.airspace_manager import AirspaceManager
+from simulator.reservations.reservations import ReservationStore, DictReservationStore, OccupancyReservationStore
+from simulator.reservations.archive import ReservationArchive
+from simulator.path_planner.heuristics import HEURISTICS, register_heuristic, compile_heuristics
+from simulator.path_planner.distance_field import DistanceFieldCache, distance_field, inflate_obstacles, label_components, obstacle_counts
+from simulator.path_planner.sipp_planner import SIPPPlanner, SafeIntervals
+from simulator.path_planner.cbs_planner import CBSPlanner
+from simulator.path_planner.windowed_planner import WindowedPlanner
+from simulator.path_planner.hpa_planner import HPAPlanner, ClusterAbstraction
+from simulator.path_planner.portfolio_planner import PortfolioPlanner
+from simulator.path_planner.frontier import BEAM_MODES, BeamFrontier, BoundedFrontier, LayeredFrontier, MinMaxHeap
+from simulator.path_planner.search_nodes import StateCodec, SearchNodes, ParentView
+from simulator.utils.footprint import footprint_stencil, footprint_class, uav_footprint, count_obstacles
 import simulator.utils.config as cfg
 #--------------------------------Fixtures--------------------------------------------------
 @pytest.fixture
@@ -378,6 +391,25 @@ def test_compute_square_footprint(planner):
     assert expected.issubset(pts_set)
 
 
+def test_footprint_stencils():
+    assert len(footprint_stencil(0, 0)) == 1
+    assert len(footprint_stencil(1, 0)) == 7
+    assert len(footprint_stencil(2, 0)) == 33
+    assert len(footprint_stencil(1, 1)) == 27
+    # the same cached array is handed out for the same class and position
+    u = UAV(0, inaccuracy=[1, 1])
+    assert uav_footprint(u, 0, 0, 0) is uav_footprint(u, 0, 0, 0)
+
+
+def test_environment_footprint_is_clipped_to_grid(empty_env, planner):
+    u = UAV(0, inaccuracy=[1, 1])
+    env_cells = set(empty_env.compute_footprint(u, Pos(9, 9, 9)))
+    planner_cells = set(tuple(p) for p in planner.compute_footprint(u, Pos(9, 9, 9)))
+    assert len(env_cells) == 8
+    assert env_cells < planner_cells
+    assert (10, 10, 10) in planner_cells
+
+
 def test_add_reservation_and_vertex_conflict(planner):
     # Build a simple path: two states, reservation footprints should cover both timesteps
     u = UAV(0, inaccuracy=[0, 0])
@@ -478,3 +510,983 @@ def test_immediately_following_only(empty_env, planner):
 
     # At least one UAV must be delayed to avoid conflict
     assert delay_counts[u1.id] + delay_counts[u2.id] == 2
+
+def test_sparse_start_times_follow_ordering(empty_env):
+    # spawns far apart in time; the clash at t=500 is resolved in reversed id order
+    u0 = UAV(0, destinations=[Pos(5,5,5), Pos(6,5,5)], max_speed=1)
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)], start_time=500, max_speed=1)
+    u2 = UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)], start_time=500, max_speed=1)
+    for uav in (u0, u1, u2):
+        empty_env.register_uav(uav)
+    planner = AStarPlanner(ordering={"id": -1, "start_time": 2})
+    paths, delay_counts, _ = planner.plan_path(empty_env)
+    assert paths[u0.id][0].time == 0
+    assert delay_counts[u2.id] == 0 and paths[u2.id][0].time == 500
+    assert delay_counts[u1.id] == 2 and paths[u1.id][0].time == 502
+
+def test_spawn_jumps_to_earliest_free_time(empty_env, planner):
+    # spawn booked by the environment until t=49
+    empty_env.set_reservations([State(0, 0, 0, t) for t in range(50)])
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)], max_speed=1)
+    empty_env.register_uav(uav)
+    paths, delay_counts, searched = planner.plan_path(empty_env)
+    assert paths[uav.id][0].time == 50
+    assert delay_counts[uav.id] == 50
+
+def test_failed_search_skips_retries_it_covers():
+    # the corridor stays booked past max_sim_time, so every retry of the segment must fail
+    env = Environment(world_data=np.zeros((1, 1, 5)), output_mode=0)
+    env.set_reservations([State(0, 0, 2, t) for t in range(cfg.MAX_SIM_TIME + 2)])
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(0,0,4)], max_speed=1)
+    env.register_uav(uav)
+    planner = AStarPlanner(disable_collisions=True)
+    paths, delay_counts, _ = planner.plan_path(env)
+    assert uav.id not in paths
+    skipped = planner.stats["retries_skipped"]
+    assert skipped == delay_counts[uav.id] - 1
+    assert planner.expansions_saved[uav.id] == planner.stats["expansions_saved"] > skipped
+
+#------------------------------------RESERVATIONS--------------------------------------------------------------
+@pytest.mark.parametrize("store", [DictReservationStore(), OccupancyReservationStore((5, 5, 5), horizon=4)])
+def test_reservation_store_point_queries(store):
+    store.add(1, 1, 1, 0, 0)
+    store.add(1, 1, 1, 0, 1)
+    store.add(2, 1, 1, 0, -1)
+    store.add(6, 1, 1, 9, 2)  # outside the grid and past the initial window
+    assert (1, 1, 1, 0) in store
+    assert sorted(store[(1, 1, 1, 0)]) == [0, 1]
+    assert store.count_others(1, 1, 1, 0, 0) == 1
+    assert store.has_uav(2, 1, 1, 0, -1)
+    assert store.get(6, 1, 1, 9) == [2]
+    assert len(store) == 3
+    store.remove(1, 1, 1, 0, 1)
+    assert store.get(1, 1, 1, 0) == [0]
+    assert not store.any_other([Pos(1, 1, 1)], 0, 0)
+    assert store.any_other([Pos(1, 1, 1), Pos(2, 1, 1)], 0, 0)
+    assert store.count_in_box(1, 1, 1, 0, 1, 0) == 2
+    # a search state is not a key: it would never match
+    with pytest.raises(TypeError):
+        (1, 1, 1, 0, 0) in store
+
+
+def test_reservation_store_is_abstract():
+    with pytest.raises(TypeError):
+        ReservationStore()
+
+
+def test_avoid_direct_collisions_sees_other_uavs():
+    from simulator.path_planner.heuristics import SearchContext
+    reservations = DictReservationStore()
+    reservations.add(1, 0, 0, 1, 1)
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)])
+    uav.id = 0
+    context = SearchContext(AStarPlanner(), uav, State(0,0,0,0), Pos(3,0,0), np.zeros((4, 1, 1)),
+                            reservations, {}, [], [])
+    score = HEURISTICS["avoid_direct_collisions"].bind(context)
+    assert score((1, 0, 0, 1, 0), {}) == 10000 and score((1, 0, 0, 2, 0), {}) == 0
+
+
+def test_occupancy_store_matches_dict_store():
+    dict_store = DictReservationStore()
+    dense_store = OccupancyReservationStore((4, 4, 4), horizon=2)
+    cells = np.array([(x, y, z) for x in range(3) for y in range(3) for z in range(2)])
+    for store in (dict_store, dense_store):
+        store.add_cells(cells, 1, 3)
+        store.add_cells(cells[:5], 1, 4)
+        store.add_cells(cells[5:], 2, 4)
+    assert sorted(dict_store.items()) == sorted(dense_store.items())
+    for t in range(3):
+        assert dict_store.any_other(cells, t, 3) == dense_store.any_other(cells, t, 3)
+        assert dict_store.count_others_cells(cells, t, 4) == dense_store.count_others_cells(cells, t, 4)
+        assert dict_store.count_in_box(1, 1, 1, t, 1, 1) == dense_store.count_in_box(1, 1, 1, t, 1, 1)
+
+
+@pytest.mark.parametrize("store", [DictReservationStore(), OccupancyReservationStore((5, 5, 5), horizon=4)])
+def test_first_free_skips_booked_times(store):
+    cells = np.array([(1, 1, 1), (1, 1, 2)])
+    for t in (2, 3, 5):
+        store.add(1, 1, 2, t, 7)
+    assert store.first_free(cells, 0, 0, 20) == 0
+    assert store.first_free(cells, 1, 0, 20) == 6
+    assert store.first_free(cells, 1, 7, 20) == 1
+    assert store.first_free(cells, 1, 0, 4) is None
+
+
+def test_reservation_backends_plan_the_same_paths(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)], max_speed=1, inaccuracy=[1, 0])
+    u2 = UAV(1, destinations=[Pos(3,0,0), Pos(0,0,0)], max_speed=2)
+    empty_env.register_uav(u1)
+    empty_env.register_uav(u2)
+    dense_paths, dense_delays, _ = AStarPlanner(reservation_backend="occupancy").plan_path(empty_env)
+    dict_paths, dict_delays, _ = AStarPlanner(reservation_backend="dict").plan_path(empty_env)
+    assert dense_paths == dict_paths
+    assert dense_delays == dict_delays
+
+def test_count_in_box_matches_exhaustive_scan():
+    store = OccupancyReservationStore((6, 6, 6), horizon=3)
+    for x, y, z, t, uav_id in [(1,1,1,0,0), (1,1,1,0,1), (2,1,1,1,0), (5,5,5,2,-1),
+                                (0,0,0,3,2), (7,1,1,1,3), (2,2,2,9,4), (3,3,3,2,0)]:
+        store.add(x, y, z, t, uav_id)
+    store.remove(3, 3, 3, 2, 0)
+    for query in [(1,1,1,0,1,3), (2,2,2,0,2,9), (6,1,1,1,1,0), (0,0,0,0,0,4), (5,5,5,1,3,1)]:
+        assert store.count_in_box(*query) == ReservationStore.count_in_box(store, *query)
+    assert store.count_in_box(1, 1, 1, 0, 1, 1) == 3
+
+
+def test_footprint_masks_follow_adds_and_removals():
+    store = OccupancyReservationStore((6, 6, 6), horizon=2)
+    store.add(2, 2, 2, 1, 0)
+    store.track_footprint((1, 1))
+    store.add_cells(np.array([(4, 4, 4), (5, 4, 4)]), 1, 1)
+    assert not store.footprint_clear((1, 1), 1, 1, 1, 1) and not store.footprint_clear((1, 1), 3, 3, 3, 1)
+    assert store.footprint_clear((1, 1), 0, 0, 0, 1) and store.footprint_clear((1, 1), 3, 3, 3, 0)
+    assert not store.footprint_clear((2, 0), 0, 0, 0, 1)  # untracked class
+    store.remove(2, 2, 2, 1, 0)
+    store.remove_cells(np.array([(4, 4, 4)]), 1, 1)
+    assert store.footprint_clear((1, 1), 1, 1, 1, 1) and store.footprint_clear((1, 1), 3, 3, 3, 1)
+    assert not store.footprint_clear((1, 1), 4, 4, 4, 1)
+    store.add(6, 4, 4, 1, 2)  # past the far edge, only held in overflow
+    assert not store.footprint_clear((1, 1), 0, 0, 0, 1)
+    assert not DictReservationStore().footprint_clear((1, 1), 0, 0, 0, 0)
+
+
+def test_footprint_masks_plan_the_same_paths(empty_env):
+    for i, (start, goal) in enumerate([((0,0,0), (6,0,0)), ((6,0,0), (0,0,0)), ((3,3,3), (3,3,9))]):
+        empty_env.register_uav(UAV(i, destinations=[Pos(*start), Pos(*goal)], max_speed=1 + i % 2, inaccuracy=[1, 1]))
+    heuristics = {"manhattan": True, "avoid_indirect_collisions": True}
+    masked = AStarPlanner(heuristics=heuristics, disable_collisions=True)
+    probed = AStarPlanner(heuristics=heuristics, disable_collisions=True, footprint_masks=False)
+    assert masked.plan_path(empty_env) == probed.plan_path(empty_env)
+
+
+def test_evict_before_drops_and_archives_past_slices(tmp_path):
+    archive = ReservationArchive(str(tmp_path))
+    for store in (DictReservationStore(), OccupancyReservationStore((4, 4, 4), horizon=4)):
+        for t in range(8):
+            store.add(1, 1, 1, t, 0)
+        store.add(1, 1, 1, 2, 1)
+        store.add(9, 9, 9, 3, 2)  # outside the grid
+        assert store.evict_before(4, archive) == 6
+        assert sorted(store.keys()) == [(1, 1, 1, t) for t in range(4, 8)]
+        assert store.get(1, 1, 1, 7) == [0]
+    assert archive.times() == [0, 1, 2, 3]
+    # each store archived the same slices, which are merged on disk
+    assert sorted(archive.load(2)[(1, 1, 1, 2)]) == [0, 0, 1, 1]
+    assert archive.load(3)[(9, 9, 9, 3)] == [2, 2]
+
+
+def test_evicting_reservations_plans_the_same_paths(empty_env, tmp_path):
+    for i, (start, goal) in enumerate([((0,0,0), (6,0,0)), ((6,0,0), (0,0,0)), ((3,3,3), (3,3,9))]):
+        empty_env.register_uav(UAV(0, destinations=[Pos(*start), Pos(*goal)], start_time=4 * i))
+    evicting = AStarPlanner(reservation_archive=str(tmp_path))
+    keeping = AStarPlanner(evict_reservations=False)
+    assert evicting.plan_path(empty_env) == keeping.plan_path(empty_env)
+    assert evicting.stats["reservations_evicted"] > 0
+    assert ReservationArchive(str(tmp_path)).times()[0] == 0
+
+
+# ---------------------------
+# SEARCH BOOKKEEPING
+# ---------------------------
+def test_closed_set_keeps_paths_and_counts_entries(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(4,4,0)], max_speed=2)
+    u2 = UAV(1, destinations=[Pos(4,4,0), Pos(0,0,0)], max_speed=1)
+    empty_env.register_uav(u1)
+    empty_env.register_uav(u2)
+    planner = AStarPlanner(heuristics={"manhattan": True, "avoid_direct_collisions": True})
+    paths, delays, _ = planner.plan_path(empty_env)
+    open_paths, open_delays, _ = AStarPlanner(
+        heuristics={"manhattan": True, "avoid_direct_collisions": True}, closed_set=False).plan_path(empty_env)
+    assert paths == open_paths
+    assert delays == open_delays
+    stats = planner.stats
+    assert stats["pops"] == stats["stale_skips"] + stats["expansions"]
+    assert stats["pops"] <= stats["pushes"]
+
+
+def test_reopen_policy_follows_heuristic_consistency():
+    assert not AStarPlanner(heuristics={"manhattan": True}).reopen_closed
+    assert AStarPlanner(heuristics={"manhattan": True, "avoid_direct_collisions": True}).reopen_closed
+    assert AStarPlanner(heuristics={"manhattan": True}, g_score_multiplier=0.5).reopen_closed
+    assert not AStarPlanner(heuristics={"manhattan": True}, reopen_closed=False).reopen_closed
+
+
+def test_min_max_heap_pops_both_ends():
+    heap = MinMaxHeap([5, 1, 9, 3, 7])
+    heap.push(0)
+    heap.push(10)
+    assert heap.pop_max() == 10
+    assert heap.pop_min() == 0
+    assert [heap.pop_min() for _ in range(len(heap))] == [1, 3, 5, 7, 9]
+
+
+def test_bounded_frontier_evicts_worst_entries():
+    frontier = BoundedFrontier(3)
+    for f in [4, 2, 8, 1]:
+        frontier.push((f, (0, 0, 0, 0, 1), 0))
+    assert frontier.push((9, (0, 0, 0, 0, 1), 0))[0] == 9
+    assert [frontier.pop()[0] for _ in range(len(frontier))] == [1, 2, 4]
+
+
+class NsmallestBeam:
+    """The open set a_star_search cut back with heapq.nsmallest before the frontiers."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, entry):
+        import heapq
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        import heapq
+        if len(self.heap) > self.capacity:
+            self.heap = heapq.nsmallest(self.capacity, self.heap, key=lambda x: x[0])
+            heapq.heapify(self.heap)
+        return heapq.heappop(self.heap)
+
+
+def test_beam_frontier_keeps_the_nsmallest_selection():
+    stats = {"beam_evictions": 0}
+    frontier, reference = BeamFrontier(3, stats), NsmallestBeam(3)
+    # ties on f at the boundary keep the earliest heap positions, not the smallest entries
+    for entry in [(2, 9, 0), (1, 5, 0), (2, 1, 0), (2, 4, 0), (3, 0, 0), (2, 0, 0)]:
+        frontier.push(entry)
+        reference.push(entry)
+    assert [frontier.pop() for _ in range(3)] == [reference.pop() for _ in range(3)]
+    assert stats["beam_evictions"] == 3
+
+
+def test_beam_search_paths_match_the_nsmallest_beam(monkeypatch):
+    from simulator.scenario.builder import load_config, build_planners, build_scenario
+
+    def run():
+        config = load_config("scenarios/beam_width_scenario.json")
+        planners = build_planners(config["planners"])
+        scen = build_scenario(config["scenarios"][0], planners, 0)
+        scen.run(planners=planners)
+        return scen.all_candidate_paths
+    paths = run()
+    monkeypatch.setitem(BEAM_MODES, "global", lambda capacity, layer_of, stats: NsmallestBeam(capacity))
+    assert paths == run()
+    assert {len(path) for candidate in paths.values() for path in candidate.values()} == {12}
+
+
+def test_layered_frontier_bounds_each_time_layer():
+    frontier = LayeredFrontier(1, lambda state: state[3])
+    frontier.push((3, (0, 0, 0, 1, 1), 0))
+    frontier.push((2, (1, 0, 0, 1, 1), 0))
+    frontier.push((5, (0, 0, 0, 2, 1), 0))
+    assert len(frontier) == 2
+    assert [frontier.pop()[0] for _ in range(2)] == [2, 5]
+
+
+def test_macro_moves_expand_whole_timesteps(empty_env):
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(9,9,9)], max_speed=4)
+    empty_env.register_uav(uav)
+    unit = AStarPlanner(heuristics={"manhattan": True})
+    macro = AStarPlanner(heuristics={"manhattan": True}, macro_moves=True)
+    unit_paths, _, _ = unit.plan_path(empty_env)
+    macro_paths, _, _ = macro.plan_path(empty_env)
+    path = macro_paths[0]
+    assert path[-1] == State(9, 9, 9, path[-1].time) and path[-1].time == unit_paths[0][-1].time
+    # every unit move is still listed, at most max_speed of them per timestep
+    for a, b in zip(path, path[1:]):
+        assert abs(a.x - b.x) + abs(a.y - b.y) + abs(a.z - b.z) == 1 or (a.x, a.y, a.z) == (b.x, b.y, b.z)
+        assert b.time - a.time in (0, 1)
+    assert max(sum(1 for s in path[1:] if s.time == t) for t in range(1, path[-1].time + 1)) <= 4
+    assert macro.stats["expansions"] < unit.stats["expansions"]
+
+
+def test_macro_moves_find_paths_as_short_as_unit_moves():
+    world = np.array([[0,0,1,0,0,1,0,0], [1,0,1,0,1,0,0,0], [0,1,0,1,0,1,0,0], [1,0,0,0,0,0,1,0],
+                      [0,0,1,0,0,0,0,0], [0,1,0,0,0,1,0,0], [1,0,0,0,0,0,0,0], [0,0,1,1,1,0,0,0]]).reshape(8, 8, 1)
+    ends = {}
+    for name, macro_moves in (("unit", False), ("macro", True)):
+        for heuristic in ("manhattan", "euclidean"):
+            env = Environment(world_data=world, output_mode=0)
+            env.register_uav(UAV(0, destinations=[Pos(4,1,0), Pos(5,2,0)], max_speed=3))
+            planner = AStarPlanner(heuristics={heuristic: True}, macro_moves=macro_moves)
+            paths, _, _ = planner.plan_path(env)
+            ends[name, heuristic] = paths[0][-1]
+    assert set(ends.values()) == {State(5, 2, 0, 2)}
+
+
+def test_macro_moves_avoid_other_uavs(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(6,0,0)], max_speed=3)
+    u2 = UAV(1, destinations=[Pos(6,0,0), Pos(0,0,0)], max_speed=3)
+    for uav in (u1, u2):
+        empty_env.register_uav(uav)
+    paths, _, _ = AStarPlanner(heuristics={"manhattan": True}, macro_moves=True).plan_path(empty_env)
+    empty_env.add_candidate("macro", paths)
+    empty_env.set_active_candidate_path("macro")
+    result = empty_env.run()
+    assert result["success"] and result["collisions"] == (0, 0)
+
+
+def test_state_codes_round_trip_and_keep_tuple_order():
+    codec = StateCodec((30, 7, 1), 200, 3)
+    states = [(x, y, 0, t, used) for x in (0, 1, 29) for y in (0, 6) for t in (0, 199, 200) for used in (0, 3)]
+    codes = [codec.encode(state) for state in states]
+    assert [codec.decode(code) for code in codes] == states
+    assert sorted(codes) == [codec.encode(state) for state in sorted(states)]
+    assert codec.time_of(codec.encode((29, 6, 0, 200, 3))) == 200
+
+
+def test_parent_view_walks_search_nodes():
+    nodes = SearchNodes(StateCodec((10, 10, 10), 10, 1))
+    start = nodes.add(nodes.codec.encode((0, 0, 0, 0, 1)), 0.0)
+    step = nodes.add(nodes.codec.encode((1, 0, 0, 1, 0)), 1.0, start)
+    came_from = ParentView(nodes)
+    assert came_from[(1, 0, 0, 1, 0)] == (0, 0, 0, 0, 1)
+    assert came_from.get((0, 0, 0, 0, 1)) is None and (0, 0, 0, 0, 1) not in came_from
+    assert nodes.lineage(step) == [start, step]
+
+
+# ---------------------------
+# HEURISTICS
+# ---------------------------
+def test_compile_heuristics_keeps_registry_order():
+    terms, zero_h = compile_heuristics({"manhattan": True, "same_y": True, "euclidean": False,
+                                        "avoid_direct_collisions": True}, disable_collisions=True)
+    assert [(term.name, vetoes) for term, vetoes in terms] == [
+        ("avoid_direct_collisions", True), ("same_y", False), ("manhattan", False)]
+    assert zero_h is False
+    assert compile_heuristics({"djikstra": True}, disable_collisions=False) == ([], True)
+
+
+def test_registered_heuristic_is_used_by_planner(empty_env):
+    calls = []
+
+    @register_heuristic("test_counting")
+    def counting(ctx):
+        def score(state, came_from):
+            calls.append(state)
+            return 0
+        return score
+    try:
+        with pytest.raises(ValueError):
+            register_heuristic("test_counting")(counting)
+        empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)], max_speed=1))
+        paths, _, _ = AStarPlanner(heuristics={"manhattan": True, "test_counting": True}).plan_path(empty_env)
+        assert paths[0][-1].x == 2
+        assert calls
+    finally:
+        HEURISTICS.pop("test_counting")
+
+
+def test_distance_field_goes_around_obstacles():
+    world = np.zeros((5, 1, 5))
+    world[2, 0, 0:4] = 1
+    field = distance_field(world == 0, (0, 0, 0))
+    assert field[1, 0, 0] == 1
+    assert field[3, 0, 0] == 3 + 4 + 4
+    assert field[2, 0, 0] == -1
+    blocked = inflate_obstacles(world, 1, 1)
+    assert blocked[1, 0, 0] and blocked[3, 0, 4] and not blocked[0, 0, 0]
+
+
+def test_true_distance_heuristic_reuses_fields():
+    world = np.zeros((6, 1, 6))
+    world[3, 0, 0:5] = 1
+    env = Environment(world_data=world, output_mode=0)
+    env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(5,0,0)], max_speed=1))
+    env.register_uav(UAV(1, destinations=[Pos(0,0,1), Pos(5,0,0)], max_speed=2))
+    planner = AStarPlanner(heuristics={"true_distance": True})
+    paths, _, searched = planner.plan_path(env)
+    manhattan_paths, _, manhattan_searched = AStarPlanner(heuristics={"manhattan": True}).plan_path(env)
+    assert len(paths[0]) == len(manhattan_paths[0])
+    assert sum(searched.values()) < sum(manhattan_searched.values())
+    assert planner.distance_fields.misses == 1
+    assert planner.distance_fields.hits >= 1
+    cache = DistanceFieldCache(max_entries=1)
+    cache.get(world, (0, 0, 0))
+    cache.get(world, (5, 0, 0))
+    assert list(cache.fields) == [((5, 0, 0), None)]
+
+
+# ---------------------------
+# REACHABILITY
+# ---------------------------
+def test_label_components_splits_walled_off_space():
+    world = np.zeros((5, 2, 5))
+    world[2, :, :] = 1
+    labels = label_components(world == 0)
+    assert labels[2, 0, 0] == -1
+    assert labels[0, 0, 0] == labels[1, 1, 4] == 0
+    assert labels[3, 0, 0] == labels[4, 1, 4] != labels[0, 0, 0]
+    world[2, 1, 4] = 0
+    assert label_components(world == 0)[4, 0, 0] == 0
+
+
+def test_unreachable_goal_fails_without_search_or_delay():
+    world = np.zeros((8, 8, 8))
+    world[5:8, 5:8, 5:8] = 1
+    world[6, 6, 6] = 0  # enclosed pocket
+    env = Environment(world_data=world, output_mode=0)
+    env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(6,6,6)], max_speed=1))
+    env.register_uav(UAV(1, destinations=[Pos(0,1,0), Pos(3,3,3)], max_speed=1))
+    planner = AStarPlanner()
+    paths, delays, searched = planner.plan_path(env)
+    assert planner.failures == {0: "unreachable"}
+    assert 0 not in paths and delays[0] == 0 and searched[0] == 0
+    assert paths[1][-1].x == 3
+
+
+def test_permanently_reserved_goal_fails_without_delay(empty_env):
+    empty_env.set_reservations([State(5, 5, 5, t) for t in range(cfg.MAX_SIM_TIME + 2)])
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(5,5,5)], max_speed=1))
+    planner = AStarPlanner(disable_collisions=True)
+    paths, delays, searched = planner.plan_path(empty_env)
+    assert planner.failures == {0: "goal blocked"}
+    assert paths == {} and delays[0] == 0 and searched[0] == 0
+
+
+def test_goal_blocked_only_by_a_spawn_booking_is_not_permanent():
+    grid = np.zeros((5, 1, 1))
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)], max_speed=1)
+    uav.id = 0
+    reservations = DictReservationStore()
+    # the goal is free at t=1 and t=2 apart from another UAV's provisional spawn booking
+    for t in [0] + list(range(3, 21)):
+        reservations.add(3, 0, 0, t, -1)
+    for t in (0, 1):
+        reservations.add(3, 0, 0, t, 1)
+    planner = AStarPlanner(disable_collisions=True)
+    assert planner.goal_blocked(Pos(3,0,0), 0, 20, reservations, grid, uav)
+    assert not planner.goal_blocked(Pos(3,0,0), 0, 20, reservations, grid, uav, provisional={1})
+
+
+# ---------------------------
+# SIPP
+# ---------------------------
+def test_safe_intervals_split_on_reservations():
+    store = DictReservationStore()
+    store.add(1, 0, 0, 3, 5)
+    grid = np.zeros((3, 3, 3))
+    safe = SafeIntervals(AStarPlanner(), grid, store, UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)]), 0, 10)
+    # the footprint test also looks one step ahead, so t=2 is unsafe as well
+    assert safe.of((1, 0, 0)) == [(0, 1), (4, 10)]
+    assert safe.of((0, 0, 0)) == [(0, 10)]
+    assert safe.index((1, 0, 0), 2) is None
+    assert safe.index((1, 0, 0), 7) == 1
+    # without the collision disabler AStarPlanner does not filter neighbours either
+    planner = AStarPlanner(disable_collisions=False)
+    safe = SafeIntervals(planner, grid, store, UAV(0, destinations=[Pos(0,0,0), Pos(2,0,0)]), 0, 10)
+    assert safe.of((1, 0, 0)) == [(0, 10)]
+
+
+def test_sipp_planner_honours_budgets_and_rejects_macro_moves():
+    grid = np.zeros((20, 1, 1))
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(19,0,0)], max_speed=1)
+    planner = SIPPPlanner(heuristics={"manhattan": True}, node_budget_per_segment=5)
+    path, _ = planner.a_star_search(State(0,0,0,0), Pos(19,0,0), grid, 50, uav, {}, DictReservationStore(), [], [])
+    assert planner.budget_hit == "nodes" and planner.stats["budget_nodes"] == 1
+    assert path[0] == State(0,0,0,0) and 0 < path[-1].x < 19
+    with pytest.raises(ValueError):
+        SIPPPlanner(macro_moves=True)
+
+
+def test_sipp_planner_holds_instead_of_colliding(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(4,0,0)], max_speed=1)
+    u2 = UAV(1, destinations=[Pos(4,0,0), Pos(0,0,0)], max_speed=2)
+    u3 = UAV(2, destinations=[Pos(2,0,2), Pos(2,0,0)], max_speed=1)
+    for uav in (u1, u2, u3):
+        empty_env.register_uav(uav)
+    paths, delays, searched = SIPPPlanner(heuristics={"manhattan": True}).plan_path(empty_env)
+    assert set(paths) == {0, 1, 2} and set(searched) == {0, 1, 2}
+    cells = [{(s.x, s.y, s.z, s.time) for s in path} for path in paths.values()]
+    assert cells[0].isdisjoint(cells[1]) and cells[0].isdisjoint(cells[2]) and cells[1].isdisjoint(cells[2])
+    for uav in (u1, u2, u3):
+        path = paths[uav.id]
+        for a, b in zip(path, path[1:]):
+            assert abs(a.x - b.x) + abs(a.y - b.y) + abs(a.z - b.z) <= 1
+            assert b.time - a.time in (0, 1)
+        assert (path[-1].x, path[-1].y, path[-1].z) == (uav.destinations[-1].x, uav.destinations[-1].y, uav.destinations[-1].z)
+
+
+def test_build_planners_creates_sipp():
+    from simulator.scenario.builder import build_planners
+    planners = build_planners({"sipp": {"type": "SIPPPlanner", "heuristics": {"manhattan": True}, "beam_width": 50}})
+    assert isinstance(planners["sipp"], SIPPPlanner)
+    assert planners["sipp"].beam_width == 50
+
+
+# ---------------------------
+# CBS
+# ---------------------------
+@pytest.mark.parametrize("focal_weight", [1.0, 1.5])
+def test_cbs_resolves_corridor_conflict(empty_env, focal_weight):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(4,0,0)], max_speed=1)
+    u2 = UAV(1, destinations=[Pos(4,0,0), Pos(0,0,0)], max_speed=1)
+    for uav in (u1, u2):
+        empty_env.register_uav(uav)
+    planner = CBSPlanner(heuristics={"manhattan": True}, focal_weight=focal_weight, workers=1)
+    paths, delays, searched = planner.plan_path(empty_env)
+    cells = [{(s.x, s.y, s.z, s.time) for s in path} for path in paths.values()]
+    assert cells[0].isdisjoint(cells[1])
+    assert planner.stats["fallback"] == 0
+    assert planner.stats["ct_nodes"] > 1 and planner.stats["ct_expanded"] >= 1
+    assert planner.node_log[0]["replanned"] == [0, 1]
+    assert all(entry["wall_time"] >= entry["low_level_time"] >= 0 for entry in planner.node_log)
+    assert sum(searched.values()) == planner.stats["low_level_searched"]
+
+
+def test_cbs_parallel_matches_inline(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)], max_speed=1)
+    u2 = UAV(1, destinations=[Pos(3,0,0), Pos(0,0,0)], max_speed=1)
+    for uav in (u1, u2):
+        empty_env.register_uav(uav)
+    inline_planner = CBSPlanner(heuristics={"manhattan": True}, workers=1)
+    parallel_planner = CBSPlanner(heuristics={"manhattan": True}, workers=2)
+    inline, _, _ = inline_planner.plan_path(empty_env)
+    parallel, _, _ = parallel_planner.plan_path(empty_env)
+    assert inline == parallel
+    # search stats gathered in the workers are merged back
+    assert inline_planner.stats == parallel_planner.stats
+
+
+def test_cbs_expands_a_batch_of_nodes_per_round():
+    def plan(workers):
+        env = Environment(world_data=np.zeros((5, 3, 1)), output_mode=0)
+        for dests in ([(0,0,0), (4,0,0)], [(4,0,0), (0,0,0)], [(0,1,0), (4,1,0)], [(4,1,0), (0,1,0)]):
+            env.register_uav(UAV(0, destinations=[Pos(*dest) for dest in dests], max_speed=1))
+        planner = CBSPlanner(heuristics={"manhattan": True}, workers=workers)
+        paths, _, _ = planner.plan_path(env)
+        return planner, paths
+    inline, inline_paths = plan(1)
+    parallel, paths = plan(4)
+    assert parallel.stats["fallback"] == 0
+    assert parallel.stats["ct_batches"] < parallel.stats["ct_expanded"]
+    assert inline.stats["ct_batches"] == inline.stats["ct_expanded"]
+    # the batch only widens the search: the solution is as cheap and conflict-free
+    assert sum(path[-1].time for path in paths.values()) == sum(path[-1].time for path in inline_paths.values())
+    booked = {}
+    for uav_id, path in paths.items():
+        for state in path:
+            assert booked.setdefault((state.x, state.y, state.z, state.time), uav_id) == uav_id
+
+
+def test_cbs_fallback_adds_stats_and_reuse_clears_failures(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(4,0,0)], max_speed=1)
+    u2 = UAV(1, destinations=[Pos(4,0,0), Pos(0,0,0)], max_speed=1)
+    for uav in (u1, u2):
+        empty_env.register_uav(uav)
+    planner = CBSPlanner(heuristics={"manhattan": True}, max_nodes=1, workers=1)
+    planner.plan_path(empty_env)
+    assert planner.stats["fallback"] == 1
+    # the root's low-level searches are counted as well as the fallback's
+    prioritised = AStarPlanner(heuristics={"manhattan": True}, disable_collisions=True)
+    prioritised.plan_path(empty_env)
+    assert planner.stats["pushes"] > prioritised.stats["pushes"]
+    planner.failures = {0: "goal blocked"}
+    planner.max_nodes = cfg.CBS_MAX_NODES
+    planner.plan_path(empty_env)
+    assert planner.stats["fallback"] == 0 and planner.failures == {}
+
+
+def test_build_planners_creates_cbs():
+    from simulator.scenario.builder import build_planners
+    planners = build_planners({"cbs": {"type": "CBSPlanner", "heuristics": {"manhattan": True}, "focal_weight": 1.2}})
+    assert isinstance(planners["cbs"], CBSPlanner)
+    assert planners["cbs"].focal_weight == 1.2
+    assert planners["cbs"].disable_collisions is True
+
+
+# ---------------------------
+# WINDOWED PLANNING
+# ---------------------------
+def test_a_star_search_stops_at_horizon(planner):
+    grid = np.zeros((20, 3, 3))
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(19,0,0)], max_speed=1)
+    path, _ = planner.a_star_search(State(0,0,0,0), Pos(19,0,0), grid, 6, uav, {}, DictReservationStore(), [], [], horizon=5)
+    # the window ends after 5 moves, all of them towards the goal
+    assert path[-1] == State(5,0,0,5)
+
+
+def test_windowed_planner_completes_long_missions(empty_env):
+    u1 = UAV(0, destinations=[Pos(0,0,0), Pos(9,0,0), Pos(9,9,0), Pos(0,9,0)], max_speed=1)
+    u2 = UAV(1, destinations=[Pos(9,9,0), Pos(0,9,0), Pos(0,0,0)], max_speed=1)
+    for uav in (u1, u2):
+        empty_env.register_uav(uav)
+    planner = WindowedPlanner(heuristics={"manhattan": True}, window=4)
+    paths, delays, searched = planner.plan_path(empty_env)
+    assert planner.stats["rounds"] > 10
+    cells = [{(s.x, s.y, s.z, s.time) for s in path} for path in paths.values()]
+    assert cells[0].isdisjoint(cells[1])
+    for uav in (u1, u2):
+        path = paths[uav.id]
+        for a, b in zip(path, path[1:]):
+            assert abs(a.x - b.x) + abs(a.y - b.y) + abs(a.z - b.z) <= 1
+            assert b.time - a.time in (0, 1)
+        visited = [(s.x, s.y, s.z) for s in path]
+        for dest in uav.destinations:
+            assert (dest.x, dest.y, dest.z) in visited
+        assert visited[-1] == (uav.destinations[-1].x, uav.destinations[-1].y, uav.destinations[-1].z)
+
+
+def test_windowed_hold_replans_uavs_it_would_collide_with():
+    env = Environment(world_data=np.zeros((6, 2, 1)), output_mode=0)
+    uavs = [UAV(0, destinations=[Pos(3,0,0), Pos(0,0,0)], start_time=1, max_speed=1),
+            UAV(1, destinations=[Pos(4,1,0), Pos(0,1,0)], start_time=1, max_speed=1),
+            UAV(2, destinations=[Pos(1,0,0), Pos(4,0,0)], start_time=1, max_speed=1)]
+    for uav in uavs:
+        env.register_uav(uav)
+    planner = WindowedPlanner(heuristics={"manhattan": True}, window=4)
+    paths, _, _ = planner.plan_path(env)
+    assert set(paths) == {0, 1, 2}
+    assert planner.stats["hold_replans"] >= 1 and planner.stats["hold_conflicts"] == 0
+    booked = {}
+    for uav in uavs:
+        for footprint, t in planner.path_footprints(uav, paths[uav.id]):
+            for x, y, z in footprint.tolist():
+                assert booked.setdefault((x, y, z, t), uav.id) == uav.id
+
+
+def test_windowed_planner_records_budgets_per_run():
+    def run(planner):
+        env = Environment(world_data=np.zeros((20, 1, 1)), output_mode=0)
+        env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(19,0,0)], max_speed=1))
+        return planner.plan_path(env)[0]
+    planner = WindowedPlanner(heuristics={"manhattan": True}, window=8, node_budget_per_segment=2)
+    paths = run(planner)
+    assert planner.budget_exhausted == {0: "nodes"} and planner.stats["budget_nodes"] > 0
+    assert (paths[0][-1].x, paths[0][-1].time) == (19, paths[0][-1].time)
+    planner.failures[0] = "goal blocked"
+    planner.node_budget_per_segment = None
+    run(planner)
+    assert planner.budget_exhausted == {} and planner.failures == {} and planner.expansions_saved == {0: 0}
+
+
+def test_build_planners_creates_windowed():
+    from simulator.scenario.builder import build_planners
+    planners = build_planners({"whca": {"type": "WindowedPlanner", "heuristics": {"manhattan": True}, "window": 6}})
+    assert isinstance(planners["whca"], WindowedPlanner)
+    assert planners["whca"].replan_interval == 3
+
+
+# ---------------------------
+# HIERARCHICAL PLANNING
+# ---------------------------
+def test_cluster_abstraction_routes_around_walls():
+    grid = np.zeros((12, 4, 12))
+    grid[6, :, :9] = 1  # wall with a gap at high z
+    abstraction = ClusterAbstraction(grid == 0, 4)
+    # nothing in the way: straight to the goal
+    assert abstraction.waypoints((0, 0, 0), (5, 3, 11)) == [(5, 3, 11)]
+    waypoints = abstraction.waypoints((0, 0, 0), (11, 0, 0))
+    assert waypoints[-1] == (11, 0, 0)
+    # the gap is inside the clusters covering z >= 8
+    assert any(z >= 8 for _, _, z in waypoints[:-1])
+    assert abstraction.waypoints((6, 0, 0), (11, 0, 0)) is None
+
+
+def test_hpa_planner_caches_abstraction_on_map():
+    from simulator.scenario.builder import build_map
+    cache = {}
+    large = build_map({"name": "center_block", "scale": 4}, cache)
+    assert build_map({"name": "center_block", "scale": 4}, cache) is large
+    paths = []
+    for _ in range(2):
+        env = Environment(large.world_data, 0, map=large)
+        env.register_uav(UAV(0, destinations=[Pos(10,1,2), Pos(10,1,18)], max_speed=1))
+        planner = HPAPlanner(heuristics={"manhattan": True})
+        candidate, _, _ = planner.plan_path(env)
+        paths.append(candidate[0])
+    assert len(large.abstractions) == 1
+    assert paths[0] == paths[1]
+    path = paths[0]
+    assert (path[-1].x, path[-1].y, path[-1].z) == (10, 1, 18)
+    assert all(large.world_data[s.x, s.y, s.z] == 0 for s in path)
+    for a, b in zip(path, path[1:]):
+        assert abs(a.x - b.x) + abs(a.y - b.y) + abs(a.z - b.z) <= 1
+
+
+def test_hpa_blocked_waypoint_does_not_vouch_for_pruned_fallback():
+    grid = np.zeros((8, 2, 1))
+    grid[1, 1, 0] = grid[4, 0, 0] = 1
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(7,0,0)], max_speed=1)
+    uav.id = 0
+    planner = HPAPlanner(heuristics={"manhattan": True}, beam_width=12, cluster_size=4)
+    assert planner.abstraction(grid, uav).waypoints((0, 0, 0), (7, 0, 0)) == [(4, 1, 0), (7, 0, 0)]
+    # the gap in the wall is the only way through and is always booked
+    reservations = DictReservationStore()
+    for t in range(12):
+        reservations.add(4, 1, 0, t, -1)
+    # the waypoint search fails exhaustively, the fallback to the goal only because of the beam
+    waypoint = AStarPlanner(heuristics={"manhattan": True}, beam_width=12)
+    assert waypoint.a_star_search(State(0,0,0,0), Pos(4,1,0), grid, 9, uav, {}, reservations, [], [])[0] is None
+    assert waypoint.exhausted is not None
+    path, _ = planner.a_star_search(State(0,0,0,0), Pos(7,0,0), grid, 9, uav, {}, reservations, [], [])
+    assert path is None and planner.stats["refine_fallbacks"] == 1
+    assert planner.stats["beam_evictions"] > 0
+    assert planner.exhausted is None
+
+
+# ---------------------------
+# COMPUTE BUDGETS
+# ---------------------------
+def test_node_budget_returns_closest_partial_path():
+    grid = np.zeros((20, 1, 1))
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(19,0,0)], max_speed=1)
+    planner = AStarPlanner(heuristics={"manhattan": True}, node_budget_per_segment=5)
+    path, _ = planner.a_star_search(State(0,0,0,0), Pos(19,0,0), grid, 50, uav, {}, DictReservationStore(), [], [])
+    assert planner.budget_hit == "nodes" and planner.stats["budget_nodes"] == 1
+    assert path[0] == State(0,0,0,0) and 0 < path[-1].x < 19
+    assert all(abs(a.x - b.x) <= 1 for a, b in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize("budget", [{"total_time_budget_s": 0}, {"time_budget_per_uav_ms": 0}])
+def test_exhausted_time_budget_holds_at_spawn(empty_env, budget):
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(5,0,0)], max_speed=1))
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,5,0), Pos(5,5,0)], start_time=3, max_speed=1))
+    planner = AStarPlanner(**budget)
+    paths, delays, _ = planner.plan_path(empty_env)
+    assert planner.budget_exhausted == {0: "time", 1: "time"}
+    assert planner.stats["budget_holds"] == 2
+    assert paths[0] == [State(0,0,0,0)] and paths[1] == [State(0,5,0,3)]
+    assert planner.search_deadline is None
+
+
+# ---------------------------
+# PORTFOLIO PLANNING
+# ---------------------------
+def test_portfolio_orderings_are_distinct_and_seeded():
+    base = {"id": 0, "delay": 1, "distance": -2, "start_time": 3}
+    planner = PortfolioPlanner(ordering=base, orderings=[base, {"id": -1}], permutations=5, seed=3)
+    assert planner.orderings[0] == base and planner.orderings[1] == {"id": -1}
+    assert len(planner.orderings) == len({tuple(sorted(o.items())) for o in planner.orderings})
+    assert all(o["distance"] < 0 and o["start_time"] == 3 for o in planner.orderings[2:])
+    again = PortfolioPlanner(ordering=base, orderings=[{"id": -1}], permutations=5, seed=3)
+    assert again.orderings == planner.orderings
+
+
+def test_portfolio_stops_at_first_perfect_member(empty_env):
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)], max_speed=1))
+    planner = PortfolioPlanner(permutations=3, workers=1)
+    paths, delays, _ = planner.plan_path(empty_env)
+    assert planner.stats["portfolio_members"] == 1
+    assert planner.stats["portfolio_stopped"] == len(planner.orderings) - 1
+    assert paths[0][-1].x == 3 and delays[0] == 0
+
+
+def test_portfolio_pool_matches_inline(empty_env):
+    # a shared spawn always delays someone, so every member runs
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(3,0,0)], max_speed=1))
+    empty_env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(0,4,0)], max_speed=2))
+    inline = PortfolioPlanner(permutations=3, workers=1)
+    pooled = PortfolioPlanner(permutations=3, workers=2)
+    assert inline.plan_path(empty_env) == pooled.plan_path(empty_env)
+    assert inline.results == pooled.results
+    assert min(score for _, score in inline.results) == inline.results[inline.stats["portfolio_best"]][1]
+
+
+def test_build_planners_creates_portfolio():
+    from simulator.scenario.builder import build_planners
+    planners = build_planners({"P": {"type": "PortfolioPlanner", "permutations": 2, "workers": 1}})
+    assert isinstance(planners["P"], PortfolioPlanner)
+    assert len(planners["P"].orderings) == 3
+
+
+def test_build_planners_names_every_planner_type():
+    from simulator.scenario.builder import PLANNER_TYPES
+    planner_classes, pending = set(), [AStarPlanner]
+    while pending:
+        cls = pending.pop()
+        planner_classes.add(cls)
+        pending.extend(cls.__subclasses__())
+    assert set(PLANNER_TYPES.values()) == planner_classes
+    assert all(name == cls.__name__ for name, cls in PLANNER_TYPES.items())
+
+
+# ---------------------------
+# ENVIRONMENT INDEX
+# ---------------------------
+def test_environment_index_is_shared_by_planners():
+    world = np.zeros((6, 1, 6))
+    world[3, 0, 0:5] = 1
+    env = Environment(world_data=world, output_mode=0)
+    env.register_uav(UAV(0, destinations=[Pos(0,0,0), Pos(5,0,0)], max_speed=1))
+    first = AStarPlanner(heuristics={"true_distance": True})
+    second = AStarPlanner(heuristics={"true_distance": True}, beam_width=100)
+    assert first.plan_path(env)[0] == second.plan_path(env)[0]
+    index = env.static_index()
+    assert first.distance_fields is second.distance_fields is index.distance_fields
+    assert index.distance_fields.misses == 1
+    assert index.obstacles == {(3, 0, z): True for z in range(5)}
+    assert index.build_time > 0
+
+
+def test_distance_field_cache_times_every_step(monkeypatch):
+    import itertools, time
+    clock = itertools.count()
+    monkeypatch.setattr(time, "perf_counter", lambda: next(clock))
+    cache = DistanceFieldCache()
+    cache.components(np.zeros((4, 4, 4)), (1, 0))
+    # obstacle counts, inflated obstacles, free space and labels: one tick each
+    assert cache.build_time == 4
+
+
+def test_hpa_abstraction_uses_the_shared_inflated_grid():
+    world = np.zeros((8, 8, 8))
+    world[4, :, :6] = 1
+    env = Environment(world_data=world, output_mode=0)
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(7,0,0)], max_speed=1)
+    env.register_uav(uav)
+    fields = env.static_index().distance_fields
+    # mark a free voxel in the shared inflated grid: only an abstraction built from it sees it
+    blocked = fields.blocked(world, footprint_class(uav)).copy()
+    assert not blocked[0, 7, 7]
+    blocked[0, 7, 7] = True
+    fields.inflated[footprint_class(uav)] = blocked
+    planner = HPAPlanner(heuristics={"manhattan": True}, disable_collisions=True, cluster_size=4)
+    planner.plan_path(env)
+    abstraction = planner.abstraction(world, uav)
+    assert not abstraction.free[0, 7, 7]
+    assert not (abstraction.free & blocked).any()
+
+
+def test_environment_index_rebuilds_when_world_changes():
+    world = np.zeros((4, 4, 4))
+    env = Environment(world_data=world, output_mode=0)
+    index = env.static_index()
+    assert env.static_index() is index and index.obstacles == {}
+    world[1, 1, 1] = 1
+    edited = env.static_index()
+    assert edited is not index and edited.obstacles == {(1, 1, 1): True}
+    assert edited.inflated((1, 1))[0, 0, 0] and not edited.inflated((1, 1))[3, 3, 3]
+    env.world_data = np.zeros((4, 4, 4))
+    assert env.static_index() is not edited
+
+
+def test_obstacle_counts_match_footprint_probes():
+    rng = np.random.default_rng(4)
+    world = (rng.random((7, 6, 5)) < 0.2).astype(float)
+    for radius, shape in ((1, 0), (1.5, 1), (2, 0)):
+        counts = obstacle_counts(world, radius, shape)
+        uav = UAV(0, destinations=[Pos(0,0,0)], inaccuracy=[radius, shape])
+        for x, y, z in np.ndindex(world.shape):
+            assert counts[x, y, z] == count_obstacles(world, uav_footprint(uav, x, y, z))
+        assert np.array_equal(inflate_obstacles(world, radius, shape), counts > 0)
+
+
+# ---------------------------
+# AIRSPACE MANAGER
+# ---------------------------
+def airspace_uavs():
+    return [UAV(0, destinations=[Pos(0,0,0), Pos(6,0,0)], start_time=0),
+            UAV(0, destinations=[Pos(6,0,0), Pos(0,0,0)], start_time=2),
+            UAV(0, destinations=[Pos(3,3,3), Pos(3,3,9)], start_time=4, inaccuracy=[1, 0])]
+
+
+def test_airspace_manager_matches_batch_planning(empty_env):
+    for uav in airspace_uavs():
+        empty_env.register_uav(uav)
+    batch, delays, _ = AStarPlanner().plan_path(empty_env)
+    manager = AirspaceManager(Environment(world_data=np.zeros((10, 10, 10)), output_mode=0))
+    for uav in airspace_uavs():
+        manager.advance_to(uav.start_time)
+        manager.submit(uav)
+    assert manager.plans == batch and manager.delays == delays
+    assert set(manager.latency_percentiles()) == {"p50", "p90", "p99", "mean", "max", "requests_per_s"}
+    assert manager.advance_to(100) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        manager.advance_to(50)
+
+
+def test_airspace_manager_cancel_releases_the_flight(empty_env):
+    manager = AirspaceManager(empty_env, AStarPlanner(evict_reservations=False))
+    first = UAV(0, destinations=[Pos(0,0,0), Pos(0,0,5)])
+    second = UAV(0, destinations=[Pos(0,0,0), Pos(0,0,5)])
+    assert manager.submit(first)[0].time == 0
+    # the spawn is taken until the first UAV has left it
+    assert manager.submit(second)[0].time > 0
+    assert manager.cancel(first.id) and not manager.cancel(first.id)
+    assert all(first.id not in ids for _, ids in manager.reservations.items())
+    assert manager.submit(second)[0].time == 0
+    assert manager.stats["cancelled"] == 2
+
+
+def test_airspace_manager_marks_budget_cut_flights(empty_env):
+    manager = AirspaceManager(empty_env, AStarPlanner(heuristics={"manhattan": True}, node_budget_per_segment=3))
+    uav = UAV(0, destinations=[Pos(0,0,0), Pos(9,0,0)], max_speed=1)
+    path = manager.submit(uav)
+    assert manager.budget_exhausted == {uav.id: "nodes"} and path[-1].x < 9
+    manager.planner.node_budget_per_segment = None
+    assert manager.submit(uav)[-1].x == 9 and manager.budget_exhausted == {}
+
+
+def test_airspace_manager_ids_outlast_the_environment_pool(empty_env):
+    manager = AirspaceManager(empty_env, AStarPlanner(evict_reservations=False))
+    for i in range(105):
+        uav = UAV(0, destinations=[Pos(0,0,0), Pos(0,0,5)])
+        assert manager.submit(uav)[0].time == 0
+        assert uav.id == i and manager.cancel(uav.id)
+    assert manager.stats["accepted"] == manager.stats["cancelled"] == 105
+
+
+# ---------------------------
+# PLANNING DAEMON
+# ---------------------------
+def test_environments_on_a_map_share_its_index():
+    from simulator.scenario.builder import build_map
+    shared_map = build_map({"name": "center_block"})
+    first = Environment(shared_map.world_data, 0, map=shared_map)
+    second = Environment(shared_map.world_data, 0, map=shared_map)
+    assert first.static_index() is second.static_index() is shared_map.index
+    assert Environment(shared_map.world_data.copy(), 0).static_index() is not shared_map.index
+
+
+def test_planning_daemon_serves_runs_and_flight_requests(tmp_path):
+    import asyncio, os, threading, time
+    from main import daemon_request
+    from simulator.daemon.planning_daemon import serve
+    address = str(tmp_path / "daemon.sock")
+    thread = threading.Thread(target=asyncio.run, args=(serve(address),))
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(address):
+            break
+        time.sleep(0.05)
+    config = {"planners": {"A*": {"heuristics": {"manhattan": True}}},
+              "scenarios": [{"name": "warm", "map": {"name": "blank"},
+                             "uavs": [{"name": "a", "destinations": [[0,0,0], [4,0,0]]}]}]}
+    replies = list(daemon_request(address, [
+        {"op": "run", "config": config, "output_mode": 0},
+        {"op": "open", "session": "utm", "map": {"name": "blank"}},
+        {"op": "submit", "session": "utm", "uav": {"name": "b", "destinations": [[0,0,0], [0,4,0]]}},
+        # resubmitted by id, so the first flight no longer holds the spawn
+        {"op": "submit", "session": "utm", "uav_id": 0,
+         "uav": {"name": "b", "destinations": [[0,0,0], [0,4,0]]}},
+        {"op": "cancel", "session": "missing", "uav_id": 0},
+        {"op": "status"},
+        {"op": "shutdown"}]))
+    assert [reply["type"] for reply in replies] == ["output", "plans", "done", "opened", "plan", "plan",
+                                                    "error", "status", "done"]
+    assert "=== Running warm ===" in replies[0]["text"]
+    assert replies[1]["plans"]["A*"]["0"][-1] == [4, 0, 0, 4]
+    assert replies[4]["path"][-1] == [0, 4, 0, 4]
+    assert replies[5]["uav_id"] == 0 and replies[5]["path"] == replies[4]["path"]
+    # the scenario and the session share one cached map
+    assert replies[7] == {"type": "status", "maps": [["blank", 1, 0]], "sessions": ["utm"]}
+    thread.join(10)
+    assert not thread.is_alive()
+    assert not os.path.exists(address)
+
+
+def test_planning_daemon_leaves_other_files_alone(tmp_path):
+    import asyncio
+    from main import run_on_daemon
+    from simulator.daemon.planning_daemon import serve
+    scenario = tmp_path / "scenario.json"
+    scenario.write_text("{}")
+    with pytest.raises(FileExistsError):
+        asyncio.run(serve(str(scenario)))
+    assert scenario.read_text() == "{}"
+    # the client accepts the same scenario files as a local run
+    with pytest.raises(ValueError):
+        run_on_daemon(str(tmp_path / "scenario.txt"), 0, str(tmp_path / "daemon.sock"))